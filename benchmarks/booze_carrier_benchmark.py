@@ -0,0 +1,168 @@
+"""
+Benchmarks building BoozeCarrier objects from database rows and sheet records.
+
+Compares the slotted class with a copy of the dict based class it replaced, on the same rows, for construction time,
+equality checks and memory held.
+
+Run from the repository root with:
+
+    python -m benchmarks.booze_carrier_benchmark [--rows 10000] [--repeat 5]
+"""
+
+# import libraries
+import argparse
+import random
+import re
+import sqlite3
+import string
+import time
+import tracemalloc
+
+# local modules
+from ptn.boozebot.classes.BoozeCarrier import BoozeCarrier
+from ptn.boozebot.database.schema import normalize_carrier_id
+
+
+class LegacyBoozeCarrier:
+    # The class as it was before __slots__, kept here only to measure against.
+
+    COMPARISON_KEYS = ["carrier_name", "wine_total", "carrier_identifier", "discord_username", "run_count"]
+
+    def __init__(self, info_dict=None):
+        info_dict = dict(info_dict) if info_dict else dict()
+        self.carrier_name = info_dict.get('Carrier Name', None) or info_dict.get('carriername', None)
+        if self.carrier_name:
+            self.carrier_name = str(self.carrier_name)
+        self.wine_total = info_dict.get('Wine Total (tons)', None) or info_dict.get('winetotal', None)
+        if self.wine_total:
+            try:
+                self.wine_total = int(self.wine_total)
+            except ValueError:
+                self.wine_total = None
+        self.carrier_identifier = info_dict.get('Carrier ID', None) or info_dict.get('carrierid', None)
+        if self.carrier_identifier:
+            self.carrier_identifier = normalize_carrier_id(self.carrier_identifier)
+            if not re.match(r"\w{3}-\w{3}", self.carrier_identifier):
+                raise ValueError(f'Incompatible carrier ID found: {self.carrier_identifier} - {self.carrier_name}')
+        self.platform = "PC (Horizons + Odyssey)"
+        self.ptn_carrier = False
+        self.discord_username = info_dict.get('Discord Username', None) or info_dict.get('discordusername', None)
+        if self.discord_username:
+            self.discord_username = str(self.discord_username)
+        self.timestamp = info_dict.get('Timestamp', None) or info_dict.get('timestamp', None)
+        self.discord_unload_notification = info_dict.get('discord_unload_in_progress', None)
+        self.run_count = info_dict.get('run_count', None) or info_dict.get('runtotal', None)
+        if self.carrier_name and not self.run_count:
+            self.run_count = 1
+        self.total_unloads = info_dict.get('totalunloads', None)
+        if self.carrier_name and not self.total_unloads:
+            self.total_unloads = 0
+        self.timezone = info_dict.get('user_timezone_in_utc', None)
+
+    def __bool__(self):
+        return any([value for key, value in vars(self).items() if key not in ['timestamp', 'platform'] and value])
+
+    def __eq__(self, other):
+        if isinstance(other, LegacyBoozeCarrier):
+            return all(getattr(self, key) == getattr(other, key) for key in self.COMPARISON_KEYS)
+        return False
+
+
+def random_carrier_id():
+    alphabet = string.ascii_uppercase + string.digits
+    return ''.join(random.choices(alphabet, k=3)) + '-' + ''.join(random.choices(alphabet, k=3))
+
+
+def build_rows(count):
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = sqlite3.Row
+    connection.execute('''
+        CREATE TABLE boozecarriers(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT, carriername TEXT NOT NULL, carrierid TEXT UNIQUE, winetotal INT,
+            platform TEXT NOT NULL, officialcarrier BOOLEAN, discordusername TEXT NOT NULL, timestamp DATETIME,
+            runtotal INT, totalunloads INT, discord_unload_in_progress INT, user_timezone_in_utc TEXT
+        )
+    ''')
+    connection.executemany(
+        '''
+        INSERT OR IGNORE INTO boozecarriers VALUES(NULL, ?, ?, ?, 'PC', 0, ?, '2025-01-01 00:00:00', ?, 0, NULL, NULL)
+        ''',
+        (
+            (f'Carrier {index}', random_carrier_id(), random.randint(1, 3) * 23000, f'user{index}',
+             random.randint(1, 3))
+            for index in range(count)
+        ),
+    )
+    rows = connection.execute('SELECT * FROM boozecarriers').fetchall()
+    records = [
+        {
+            'Carrier Name': row['carriername'],
+            'Carrier ID': row['carrierid'],
+            'Wine Total (tons)': row['winetotal'],
+            'Discord Username': row['discordusername'],
+            'Timestamp': row['timestamp'],
+        }
+        for row in rows
+    ]
+    return rows, records
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def memory_held(build):
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='Carrier rows to build.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case, the best is reported.')
+    args = parser.parse_args()
+
+    random.seed(58832)
+    rows, records = build_rows(args.rows)
+
+    legacy = [LegacyBoozeCarrier(row) for row in rows]
+    slotted = [BoozeCarrier.from_db_row(row) for row in rows]
+
+    results = [
+        ('legacy, db rows', best_of(args.repeat, lambda: [LegacyBoozeCarrier(row) for row in rows])),
+        ('slotted, BoozeCarrier(row)', best_of(args.repeat, lambda: [BoozeCarrier(row) for row in rows])),
+        ('slotted, from_db_row', best_of(args.repeat, lambda: [BoozeCarrier.from_db_row(row) for row in rows])),
+        ('legacy, sheet records', best_of(args.repeat, lambda: [LegacyBoozeCarrier(record) for record in records])),
+        ('slotted, from_sheet_record', best_of(
+            args.repeat, lambda: [BoozeCarrier.from_sheet_record(record) for record in records]
+        )),
+        ('legacy, == and bool', best_of(
+            args.repeat, lambda: [bool(carrier) and carrier == carrier for carrier in legacy]
+        )),
+        ('slotted, == and bool', best_of(
+            args.repeat, lambda: [bool(carrier) and carrier == carrier for carrier in slotted]
+        )),
+    ]
+
+    legacy_memory = memory_held(lambda: [LegacyBoozeCarrier(row) for row in rows])
+    slotted_memory = memory_held(lambda: [BoozeCarrier.from_db_row(row) for row in rows])
+
+    print(f'{len(rows)} carriers, best of {args.repeat}.')
+    for name, seconds in results:
+        print(f'{name:<30} {seconds * 1000:8.2f} ms')
+    print(f'{"legacy, memory held":<30} {legacy_memory / 1024:8.0f} KiB')
+    print(f'{"slotted, memory held":<30} {slotted_memory / 1024:8.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
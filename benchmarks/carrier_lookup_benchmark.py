@@ -0,0 +1,117 @@
+"""
+Benchmarks the carrier lookups against a large historical table.
+
+Compares the old LIKE '%XXX-XXX%' scans with exact matches, before and after the lookup indexes are created.
+
+Run from the repository root with:
+
+    python -m benchmarks.carrier_lookup_benchmark [--rows 50000] [--lookups 500]
+"""
+
+# import libraries
+import argparse
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+# local modules
+from ptn.boozebot.database.schema import create_carrier_lookup_indexes
+
+
+def random_carrier_id():
+    alphabet = string.ascii_uppercase + string.digits
+    return ''.join(random.choices(alphabet, k=3)) + '-' + ''.join(random.choices(alphabet, k=3))
+
+
+def build_historical(connection, rows):
+    connection.execute('''
+        CREATE TABLE historical(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            holiday_start DATE,
+            holiday_end DATE,
+            carriername TEXT NOT NULL,
+            carrierid TEXT,
+            winetotal INT,
+            platform TEXT NOT NULL,
+            officialcarrier BOOLEAN,
+            discordusername TEXT NOT NULL,
+            timestamp DATETIME,
+            runtotal INT,
+            totalunloads INT,
+            discord_unload_in_progress INT,
+            user_timezone_in_utc TEXT
+        )
+    ''')
+    # Every carrier comes back for about five cruises.
+    cruise_dates = [f'20{year:02d}-{month:02d}-01' for year in range(15, 26) for month in range(1, 13)]
+    carrier_ids = [random_carrier_id() for _ in range(max(rows // 5, 1))]
+    connection.executemany(
+        '''
+        INSERT INTO historical VALUES(NULL, ?, ?, 'Carrier', ?, 20000, 'PC', 0, 'user', '2025-01-01 00:00:00', 1, 1,
+        NULL, NULL)
+        ''',
+        (
+            (date, date, random.choice(carrier_ids))
+            for date in (random.choice(cruise_dates) for _ in range(rows))
+        ),
+    )
+    connection.commit()
+    return carrier_ids, cruise_dates
+
+
+def time_queries(connection, sql, parameters):
+    start = time.perf_counter()
+    for params in parameters:
+        connection.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / len(parameters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help='Rows in the historical table.')
+    parser.add_argument('--lookups', type=int, default=500, help='Lookups to time per case.')
+    args = parser.parse_args()
+
+    random.seed(58832)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        connection = sqlite3.connect(os.path.join(tmp_dir, 'benchmark.db'))
+        carrier_ids, cruise_dates = build_historical(connection, args.rows)
+
+        lookup_ids = [random.choice(carrier_ids) for _ in range(args.lookups)]
+        lookup_dates = [random.choice(cruise_dates) for _ in range(args.lookups)]
+
+        results = [
+            ('carrierid LIKE %ID%', time_queries(
+                connection, 'SELECT * FROM historical WHERE carrierid LIKE (?)', [(f'%{cid}%',) for cid in lookup_ids]
+            )),
+            ('carrierid = ID, no index', time_queries(
+                connection, 'SELECT * FROM historical WHERE carrierid = (?)', [(cid,) for cid in lookup_ids]
+            )),
+            ('holiday_start = date, no index', time_queries(
+                connection, 'SELECT * FROM historical WHERE holiday_start = (?)', [(date,) for date in lookup_dates]
+            )),
+        ]
+
+        create_carrier_lookup_indexes(connection.cursor())
+        connection.commit()
+
+        results += [
+            ('carrierid = ID, indexed', time_queries(
+                connection, 'SELECT * FROM historical WHERE carrierid = (?)', [(cid,) for cid in lookup_ids]
+            )),
+            ('holiday_start = date, indexed', time_queries(
+                connection, 'SELECT * FROM historical WHERE holiday_start = (?)', [(date,) for date in lookup_dates]
+            )),
+        ]
+        connection.close()
+
+    print(f'{args.rows} historical rows, {args.lookups} lookups per case.')
+    for name, seconds in results:
+        print(f'{name:<32} {seconds * 1000:8.3f} ms per lookup')
+
+
+if __name__ == '__main__':
+    main()
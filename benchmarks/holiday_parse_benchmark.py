@@ -0,0 +1,88 @@
+"""
+Benchmarks reading the holiday state out of an EBGS factions response.
+
+Compares decoding the whole document and walking every system against finding the HIP 58832 entry in the raw text and
+decoding only that. Runs on the recorded responses in tests/test_data, padded with extra systems to show how the two
+scale with the size of the faction. Payload is the body size the full parse decodes, decoded is what the targeted
+parse decodes. The parses per run are scaled down as the payload grows, so every case takes about as long as the
+unpadded one.
+
+Run from the repository root with:
+
+    python -m benchmarks.holiday_parse_benchmark [--systems 0 10 100 1000] [--repeat 5] [--number 1000]
+"""
+
+# import libraries
+import argparse
+import json
+import time
+
+# local modules
+from ptn.boozebot.modules.PHcheck import RACKHAMS_SYSTEM, find_system_presence, parse_ebgs_response
+from tests.test_data.test_data import load_response
+
+
+def legacy_parse(text):
+    # The check as it was, decode everything and look at every system.
+    result = json.loads(text)
+    for element in result['docs']:
+        for system in element['faction_presence']:
+            for active_state in system['active_states']:
+                if active_state['state'] == 'publicholiday':
+                    return True
+    return False
+
+
+def padded_response(fixture, systems, peak_last):
+    response = json.loads(load_response(fixture))
+    peak = response['docs'][0]['faction_presence'][0]
+    others = [
+        dict(peak, system_name=f'System {index}', system_name_lower=f'system {index}', active_states=[])
+        for index in range(systems)
+    ]
+    response['docs'][0]['faction_presence'] = others + [peak] if peak_last else [peak] + others
+    return json.dumps(response)
+
+
+def decoded_bytes(text):
+    presence = find_system_presence(text, RACKHAMS_SYSTEM)
+    return len(json.dumps(presence)) if presence else 0
+
+
+def best_of(repeat, number, func, text):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(text)
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--systems', type=int, nargs='+', default=[0, 10, 100, 1000],
+                        help='Extra systems to pad the faction presence with.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case, the best is reported.')
+    parser.add_argument('--number', type=int, default=1000,
+                        help='Parses per run of an unpadded response, padded responses get proportionally fewer.')
+    args = parser.parse_args()
+
+    print(f'{"response":<28} {"payload":>9} {"decoded":>9} {"full parse":>11} {"targeted":>10}')
+    for fixture in ('peak_faction_holiday_response', 'peak_faction_no_holiday_response'):
+        unpadded_size = len(padded_response(fixture, 0, False))
+        for systems in args.systems:
+            for peak_last in ((False, True) if systems else (False,)):
+                text = padded_response(fixture, systems, peak_last)
+                assert legacy_parse(text) == parse_ebgs_response(text)
+                number = max(10, args.number * unpadded_size // len(text))
+                legacy = best_of(args.repeat, number, legacy_parse, text)
+                targeted = best_of(args.repeat, number, parse_ebgs_response, text)
+                label = f'{fixture.split("_")[2]}, +{systems}{", peak last" if peak_last else ""}'
+                print(f'{label:<28} {len(text):>8}B {decoded_bytes(text):>8}B '
+                      f'{legacy * 1e6:>9.1f}us {targeted * 1e6:>8.1f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,10 @@ import os
 from discord.ext.prometheus import PrometheusCog
 
 # import build functions
-from ptn.boozebot.database.database import build_database_on_startup
+from ptn.boozebot.database.database import build_database_on_startup, pirate_steve_backups
+from ptn.boozebot.modules.loop_monitor import loop_lag_monitor
+from ptn.boozebot.modules.ingest import IngestServer
+from ptn.boozebot.modules.PHcheck import holiday_state
 
 # import bot Cogs
 from ptn.boozebot.botcommands.DiscordBotCommands import DiscordBotCommands
@@ -24,7 +27,7 @@ from ptn.boozebot.botcommands.Departures import Departures
 from ptn.boozebot.botcommands.BackgroundTaskCommands import BackgroundTaskCommands
 
 # import bot object, token, production status
-from ptn.boozebot.constants import bot, TOKEN, _production
+from ptn.boozebot.constants import bot, TOKEN, _production, get_ingest_settings
 
 
 print(f"Booze bot is connecting against production: {_production}.")
@@ -37,10 +40,12 @@ def run():
 async def boozebot():
     async with bot:
         build_database_on_startup()
+        loop_lag_monitor.start()
 
         await bot.add_cog(DiscordBotCommands(bot))
         await bot.add_cog(Unloading(bot))
-        await bot.add_cog(DatabaseInteraction(bot))
+        database_interaction = DatabaseInteraction(bot)
+        await bot.add_cog(database_interaction)
         await bot.add_cog(Helper(bot))
         await bot.add_cog(PublicHoliday(bot))
         await bot.add_cog(MimicSteve(bot))
@@ -49,7 +54,26 @@ async def boozebot():
         await bot.add_cog(Departures(bot))
         await bot.add_cog(BackgroundTaskCommands(bot))
         await bot.add_cog(PrometheusCog(bot))
-        await bot.start(TOKEN)
+
+        ingest_server = None
+        ingest_host, ingest_port, ingest_token = get_ingest_settings()
+        if ingest_port and not ingest_token:
+            print("PTN_BOOZEBOT_INGEST_PORT is set without PTN_BOOZEBOT_INGEST_TOKEN, not starting the endpoint.")
+        elif ingest_port:
+            ingest_server = IngestServer(
+                database_interaction.ingest_form_response, ingest_host, ingest_port, ingest_token
+            )
+            await ingest_server.start()
+            database_interaction.ingest_active = True
+
+        try:
+            await bot.start(TOKEN)
+        finally:
+            if ingest_server:
+                await ingest_server.stop()
+            await holiday_state.close()
+            # Don't lose the writes since the last snapshot when the bot goes down.
+            pirate_steve_backups.flush()
 
 if __name__ == "__main__":
     """
@@ -23,13 +23,13 @@ class BackgroundTaskCommands(commands.Cog):
     @app_commands.choices(
         task_name=[
             Choice(name="periodic_stat_update", value="periodic_stat_update"),
-            Choice(name="check_departure_messages_loop", value="check_departure_messages_loop"),
+            Choice(name="departure_reminders", value="departure_reminders"),
             Choice(name="public_holiday_loop", value="public_holiday_loop"),
         ]
     )
     async def start_task(self, interaction: discord.Interaction, task_name: str):
         task = self.get_task(task_name)
-        if task:
+        if task is not None:
             if not task.is_running():
                 task.start()
                 await interaction.response.send_message(f"Started task: {task_name}")
@@ -48,13 +48,13 @@ class BackgroundTaskCommands(commands.Cog):
     @app_commands.choices(
         task_name=[
             Choice(name="periodic_stat_update", value="periodic_stat_update"),
-            Choice(name="check_departure_messages_loop", value="check_departure_messages_loop"),
+            Choice(name="departure_reminders", value="departure_reminders"),
             Choice(name="public_holiday_loop", value="public_holiday_loop"),
         ]
     )
     async def stop_task(self, interaction: discord.Interaction, task_name: str):
         task = self.get_task(task_name)
-        if task:
+        if task is not None:
             if task.is_running():
                 task.stop()
                 await interaction.response.send_message(f"Stopped task: {task_name}. (Task will finish its current iteration before stopping.)")
@@ -73,13 +73,13 @@ class BackgroundTaskCommands(commands.Cog):
     @app_commands.choices(
         task_name=[
             Choice(name="periodic_stat_update", value="periodic_stat_update"),
-            Choice(name="check_departure_messages_loop", value="check_departure_messages_loop"),
+            Choice(name="departure_reminders", value="departure_reminders"),
             Choice(name="public_holiday_loop", value="public_holiday_loop"),
         ]
     )
     async def task_status(self, interaction: discord.Interaction, task_name: str):
         task = self.get_task(task_name)
-        if task:
+        if task is not None:
             status = "running" if task.is_running() else "stopped"
             await interaction.response.send_message(f"Task {task_name} is currently {status}.")
         else:
@@ -89,7 +89,7 @@ class BackgroundTaskCommands(commands.Cog):
     def get_task(self, task_name: str):
         tasks = {
             "periodic_stat_update": bot.get_cog("DatabaseInteraction").periodic_stat_update,
-            "check_departure_messages_loop": bot.get_cog("Departures").check_departure_messages_loop,
+            "departure_reminders": bot.get_cog("Departures").departure_reminders,
             "public_holiday_loop": bot.get_cog("PublicHoliday").public_holiday_loop,
         }
         return tasks.get(task_name)
@@ -5,12 +5,16 @@ Cog for all the commands that interact with the database
 
 # libraries
 import asyncio
+import copy
 import sqlite3
 from datetime import datetime, timedelta
 import math
 import os.path
 import re
+import threading
+import time
 import gspread
+from gspread.utils import numericise_all
 from oauth2client.service_account import ServiceAccountCredentials
 
 # discord.py
@@ -37,6 +41,11 @@ from ptn.boozebot.constants import (
     get_primary_booze_discussions_channel,
     GOOGLE_OAUTH_CREDENTIALS_PATH,
     _production,
+    get_sheet_refresh_max_age,
+    get_sheet_full_resync_interval,
+    get_ingest_backstop_interval,
+    get_sheets_reads_per_minute,
+    get_sheets_priority_reserve,
 )
 
 # local classes
@@ -51,13 +60,33 @@ from ptn.boozebot.modules.ErrorHandler import (
 )
 from ptn.boozebot.modules.helpers import bot_exit, check_roles, check_command_channel
 from ptn.boozebot.database.database import (
-    pirate_steve_db,
-    pirate_steve_conn,
+    pirate_steve_connections,
+    pirate_steve_profiler,
+    pirate_steve_backups,
+    read_cursor,
+    write_cursor,
     dump_database,
-    pirate_steve_lock,
+    request_backup,
+    run_blocking,
+    fetch_all,
+    fetch_one,
+    execute_commit,
+    current_cruise_stats,
+    archived_cruise_stats,
+    archived_cruise_count,
+    carrier_leaderboard,
+)
+from ptn.boozebot.database.cruise_stats import rollup_cruises
+from ptn.boozebot.database.lifetime import CarrierLifetime, add_cruise_to_lifetime
+from ptn.boozebot.database.reconcile import (
+    aggregate_sheet_records,
+    merge_sheet_records,
+    load_sheet_sync_state,
+    reconcile_carriers,
 )
 from ptn.boozebot.modules.PHcheck import ph_check
 from ptn.boozebot.modules.pagination import createPagination
+from ptn.boozebot.modules.sheet_backend import GspreadSheetBackend, SheetBackend, SheetsQuota, sheet_priority
 
 """
 DATABASE INTERACTION COMMANDS
@@ -101,10 +130,37 @@ class DatabaseInteraction(commands.Cog):
 
         # authorize the client sheet
         self.client = gspread.authorize(credentials)
-        self.tracking_sheet = None
+        # Every request to Google goes through this, so a burst of commands cannot run the bot out of read quota
+        self.sheets_quota = SheetsQuota(get_sheets_reads_per_minute(), get_sheets_priority_reserve())
+        self.tracking_sheet = None  # type: SheetBackend | None
         self.update_allowed = True  # This might be better stored somewhere over a reset
-        pirate_steve_db.execute("SELECT * FROM trackingforms")
-        forms = dict(pirate_steve_db.fetchone())
+
+        # The aggregated sheet carriers as of the last processed row, used by the incremental sync
+        self.sheet_carriers = None  # type: dict[str, BoozeCarrier] | None
+        self.sheet_headers = None
+        # The sheet's change token as of the last sync, a poll that sees the same token downloads nothing
+        self.sheet_change_token = None
+        # time.monotonic() of the last full resync, incremental polls fall back to one once it is too old
+        self._last_full_sync = None
+        # The carriers the last full resync found missing from the sheet, incremental polls cannot tell
+        self._invalid_database_entries = []
+        # Serialises the sheet sync and pushed form responses, both move the aggregate and the last processed row
+        self._sheet_lock = threading.Lock()
+        # Pushed form responses by sheet row, waiting on an earlier row that has not arrived yet
+        self._pending_pushes = {}  # type: dict[int, dict]
+        # Set once the ingestion endpoint is up, polling then only runs as a backstop
+        self.ingest_active = False
+        self._gap_refresh_task = None  # type: asyncio.Task | None
+
+        # Single flight state for the sheet refresh, see refresh_db
+        self._refresh_task = None  # type: asyncio.Task | None
+        self._last_refresh_result = None
+        self._last_refresh_time = None  # time.monotonic() of the last completed refresh
+        self._last_refresh_error = None  # Why the last refresh failed, cleared by the next one that completes
+
+        with read_cursor() as cursor:
+            cursor.execute("SELECT * FROM trackingforms")
+            forms = dict(cursor.fetchone())
 
         self.worksheet_key = forms["worksheet_key"]
 
@@ -114,18 +170,18 @@ class DatabaseInteraction(commands.Cog):
         # input form is the form we have loaders fill in
         self.loader_signup_form_url = forms["loader_input_form_url"]
 
-        self._reconfigure_workbook_and_form()
-
-        self._update_db()  # On instantiation, go build the DB
-
     # custom global error handler
     # attaching the handler when the cog is loaded
     # and storing the old handler
-    def cog_load(self):
+    async def cog_load(self):
         tree = self.bot.tree
         self._old_tree_error = tree.on_error
         tree.on_error = on_app_command_error
 
+        # On load, go build the DB. The sheet calls run on the database executor so the loop stays responsive.
+        await run_blocking(self._reconfigure_workbook_and_form)
+        await self.refresh_db(report=False)
+
     # detaching the handler when the cog is unloaded
     def cog_unload(self):
         tree = self.bot.tree
@@ -138,26 +194,151 @@ class DatabaseInteraction(commands.Cog):
 
         :returns: None
         """
+        with self._sheet_lock:
+            self._reconfigure_workbook_and_form_locked()
+
+    def _reconfigure_workbook_and_form_locked(self):
         # The key is part of the URL
         try:
             self.tracking_sheet = None
+            self.sheet_change_token = None
+            self._pending_pushes = {}
             print(f"Building worksheet with the key: {self.worksheet_key}")
-            workbook = self.client.open_by_key(self.worksheet_key)
+            workbook = self.sheets_quota.call("open_by_key", self.client.open_by_key, self.worksheet_key)
 
-            for sheet in workbook.worksheets():
+            for sheet in self.sheets_quota.call("worksheets", workbook.worksheets):
                 print(sheet.title)
 
             # Update the tracking sheet object
-            self.tracking_sheet = workbook.get_worksheet(self.worksheet_with_data_id)
+            self.tracking_sheet = GspreadSheetBackend(
+                self.sheets_quota.call("get_worksheet", workbook.get_worksheet, self.worksheet_with_data_id),
+                self.sheets_quota,
+            )
         except gspread.exceptions.APIError as e:
             print(f"Error reading the worksheet: {e}")
 
-    def _update_db(self):
+    async def update_db(self, full_resync=False, priority=True):
+        """
+        Runs the DB update on the database executor so the sheet download never blocks the event loop.
+
+        :param bool full_resync: Download and reconcile the whole sheet rather than only the new rows.
+        :param bool priority: A user is waiting on this, so its sheet requests go ahead of background polling.
+        :returns: The reconciliation result, see _update_db
+        :rtype: dict
+        """
+        return await run_blocking(self._prioritised_update_db, full_resync, priority)
+
+    def _prioritised_update_db(self, full_resync, priority):
+        with sheet_priority(priority), self._sheet_lock:
+            return self._update_db(full_resync)
+
+    async def refresh_db(self, full_resync=False, max_age=None, report=True, priority=True):
+        """
+        Single flight wrapper around update_db. Concurrent callers share the refresh that is already running, and a
+        refresh that completed within the staleness window is reused without touching the sheet.
+
+        :param bool full_resync: Force a full resync. This waits out any refresh in flight and then runs a new one.
+        :param int max_age: How old, in seconds, a previous refresh may be to get reused. Defaults to
+            PTN_BOOZEBOT_SHEET_REFRESH_MAX_AGE, or PTN_BOOZEBOT_INGEST_BACKSTOP_INTERVAL while form responses are
+            being pushed to us.
+        :param bool report: Post the result to the sommeliers if this call ends up running the refresh.
+        :param bool priority: A user is waiting on this. Background polling passes False so it only uses the sheet
+            quota left over after the reserve for commands.
+        :returns: The reconciliation result, see _update_db
+        :rtype: dict
+        """
+        if max_age is None:
+            if full_resync:
+                max_age = 0
+            elif self.ingest_active:
+                max_age = get_ingest_backstop_interval()
+            else:
+                max_age = get_sheet_refresh_max_age()
+
+        while self._refresh_task is not None:
+            # Shield the shared task so one caller timing out does not cancel it for everyone else.
+            result = await asyncio.shield(self._refresh_task)
+            if not full_resync:
+                return result
+
+        age = self.data_age()
+        if age is not None and age <= max_age:
+            return self._last_refresh_result
+
+        self._refresh_task = asyncio.create_task(self._run_refresh(full_resync, report, priority))
+        return await asyncio.shield(self._refresh_task)
+
+    async def _run_refresh(self, full_resync, report, priority):
+        try:
+            try:
+                result = await self.update_db(full_resync, priority)
+            except gspread.exceptions.APIError as e:
+                # Keep serving the last good result, but make it visible that it is going stale.
+                self._last_refresh_error = e
+                print(f"Refreshing from the signup sheet failed, carrier data is going stale: {e}")
+                raise
+            if result is not None:
+                # None means nothing was refreshed, updates are off or the sheet could not be read, so the data is
+                # as old as it was.
+                self._last_refresh_error = None
+                self._last_refresh_result = result
+                self._last_refresh_time = time.monotonic()
+            if report and result:
+                await self.report_db_update_result(result)
+            return result
+        finally:
+            self._refresh_task = None
+
+    def invalidate_refresh(self):
+        """
+        Forgets the last refresh so the next command pulls from the sheet again.
+
+        :returns: None
+        """
+        self._last_refresh_result = None
+        self._last_refresh_time = None
+
+    def data_age(self):
+        """
+        Returns how many seconds ago the DB was last refreshed from the sheet.
+
+        :returns: The age in seconds, or None if no refresh has completed yet
+        :rtype: float | None
+        """
+        if self._last_refresh_time is None:
+            return None
+        return time.monotonic() - self._last_refresh_time
+
+    def data_age_note(self):
+        """
+        Returns a short note on how old the carrier data is, for command responses.
+
+        :returns: The note
+        :rtype: str
+        """
+        age = self.data_age()
+        failed = " The last refresh failed, Google may be rate limiting us." if self._last_refresh_error else ""
+        if age is None:
+            return f"Carrier data has not been refreshed from the signup sheet yet.{failed}"
+        if age < 60:
+            return f"Carrier data refreshed from the signup sheet {int(age)}s ago.{failed}"
+        return f"Carrier data refreshed from the signup sheet {int(age // 60)}m {int(age % 60)}s ago.{failed}"
+
+    def _update_db(self, full_resync=False):
         """
         Private method to wrap the DB update commands.
 
-        :returns:
-        :rtype:
+        Form responses are mostly append only, so by default only the rows added since the last poll are pulled from
+        the sheet. A full resync runs when asked for, when the sheet was switched or shrank, when the sheet changed
+        without growing (an existing row was edited), and every PTN_BOOZEBOT_SHEET_FULL_RESYNC_INTERVAL seconds to pick
+        up edits made alongside new rows.
+
+        Before anything else the sheet is probed for its change token. If it matches the last sync, nothing is
+        downloaded at all.
+
+        :param bool full_resync: Download and reconcile the whole sheet rather than only the new rows.
+        :returns: The reconciliation result, see reconcile_carriers
+        :rtype: dict
         """
         if not self.tracking_sheet:
             raise EnvironmentError(
@@ -171,184 +352,380 @@ class DatabaseInteraction(commands.Cog):
             )
             return
 
-        updated_db = False
-        added_count = 0
-        updated_count = 0
-        unchanged_count = 0
-        # A JSON form tracking all the records
-        records_data = self.tracking_sheet.get_all_records()
-        new_signups = []  # type: list[discord.Embed]
+        # Taken before any values are read, so a form response landing mid sync is picked up by the next poll.
+        change_token = self.tracking_sheet.change_token()
+
+        with read_cursor() as cursor:
+            sync_state = load_sheet_sync_state(cursor)
+        if full_resync or not sync_state or (
+            sync_state["worksheet_key"] != self.worksheet_key
+            or sync_state["worksheet_with_data_id"] != self.worksheet_with_data_id
+        ):
+            result = self._full_sheet_sync()
+            if result is not None:
+                self.sheet_change_token = change_token
+            return result
+
+        if (
+            change_token is not None
+            and change_token == self.sheet_change_token
+            and self.sheet_carriers is not None
+        ):
+            print("Signup sheet unchanged since the last poll, skipping the download.")
+            return self._finish_update(self._unchanged_result())
+
+        if self._last_full_sync is None or time.monotonic() - self._last_full_sync >= get_sheet_full_resync_interval():
+            print("Due a full resync of the signup sheet.")
+            result = self._full_sheet_sync()
+            if result is not None:
+                self.sheet_change_token = change_token
+            return result
+
+        self._seed_sheet_carriers()
+        # A token that moved while no rows were added means a row already synced was edited.
+        sheet_edited = change_token is not None and self.sheet_change_token is not None
+        result = self._incremental_sheet_sync(sync_state["last_processed_row"], sheet_edited)
+        if result is not None:
+            self.sheet_change_token = change_token
+        return result
+
+    def _seed_sheet_carriers(self):
+        """
+        On a fresh start against a sheet we already synced, loads the aggregate from the database. The DB holds it as
+        of the last processed row, so the sync carries on from there.
 
-        total_entries = len(records_data)
-        print(f"Updating the database we have: {total_entries} records found.")
+        :returns: None
+        """
+        if self.sheet_carriers is not None:
+            return
+        print("Seeding the sheet aggregate from the database.")
+        with read_cursor() as cursor:
+            cursor.execute("SELECT * FROM boozecarriers")
+            self.sheet_carriers = {
+                carrier.carrier_identifier: carrier
+                for carrier in (BoozeCarrier.from_db_row(row) for row in cursor.fetchall())
+            }
+
+    async def ingest_form_response(self, row, record):
+        """
+        Writes a form response pushed to the ingestion endpoint, see modules/ingest.py.
 
-        all_carriers_data = {} # type: dict[str, BoozeCarrier]
+        :param int row: The sheet row the response landed on.
+        :param dict record: The response keyed by the sheet headers.
+        :returns: What happened to it, JSON friendly
+        :rtype: dict
+        :raises ValueError: If the record holds an invalid carrier ID.
+        """
+        status, result = await run_blocking(self._ingest_form_response, row, record)
+        if status == "applied":
+            await self.report_new_and_invalid_carriers(result)
+            return {
+                "status": status,
+                "added": result["added_count"],
+                "updated": result["updated_count"],
+            }
+        if status == "queued":
+            # An earlier row never arrived, let the sheet fill the gap rather than wait for the backstop.
+            print(f"Pushed row {row} is ahead of the last processed row, polling the sheet for the gap.")
+            self._gap_refresh_task = asyncio.create_task(self.refresh_db(max_age=0, priority=False))
+        return {"status": status}
+
+    def _ingest_form_response(self, row, record):
+        """
+        Folds pushed form responses into the aggregate under the same rules as the sheet sync.
 
-        # Loop through each record and parse it into a BoozeCarrier object
-        for record in records_data:
-            try:
-                carrier_data = BoozeCarrier(record)
+        Pushes are applied strictly in sheet row order and move the last processed row along with them, so the poll
+        never counts a pushed response a second time. Rows at or before the last processed row are duplicates of what
+        the poll already read and are dropped.
 
-                # Check if there is already a object for this carrier and update it if so
-                if carrier_data.carrier_identifier in all_carriers_data:
+        :param int row: The sheet row the response landed on.
+        :param dict record: The response keyed by the sheet headers.
+        :returns: The status, and the reconciliation result when rows were applied
+        :rtype: tuple[str, dict | None]
+        :raises ValueError: If the record holds an invalid carrier ID.
+        """
+        with self._sheet_lock:
+            if not self.tracking_sheet or not self.update_allowed:
+                return "ignored", None
+
+            with read_cursor() as cursor:
+                sync_state = load_sheet_sync_state(cursor)
+            if not sync_state or (
+                sync_state["worksheet_key"] != self.worksheet_key
+                or sync_state["worksheet_with_data_id"] != self.worksheet_with_data_id
+            ):
+                # The sheet needs a full sync first, which will read this row anyway.
+                return "ignored", None
+
+            last_processed_row = sync_state["last_processed_row"]
+            if row <= last_processed_row:
+                return "duplicate", None
+
+            self._pending_pushes[row] = record
+            for stale_row in [pending for pending in self._pending_pushes if pending <= last_processed_row]:
+                del self._pending_pushes[stale_row]
+
+            rows = []
+            next_row = last_processed_row + 1
+            while next_row in self._pending_pushes:
+                rows.append(self._pending_pushes[next_row])
+                next_row += 1
+            if not rows:
+                return "queued", None
+
+            if not self.sheet_headers:
+                self.sheet_headers = self.tracking_sheet.header()
+            # Through the same conversion as rows read from the sheet, so numbers come out the same either way.
+            records_data = self._sheet_rows_to_records(
+                [
+                    ["" if record.get(header) is None else str(record[header]) for header in self.sheet_headers]
+                    for record in rows
+                ]
+            )
 
-                    all_carriers_data[carrier_data.carrier_identifier].wine_total += carrier_data.wine_total
-                    all_carriers_data[carrier_data.carrier_identifier].run_count += 1
+            self._seed_sheet_carriers()
+            all_carriers_data = {
+                carrier_id: copy.copy(carrier) for carrier_id, carrier in self.sheet_carriers.items()
+            }
+            try:
+                touched_ids = merge_sheet_records(all_carriers_data, records_data)
+            except ValueError:
+                # Leave these rows to the poll, which reads them from the sheet and reports the bad one.
+                for dropped_row in range(last_processed_row + 1, next_row):
+                    del self._pending_pushes[dropped_row]
+                raise
+
+            result = reconcile_carriers(
+                pirate_steve_connections.writer,
+                pirate_steve_connections.write_lock,
+                all_carriers_data,
+                only_ids=touched_ids,
+                sync_state=(self.worksheet_key, self.worksheet_with_data_id, next_row - 1),
+            )
+            self.sheet_carriers = all_carriers_data
+            for applied_row in range(last_processed_row + 1, next_row):
+                del self._pending_pushes[applied_row]
+            print(f"Applied pushed form responses for rows {last_processed_row + 1} to {next_row - 1}.")
 
-                else:
-                    all_carriers_data[carrier_data.carrier_identifier] = carrier_data
-            except ValueError as ex:
-                print(f"Error while paring the stats into carrier records: {ex}")
-                return
+            return "applied", self._finish_update(result)
 
-        print(f"Total Carriers: {len(all_carriers_data)}")
+    def _unchanged_result(self):
+        """
+        The reconciliation result for a poll that found nothing new.
 
-        for carrier_data in all_carriers_data.items():
+        :returns: The result
+        :rtype: dict
+        """
+        return {
+            "updated_db": False,
+            "added_count": 0,
+            "updated_count": 0,
+            "unchanged_count": len(self.sheet_carriers),
+            "skipped_count": len(self.sheet_carriers),
+            "total_carriers": len(self.sheet_carriers),
+            "invalid_database_entries": list(self._invalid_database_entries),
+            "new_carriers": [],
+        }
 
-            carrier_data = carrier_data[1]
+    def _sheet_rows_to_records(self, rows):
+        """
+        Turns raw sheet rows into records keyed by the header row, the same way gspread get_all_records does.
 
-            pirate_steve_db.execute(
-                "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)",
-                (f'%{carrier_data.carrier_identifier}%',),
-            )
+        :param list[list[str]] rows: The raw row values
+        :returns: The records
+        :rtype: list[dict]
+        """
+        width = len(self.sheet_headers)
+        return [
+            dict(zip(self.sheet_headers, numericise_all(row + [""] * (width - len(row)))))
+            for row in rows
+        ]
 
-            old_carrier_data = [
-                BoozeCarrier(carrier_data) for carrier_data in pirate_steve_db.fetchall()
-            ]
+    def _full_sheet_sync(self):
+        """
+        Downloads the whole form response sheet and reconciles every carrier against the database.
 
-            if len(old_carrier_data) > 1:
-                raise ValueError(
-                    f"{len(old_carrier_data)} carriers are listed with this carrier ID:"
-                    f' {carrier_data.carrier_identifier}. Problem in the DB!'
-                )
+        :returns: The reconciliation result
+        :rtype: dict
+        """
+        values = self.tracking_sheet.all_values()
+        self.sheet_headers = values[0] if values else []
+        records_data = self._sheet_rows_to_records(values[1:])
 
-            # If the carrier is in the database, check if the data is the same
-            if old_carrier_data:
-                old_carrier_data = old_carrier_data[0]
+        total_entries = len(records_data)
+        print(f"Updating the database we have: {total_entries} records found.")
 
-                print(f"EXPECTED: \t{carrier_data}")
-                print(f"RECORD: \t{old_carrier_data}")
-                print(f"EQUALITY: \t{carrier_data == old_carrier_data}")
+        # Parse every record into a BoozeCarrier object, one per carrier
+        try:
+            all_carriers_data = aggregate_sheet_records(records_data)
+        except ValueError as ex:
+            print(f"Error while paring the stats into carrier records: {ex}")
+            return
 
-                # If the data is the same, skip over, otherwise update it
-                if old_carrier_data != carrier_data:
+        print(f"Total Carriers: {len(all_carriers_data)}")
 
-                    print(
-                        f"The DB data for {carrier_data.carrier_name} does not equal the input in GoogleSheets "
-                        f"- Updating"
-                    )
-                    updated_count += 1
-                    try:
-                        pirate_steve_lock.acquire()
-                        data = (
-                            carrier_data.carrier_name,
-                            carrier_data.wine_total,
-                            carrier_data.discord_username,
-                            carrier_data.timestamp,
-                            carrier_data.run_count,
-                            f"%{old_carrier_data.carrier_identifier}%",
-                        )
+        # The header is row 1, so the last data row is also the number of rows we pulled.
+        result = reconcile_carriers(
+            pirate_steve_connections.writer,
+            pirate_steve_connections.write_lock,
+            all_carriers_data,
+            sync_state=(self.worksheet_key, self.worksheet_with_data_id, len(values)),
+        )
+        self.sheet_carriers = all_carriers_data
+        self._last_full_sync = time.monotonic()
+        self._invalid_database_entries = list(result["invalid_database_entries"])
 
-                        pirate_steve_db.execute(
-                            """ UPDATE boozecarriers 
-                            SET carriername=?, winetotal=?, 
-                            discordusername=?, timestamp=?, runtotal=?
-                            WHERE carrierid LIKE (?) """,
-                            data,
-                        )
+        return self._finish_update(result)
 
-                        updated_db = True
+    def _incremental_sheet_sync(self, last_processed_row, sheet_edited=False):
+        """
+        Pulls only the form responses appended since the last processed row and re-aggregates the carriers they
+        touch. Falls back to a full resync if the sheet shrank, or if it was edited without growing.
 
-                    except sqlite3.IntegrityError as ex:
-                        print(f"WARNING: {ex}")
-                        print(
-                            f"Error updating the carrier data in the db for: {carrier_data}"
-                        )
-                        raise ex
-                    finally:
-                        pirate_steve_lock.release()
+        :param int last_processed_row: The last sheet row already folded into the database.
+        :param bool sheet_edited: The sheet's change token moved since the last sync.
+        :returns: The reconciliation result
+        :rtype: dict
+        """
+        row_count = self.tracking_sheet.row_count()
 
-                else:
-                    print(
-                        f"The DB data for {carrier_data.carrier_name} is the same as the sheets record - "
-                        f"skipping over."
-                    )
-                    unchanged_count += 1
+        if row_count < last_processed_row:
+            print(f"Sheet shrank from {last_processed_row} to {row_count} rows, running a full resync.")
+            return self._full_sheet_sync()
 
-            # If carrier is not in the database, add it
-            else:
-                added_count += 1
-                print(carrier_data.to_dictionary())
-                print(
-                    f'Carrier {carrier_data.carrier_name} is not yet in the database - adding it'
-                )
-                try:
-                    pirate_steve_lock.acquire()
-                    pirate_steve_db.execute(
-                        """ 
-                    INSERT INTO boozecarriers VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?) 
-                    """,
-                        (
-                            carrier_data.carrier_name,
-                            carrier_data.carrier_identifier,
-                            carrier_data.wine_total,
-                            carrier_data.platform,
-                            carrier_data.ptn_carrier,
-                            carrier_data.discord_username,
-                            carrier_data.timestamp,
-                            carrier_data.run_count,
-                            carrier_data.total_unloads,
-                            carrier_data.timezone,
-                        ),
-                    )
-                finally:
-                    pirate_steve_lock.release()
+        if row_count == last_processed_row:
+            if sheet_edited:
+                print(f"Sheet changed without new rows since row {last_processed_row}, running a full resync.")
+                return self._full_sheet_sync()
+            print(f"No new sheet rows since row {last_processed_row}.")
+            return self._finish_update(self._unchanged_result())
 
-                updated_db = True
-                print("Added carrier to the database")
+        if not self.sheet_headers:
+            self.sheet_headers = self.tracking_sheet.header()
 
-                embed = discord.Embed(title="New WineCarrier signed up!")
-                embed.add_field(
-                    name=f"Owner: {carrier_data.discord_username}: {carrier_data.carrier_name} ({carrier_data.carrier_identifier})",
-                    value=f"{carrier_data.wine_total // carrier_data.run_count} tonnes of wine on {carrier_data.platform}",
-                    inline=False,
-                )
-                new_signups.append(embed)
+        rows = self.tracking_sheet.rows(last_processed_row + 1, row_count, len(self.sheet_headers))
+        records_data = self._sheet_rows_to_records(rows)
+        print(f"Updating the database with {len(records_data)} new records from row {last_processed_row + 1}.")
 
-        print(f"all_carrier_sheet_ids: {list(all_carriers_data.keys())}")
+        # Work on a copy so a bad row does not leave the aggregate half updated.
+        all_carriers_data = {
+            carrier_id: copy.copy(carrier) for carrier_id, carrier in self.sheet_carriers.items()
+        }
+        try:
+            touched_ids = merge_sheet_records(all_carriers_data, records_data)
+        except ValueError as ex:
+            print(f"Error while paring the stats into carrier records: {ex}")
+            return
 
-        # Now that the records are updated, make sure no carrier was removed - check for anything not matching the
-        # carrier id strings.
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid NOT IN ({})".format(
-                ", ".join("?" * len(list(all_carriers_data.keys())))
-            ),
-            list(all_carriers_data.keys()),
+        result = reconcile_carriers(
+            pirate_steve_connections.writer,
+            pirate_steve_connections.write_lock,
+            all_carriers_data,
+            only_ids=touched_ids,
+            sync_state=(self.worksheet_key, self.worksheet_with_data_id, row_count),
         )
+        self.sheet_carriers = all_carriers_data
+        # Only a full resync can tell which carriers left the sheet, keep reporting what the last one found.
+        result["invalid_database_entries"] = list(self._invalid_database_entries)
 
-        invalid_database_entries = [
-            BoozeCarrier(invalid_carrier) for invalid_carrier in pirate_steve_db.fetchall()
-        ]
+        return self._finish_update(result)
+
+    def _archive_cruise(self, start_date):
+        """
+        Moves the current cruise into the historical tables and empties boozecarriers for the next one.
 
-        if updated_db:
-            # Write the database and then dump the updated SQL
+        Runs under the sheet lock, so a sync in flight finishes before the carriers are cleared rather than writing
+        them back afterwards. Updates stay off until the next form is set, and the sync cache is dropped with the data
+        it describes.
+
+        :param datetime start_date: The first day of the holiday being archived.
+        :returns: None
+        """
+        with self._sheet_lock:
+            update_allowed = self.update_allowed
+            self.update_allowed = False
             try:
-                pirate_steve_lock.acquire()
-                pirate_steve_conn.commit()
-            finally:
-                pirate_steve_lock.release()
-            dump_database()
-            print("Wrote the database and dumped the SQL")
+                # One transaction, so a failure part way never leaves the cruise half archived.
+                with write_cursor() as cursor:
+                    end_date = start_date + timedelta(days=2)
+                    data = (
+                        start_date,
+                        end_date,
+                    )
+                    cursor.execute(
+                        """
+                              INSERT INTO historical (carriername, carrierid, winetotal, platform, 
+                              officialcarrier, discordusername, timestamp, runtotal, totalunloads)
+                              SELECT carriername, carrierid, winetotal, platform, officialcarrier, discordusername, 
+                              timestamp, runtotal, totalunloads
+                              FROM boozecarriers
+                          """
+                    )
+                    # Now that we copied the columns, go update the timestamps for the cruise. This probably
+                    # could be chained into the above statement, but effort to figure the syntax out.
+                    cursor.execute(
+                        """
+                              UPDATE historical
+                              SET holiday_start=?, holiday_end=?
+                              WHERE holiday_start IS NULL
+                          """,
+                        data,
+                    )
+                    rollup_cruises(cursor, start_date)
+                    add_cruise_to_lifetime(cursor, start_date)
 
-        return {
-            "updated_db": updated_db,
-            "added_count": added_count,
-            "updated_count": updated_count,
-            "unchanged_count": unchanged_count,
-            "total_carriers": len(all_carriers_data),
-            "invalid_database_entries": invalid_database_entries,
-            "new_signups": new_signups,
-        }
+                    print("Removing the values from the current table.")
+                    cursor.execute(
+                        """
+                        DELETE FROM boozecarriers
+                    """
+                    )
+                    # The next cruise starts from a clean sheet, so the incremental sync has to start over too.
+                    cursor.execute("DELETE FROM sheetsyncstate")
+            except Exception:
+                self.update_allowed = update_allowed
+                raise
+
+            self.sheet_carriers = None
+            self.sheet_change_token = None
+            self._last_full_sync = None
+            self._invalid_database_entries = []
+            self.invalidate_refresh()
+        request_backup()
+
+    def _finish_update(self, result):
+        """
+        Schedules a backup if anything changed and builds the signup embeds for the new carriers.
+
+        :param dict result: The reconciliation result
+        :returns: The result in the shape report_db_update_result consumes
+        :rtype: dict
+        """
+        if result["updated_db"]:
+            request_backup()
+            print("Wrote the database and scheduled a backup")
+
+        result["new_signups"] = [
+            self.build_new_signup_embed(carrier_data) for carrier_data in result.pop("new_carriers")
+        ]
+        return result
+
+    @staticmethod
+    def build_new_signup_embed(carrier_data):
+        """
+        Builds the embed announcing a newly signed up carrier.
+
+        :param BoozeCarrier carrier_data: The new carrier
+        :returns: The embed for the sommelier channel
+        :rtype: discord.Embed
+        """
+        embed = discord.Embed(title="New WineCarrier signed up!")
+        embed.add_field(
+            name=f"Owner: {carrier_data.discord_username}: {carrier_data.carrier_name} ({carrier_data.carrier_identifier})",
+            value=f"{carrier_data.wine_total // carrier_data.run_count} tonnes of wine on {carrier_data.platform}",
+            inline=False,
+        )
+        return embed
 
     async def report_db_update_result(self, result: dict, force_embed=False):
 
@@ -425,32 +802,21 @@ class DatabaseInteraction(commands.Cog):
         else:
             print("No new signed up carriers detected")
 
-    def build_stat_embed(
-        self, all_carrier_data, total_carriers_multiple_trips, target_date=None, include_timestamp=False
-    ):
+    def build_stat_embed(self, cruise_stats, target_date=None, include_timestamp=False):
         """
         Builds the stat embed
 
-        :param [BoozeCarrier] all_carrier_data: The list of all carriers
-        :param [BoozeCarrier] total_carriers_multiple_trips: The list of all carriers making multiple trips
+        :param CruiseStats cruise_stats: The totals for the cruise
         :param str target_date: the target date
         :return: the built embed object
         :rtype: discord.Embed
         """
-        print(f"Carriers with multiple trips: {len(total_carriers_multiple_trips)}.")
+        print(f"Carriers with multiple trips: {cruise_stats.multiple_trip_carriers}.")
 
-        extra_carrier_count = sum(
-            carrier.run_count - 1 for carrier in total_carriers_multiple_trips
-        )
-
-        unique_carrier_count = len(all_carrier_data)
-        total_carriers_inc_multiple_trips = unique_carrier_count + extra_carrier_count
+        unique_carrier_count = cruise_stats.unique_carriers
+        total_carriers_inc_multiple_trips = cruise_stats.total_trips
 
-        total_wine = (
-            sum(carrier.wine_total for carrier in all_carrier_data)
-            if all_carrier_data
-            else 0
-        )
+        total_wine = cruise_stats.total_wine
 
         wine_per_capita = (total_wine / RACKHAMS_PEAK_POP) if total_wine else 0
         wine_per_carrier = (total_wine / unique_carrier_count) if total_wine else 0
@@ -524,8 +890,8 @@ class DatabaseInteraction(commands.Cog):
         print("Returning embed to user")
         return stat_embed
 
-    def build_extended_stat_embed(self, all_carrier_data, total_carriers_multiple_trips, target_date=None):
-        total_wine = sum(carrier.wine_total for carrier in all_carrier_data)
+    def build_extended_stat_embed(self, cruise_stats, target_date=None):
+        total_wine = cruise_stats.total_wine
 
         total_wine_per_capita = total_wine / RACKHAMS_PEAK_POP
 
@@ -632,24 +998,13 @@ class DatabaseInteraction(commands.Cog):
             print("Period trigger of the embed update.")
 
             print("Running db update")
-            await self.report_db_update_result(self._update_db())
+            await self.refresh_db(priority=False)
 
-            pirate_steve_db.execute("SELECT * FROM pinned_messages")
             # Get everything
-            all_pins = [dict(value) for value in pirate_steve_db.fetchall()]
-
-            # Get all carriers
-            pirate_steve_db.execute("SELECT * FROM boozecarriers")
-            all_carrier_data = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-            pirate_steve_db.execute("SELECT * FROM boozecarriers WHERE runtotal > 1")
-            total_carriers_multiple_trips = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-            stat_embed = self.build_stat_embed(
-                all_carrier_data, total_carriers_multiple_trips, None, True
-            )
+            all_pins = [dict(value) for value in await fetch_all("SELECT * FROM pinned_messages")]
+
+            cruise_stats = await current_cruise_stats()
+            stat_embed = self.build_stat_embed(cruise_stats, None, True)
 
             print("Updating pinned messages")
             if all_pins:
@@ -662,11 +1017,7 @@ class DatabaseInteraction(commands.Cog):
                 print("No pinned messages to update.")
 
             print("Updating discord activity")
-            total_wine = (
-                sum(carrier.wine_total for carrier in all_carrier_data)
-                if all_carrier_data
-                else 0
-            )
+            total_wine = cruise_stats.total_wine
 
             guild = await bot.fetch_guild(bot_guild_id())
             booze_cruise_chat = await guild.fetch_channel(get_primary_booze_discussions_channel())
@@ -721,7 +1072,10 @@ class DatabaseInteraction(commands.Cog):
         await interaction.response.defer()
 
         try:
-            await self.report_db_update_result(self._update_db(), force_embed=True)
+            result = await self.refresh_db(full_resync=True)
+            if result and not result["updated_db"]:
+                # Nothing changed so the refresh did not post the summary, but the user asked for it.
+                await self.report_db_update_result(result, force_embed=True)
             await interaction.followup.send(content="Pirate Steve's DB Update ran successfully.")
 
         except ValueError as ex:
@@ -751,12 +1105,12 @@ class DatabaseInteraction(commands.Cog):
         """
 
         await interaction.response.defer()
-        await self.report_db_update_result(self._update_db())
+        await self.refresh_db()
         print(f"{interaction.user.name} requested to find the carrier with wine")
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE runtotal > totalunloads"
-        )
-        carrier_data = [BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()]
+        carrier_data = [
+            BoozeCarrier.from_db_row(carrier)
+            for carrier in await fetch_all("SELECT * FROM boozecarriers WHERE runtotal > totalunloads")
+        ]
         if len(carrier_data) == 0:
             # No carriers remaining
             return await interaction.edit_original_response(
@@ -775,6 +1129,7 @@ class DatabaseInteraction(commands.Cog):
             interaction,
             "Carriers with wine remaining",
             carrier_data,
+            footer=self.data_age_note(),
         )
 
     @app_commands.command(
@@ -798,13 +1153,13 @@ class DatabaseInteraction(commands.Cog):
         """
 
         await interaction.response.defer()
-        await self.report_db_update_result(self._update_db())
+        await self.refresh_db()
         print(
             f"{interaction.user.name} wants to forcefully mark the carrier {carrier_id} as unloaded."
         )
 
         # Cast this to upper case just in case
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
 
         # Check the carrier ID regex
         if not re.match(r"\w{3}-\w{3}", carrier_id):
@@ -817,11 +1172,10 @@ class DatabaseInteraction(commands.Cog):
             )
 
         # Check if it is in the database already
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)", (f"%{carrier_id}%",)
-        )
         # Really only expect a single entry here, unique field and all that
-        carrier_data = BoozeCarrier(pirate_steve_db.fetchone())
+        carrier_data = BoozeCarrier(
+            await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (carrier_id,))
+        )
 
         carrier_embed = discord.Embed(
             title=f"Argh We found this data for {carrier_id}:",
@@ -842,7 +1196,7 @@ class DatabaseInteraction(commands.Cog):
             )
 
         # Send the embed
-        await interaction.edit_original_response(embed=carrier_embed)
+        await interaction.edit_original_response(content=self.data_age_note(), embed=carrier_embed)
 
         try:
             msg = await bot.wait_for("message", check=check, timeout=30)
@@ -865,21 +1219,15 @@ class DatabaseInteraction(commands.Cog):
                     )
 
                     # Go update the object in the database.
-                    try:
-                        pirate_steve_lock.acquire()
-
-                        data = (f"%{carrier_data.carrier_identifier}%",)
-                        pirate_steve_db.execute(
-                            """ 
-                            UPDATE boozecarriers 
-                            SET totalunloads=totalunloads+1, discord_unload_in_progress=NULL
-                            WHERE carrierid LIKE (?) 
-                            """,
-                            data,
-                        )
-                        pirate_steve_conn.commit()
-                    finally:
-                        pirate_steve_lock.release()
+                    data = (carrier_data.carrier_identifier,)
+                    await execute_commit(
+                        """ 
+                        UPDATE boozecarriers 
+                        SET totalunloads=totalunloads+1, discord_unload_in_progress=NULL
+                        WHERE carrierid = (?) 
+                        """,
+                        data,
+                    )
 
                     print(
                         f"Database for unloaded forcefully updated by {interaction.user.name} for {carrier_id}"
@@ -948,7 +1296,7 @@ class DatabaseInteraction(commands.Cog):
         """
 
         await interaction.response.defer()
-        await self.report_db_update_result(self._update_db())
+        await self.refresh_db()
         print(
             f"{interaction.user.name} requested to fine carriers for: {platform} with wine: {remaining_wine}"
         )
@@ -962,11 +1310,10 @@ class DatabaseInteraction(commands.Cog):
             carrier_search = "platform LIKE (?)"
 
         # Check if it is in the database already
-        pirate_steve_db.execute(
-            f"SELECT * FROM boozecarriers WHERE {carrier_search}", data
-        )
-        # Really only expect a single entry here, unique field and all that
-        carrier_data = [BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()]
+        carrier_data = [
+            BoozeCarrier.from_db_row(carrier)
+            for carrier in await fetch_all(f"SELECT * FROM boozecarriers WHERE {carrier_search}", data)
+        ]
 
         print(f"Found {len(carrier_data)} carriers matching the search")
 
@@ -985,6 +1332,7 @@ class DatabaseInteraction(commands.Cog):
             interaction,
             "Carriers found for",
             carrier_data,
+            footer=self.data_age_note(),
         )
 
     @app_commands.command(
@@ -1005,10 +1353,10 @@ class DatabaseInteraction(commands.Cog):
         self, interaction: discord.Interaction, carrier_id: str
     ):
         await interaction.response.defer()
-        await self.report_db_update_result(self._update_db())
+        await self.refresh_db()
         print(f"{interaction.user.name} wants to find a carrier by ID: {carrier_id}.")
         # Cast this to upper case just in case
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
         # Check the carrier ID regex
         if not re.match(r"\w{3}-\w{3}", carrier_id):
             print(
@@ -1019,11 +1367,10 @@ class DatabaseInteraction(commands.Cog):
             )
 
         # Check if it is in the database already
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid = (?)", (f"{carrier_id}",)
-        )
         # Really only expect a single entry here, unique field and all that
-        carrier_data = BoozeCarrier(pirate_steve_db.fetchone())
+        carrier_data = BoozeCarrier(
+            await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (f"{carrier_id}",))
+        )
         print(f"Found: {carrier_data}")
 
         if not carrier_data:
@@ -1042,7 +1389,7 @@ class DatabaseInteraction(commands.Cog):
             f"Operated by: {carrier_data.discord_username}",
         )
 
-        return await interaction.edit_original_response(embed=carrier_embed)
+        return await interaction.edit_original_response(content=self.data_age_note(), embed=carrier_embed)
 
     @app_commands.command(
         name="booze_tally",
@@ -1078,66 +1425,38 @@ class DatabaseInteraction(commands.Cog):
         )
         target_date = None
 
-        await self.report_db_update_result(self._update_db())
+        await self.refresh_db()
 
         if cruise_select == 0:
-            # Go get everything out of the database
-            pirate_steve_db.execute("SELECT * FROM boozecarriers")
-            all_carrier_data = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-            pirate_steve_db.execute("SELECT * FROM boozecarriers WHERE runtotal > 1")
+            cruise_stats = await current_cruise_stats()
 
         else:
-            # Get the dates in the DB and order them.
-            pirate_steve_db.execute(
-                "SELECT DISTINCT holiday_start FROM historical ORDER by holiday_start DESC"
-            )
-            all_dates = [dict(value) for value in pirate_steve_db.fetchall()]
+            # The archived cruises are rolled up newest first, the current cruise is not archived yet.
+            archived_cruise = await archived_cruise_stats(cruise_select)
 
-            if cruise_select > len(all_dates):
+            if archived_cruise is None:
                 print(
                     "Input for cruise value was out of bounds for the number of cruises recorded in the database."
                 )
                 return await interaction.edit_original_response(content=
-                    f"Pirate Steve only knows about the last: {len(all_dates)} booze cruises. "
+                    f"Pirate Steve only knows about the last: {await archived_cruise_count()} booze cruises. "
                     f"You wanted the -{cruise_select} data."
                 )
-            # Subtract 1 here, we filter the values out of the historical database, so the current cruise is not
-            # there yet
-            target_date = all_dates[cruise_select - 1]["holiday_start"]
-            print(f"We have found the following historical cruise dates: {all_dates}")
+            target_date, cruise_stats = archived_cruise
             print(f"We are interested in the {cruise} option - {target_date}")
 
-            data = (target_date,)
-            # In this case we want the historical data from the historical database
-            pirate_steve_db.execute(
-                "SELECT * FROM historical WHERE holiday_start = (?)", data
-            )
-            all_carrier_data = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-            pirate_steve_db.execute(
-                "SELECT * FROM historical WHERE runtotal > 1 AND holiday_start = (?)",
-                data,
-            )
+        stat_embed = self.build_stat_embed(cruise_stats, target_date)
 
-        total_carriers_multiple_trips = [
-            BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-        ]
-        stat_embed = self.build_stat_embed(
-            all_carrier_data, total_carriers_multiple_trips, target_date
+        await interaction.edit_original_response(
+            content=self.data_age_note() if cruise_select == 0 else None, embed=stat_embed
         )
 
-        await interaction.edit_original_response(embed=stat_embed)
-
         if cruise_select == 0:
             
-            pinned_stat_embed = self.build_stat_embed(all_carrier_data, total_carriers_multiple_trips, None, True)
+            pinned_stat_embed = self.build_stat_embed(cruise_stats, None, True)
             
             # Go update all the pinned embeds also.
-            pirate_steve_db.execute("""SELECT * FROM pinned_messages""")
-            pins = [dict(value) for value in pirate_steve_db.fetchall()]
+            pins = [dict(value) for value in await fetch_all("""SELECT * FROM pinned_messages""")]
             if pins:
                 print(f"Updating pinned messages: {pins}")
                 for pin in pins:
@@ -1202,15 +1521,10 @@ class DatabaseInteraction(commands.Cog):
             message_id,
             channel_id,
         )
-        try:
-            print("Writing to the DB the message data")
-            pirate_steve_lock.acquire()
-            pirate_steve_db.execute(
-                """INSERT INTO pinned_messages VALUES(NULL, ?, ?)""", data
-            )
-            pirate_steve_conn.commit()
-        finally:
-            pirate_steve_lock.release()
+        print("Writing to the DB the message data")
+        await execute_commit(
+            """INSERT INTO pinned_messages VALUES(NULL, ?, ?)""", data
+        )
 
         if not message.pinned:
             print("Message is not pinned - do it now")
@@ -1244,9 +1558,8 @@ class DatabaseInteraction(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         print(f"User {interaction.user.name} requested to clear the pinned messages.")
 
-        pirate_steve_db.execute("SELECT * FROM pinned_messages")
         # Get everything
-        all_pins = [dict(value) for value in pirate_steve_db.fetchall()]
+        all_pins = [dict(value) for value in await fetch_all("SELECT * FROM pinned_messages")]
         if all_pins:
             for pin in all_pins:
                 channel = bot.get_channel(int(pin["channel_id"]))
@@ -1255,16 +1568,11 @@ class DatabaseInteraction(commands.Cog):
                     reason=f"Pirate Steve unpinned at the request of: {interaction.user.name}"
                 )
                 print(f'Removed pinned message: {pin["message_id"]}.')
-            try:
-                print("Writing to the DB the message data to clear the pins")
-                pirate_steve_lock.acquire()
-                pirate_steve_db.execute(
-                    """DELETE FROM pinned_messages""",
-                )
-                pirate_steve_conn.commit()
-                print("Pinned messages removed")
-            finally:
-                pirate_steve_lock.release()
+            print("Writing to the DB the message data to clear the pins")
+            await execute_commit(
+                """DELETE FROM pinned_messages""",
+            )
+            print("Pinned messages removed")
             print("Pinned messages removed")
             await interaction.edit_original_response(
                 content="Pirate Steve removed all the pinned stat messages"
@@ -1305,11 +1613,11 @@ class DatabaseInteraction(commands.Cog):
         channel = bot.get_channel(channel_id)
         message_id = int(split_message_link[6])
 
-        pirate_steve_db.execute(
-            f"SELECT * FROM pinned_messages WHERE message_id = {message_id}"
-        )
         # Get everything matching message_id
-        all_pins = [dict(value) for value in pirate_steve_db.fetchall()]
+        all_pins = [
+            dict(value)
+            for value in await fetch_all("SELECT * FROM pinned_messages WHERE message_id = (?)", (message_id,))
+        ]
         if all_pins:
             for pin in all_pins:
                 channel = bot.get_channel(int(pin["channel_id"]))
@@ -1318,16 +1626,11 @@ class DatabaseInteraction(commands.Cog):
                     reason=f"Pirate Steve unpinned at the request of: {interaction.user.name}"
                 )
                 print(f'Removed pinned message: {pin["message_id"]}.')
-            try:
-                print("Writing to the DB the message data to clear the pins")
-                pirate_steve_lock.acquire()
-                pirate_steve_db.execute(
-                    """DELETE FROM pinned_messages""",
-                )
-                pirate_steve_conn.commit()
-                print("Pinned messages removed")
-            finally:
-                pirate_steve_lock.release()
+            print("Writing to the DB the message data to clear the pins")
+            await execute_commit(
+                """DELETE FROM pinned_messages""",
+            )
+            print("Pinned messages removed")
             print("Pinned messages removed")
             await interaction.edit_original_response(
                 content=f"Pirate Steve removed the pinned stat message for {message_link}"
@@ -1369,7 +1672,7 @@ class DatabaseInteraction(commands.Cog):
             f"User {interaction.user.name} requested the current extended stats of the cruise."
         )
 
-        await self.report_db_update_result(self._update_db())
+        await self.refresh_db()
 
         cruise = "this" if cruise_select == 0 else f"-{cruise_select}"
         print(
@@ -1378,55 +1681,27 @@ class DatabaseInteraction(commands.Cog):
         target_date = None
 
         if cruise_select == 0:
-            # Go get everything out of the database
-            pirate_steve_db.execute("SELECT * FROM boozecarriers")
-            all_carrier_data = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-            pirate_steve_db.execute("SELECT * FROM boozecarriers WHERE runtotal > 1")
-            total_carriers_multiple_trips = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
+            cruise_stats = await current_cruise_stats()
 
         else:
-            # Get the dates in the DB and order them.
-            pirate_steve_db.execute(
-                "SELECT DISTINCT holiday_start FROM historical ORDER by holiday_start DESC"
-            )
-            all_dates = [dict(value) for value in pirate_steve_db.fetchall()]
+            # The archived cruises are rolled up newest first, the current cruise is not archived yet.
+            archived_cruise = await archived_cruise_stats(cruise_select)
 
-            if cruise_select > len(all_dates):
+            if archived_cruise is None:
                 print(
                     "Input for cruise value was out of bounds for the number of cruises recorded in the database."
                 )
                 return await interaction.edit_original_response(content=
-                    f"Pirate Steve only knows about the last: {len(all_dates)} booze cruises. "
+                    f"Pirate Steve only knows about the last: {await archived_cruise_count()} booze cruises. "
                     f"You wanted the -{cruise_select} data."
                 )
-            # Subtract 1 here, we filter the values out of the historical database, so the current cruise is not
-            # there yet
-            target_date = all_dates[cruise_select - 1]["holiday_start"]
-            print(f"We have found the following historical cruise dates: {all_dates}")
+            target_date, cruise_stats = archived_cruise
             print(f"We are interested in the {cruise} option - {target_date}")
 
-            data = (target_date,)
-            # In this case we want the historical data from the historical database
-            pirate_steve_db.execute(
-                "SELECT * FROM historical WHERE holiday_start = (?)", data
-            )
-            all_carrier_data = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-            pirate_steve_db.execute(
-                "SELECT * FROM historical WHERE runtotal > 1 AND holiday_start = (?)",
-                data,
-            )
-            total_carriers_multiple_trips = [
-                BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-            ]
-
-        stat_embed = self.build_extended_stat_embed(all_carrier_data, total_carriers_multiple_trips, target_date)
-        await interaction.edit_original_response(embed=stat_embed)
+        stat_embed = self.build_extended_stat_embed(cruise_stats, target_date)
+        await interaction.edit_original_response(
+            content=self.data_age_note() if cruise_select == 0 else None, embed=stat_embed
+        )
 
     @app_commands.command(
         name="booze_carrier_summary",
@@ -1450,18 +1725,11 @@ class DatabaseInteraction(commands.Cog):
 
         await interaction.response.defer()
         print(f"User {interaction.user.name} requested a carrier summary")
-        pirate_steve_db.execute("SELECT * FROM boozecarriers")
-        carrier_data = [BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()]
-
-        total_carriers = len(carrier_data)
-        total_unloads = sum([carrier.total_unloads for carrier in carrier_data])
-        remaining_carriers = len(
-            [
-                carrier
-                for carrier in carrier_data
-                if carrier.run_count - carrier.total_unloads > 0
-            ]
-        )
+        cruise_stats = await current_cruise_stats()
+
+        total_carriers = cruise_stats.unique_carriers
+        total_unloads = cruise_stats.total_unloads
+        remaining_carriers = cruise_stats.remaining_carriers
         unloaded_carriers = total_carriers - remaining_carriers
 
         print(
@@ -1472,8 +1740,7 @@ class DatabaseInteraction(commands.Cog):
         else:
             duration_hours = 48
 
-            pirate_steve_db.execute("""SELECT timestamp FROM holidaystate""")
-            timestamp = pirate_steve_db.fetchone()
+            timestamp = await fetch_one("""SELECT timestamp FROM holidaystate""")
 
             start_time = datetime.strptime(
                 dict(timestamp).get("timestamp"), "%Y-%m-%d %H:%M:%S"
@@ -1515,7 +1782,7 @@ class DatabaseInteraction(commands.Cog):
             f"User {interaction.user.name} wants to remove the carrier with ID {carrier_id} from the database."
         )
         # Cast this to upper case just in case
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
 
         # Check the carrier ID regex
         if not re.match(r"\w{3}-\w{3}", carrier_id):
@@ -1528,11 +1795,10 @@ class DatabaseInteraction(commands.Cog):
             )
 
         # Check if it is in the database already
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid = (?)", (f"{carrier_id}",)
-        )
         # Really only expect a single entry here, unique field and all that
-        carrier_data = BoozeCarrier(pirate_steve_db.fetchone())
+        carrier_data = BoozeCarrier(
+            await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (f"{carrier_id}",))
+        )
         print(f"Found: {carrier_data}")
 
         if not carrier_data:
@@ -1582,21 +1848,16 @@ class DatabaseInteraction(commands.Cog):
                     )
 
                     # Go update the object in the database.
-                    try:
-                        pirate_steve_lock.acquire()
-                        print(f"Removing the entry ({carrier_id}) from the database.")
-                        pirate_steve_db.execute(
-                            """ 
-                            DELETE FROM boozecarriers 
-                            WHERE carrierid LIKE (?) 
-                            """,
-                            (f"%{carrier_id}%",),
-                        )
-                        pirate_steve_conn.commit()
-                        dump_database()
-                        print(f"Carrier ({carrier_id}) was removed from the database")
-                    finally:
-                        pirate_steve_lock.release()
+                    print(f"Removing the entry ({carrier_id}) from the database.")
+                    await execute_commit(
+                        """ 
+                        DELETE FROM boozecarriers 
+                        WHERE carrierid = (?) 
+                        """,
+                        (carrier_id,),
+                    )
+                    request_backup()
+                    print(f"Carrier ({carrier_id}) was removed from the database")
 
                     return await interaction.edit_original_response(
                         content=f"Fleet carrier: {carrier_id} for user: {carrier_data.discord_username} was removed",
@@ -1633,7 +1894,8 @@ class DatabaseInteraction(commands.Cog):
         await interaction.response.defer()
         print(f"User {interaction.user.name} requested to archive the database")
 
-        if _production and await ph_check():
+        # Archiving mid holiday loses carriers, so don't trust a cached answer here.
+        if _production and await ph_check(max_age=0):
             return await interaction.edit_original_response(
                 content="Pirate Steve thinks there is a party at Rackhams still. Try again once the grog "
                 "runs dry."
@@ -1697,11 +1959,10 @@ class DatabaseInteraction(commands.Cog):
 
         data = (resp_date,)
         # Check the date exists in the DB already, if so abort.
-        pirate_steve_db.execute(
+        if await fetch_all(
             "SELECT DISTINCT holiday_start FROM historical WHERE holiday_start = (?)",
             data,
-        )
-        if pirate_steve_db.fetchall():
+        ):
             print(
                 f"We have a record for this date ({resp_date}) in the historical DB already."
             )
@@ -1729,47 +1990,7 @@ class DatabaseInteraction(commands.Cog):
                 print(f"User response to date is: {user_response.content}")
                 await user_response.delete()
 
-                try:
-                    pirate_steve_lock.acquire()
-                    start_date = resp_date
-                    end_date = resp_date + timedelta(days=2)
-                    data = (
-                        start_date,
-                        end_date,
-                    )
-                    pirate_steve_db.execute(
-                        """
-                              INSERT INTO historical (carriername, carrierid, winetotal, platform, 
-                              officialcarrier, discordusername, timestamp, runtotal, totalunloads)
-                              SELECT carriername, carrierid, winetotal, platform, officialcarrier, discordusername, 
-                              timestamp, runtotal, totalunloads
-                              FROM boozecarriers
-                          """
-                    )
-                    # Now that we copied the columns, go update the timestamps for the cruise. This probably could
-                    # be chained into the above statement, but effort to figure the syntax out.
-                    pirate_steve_db.execute(
-                        """
-                              UPDATE historical
-                              SET holiday_start=?, holiday_end=?
-                              WHERE holiday_start IS NULL
-                          """,
-                        data,
-                    )
-                    pirate_steve_conn.commit()
-
-                    print("Removing the values from the current table.")
-                    pirate_steve_db.execute(
-                        """
-                        DELETE FROM boozecarriers
-                    """
-                    )
-                    pirate_steve_conn.commit()
-                    dump_database()
-                    # Disable the updates after we commit the changes!
-                    self.update_allowed = False
-                finally:
-                    pirate_steve_lock.release()
+                await run_blocking(self._archive_cruise, resp_date)
                 return await interaction.edit_original_response(
                     content=f"Pirate Steve rejigged his memory and saved the booze data starting "
                     f"on: {resp_date}!",
@@ -1845,9 +2066,8 @@ class DatabaseInteraction(commands.Cog):
         # TODO: See if we can add a validation for the URL
 
         # Check the dB is empty first.
-        pirate_steve_db.execute("SELECT * FROM boozecarriers")
         all_carrier_data = [
-            BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
+            BoozeCarrier.from_db_row(carrier) for carrier in await fetch_all("SELECT * FROM boozecarriers")
         ]
         if all_carrier_data:
             # archive the database first else we will end up in issues
@@ -1948,26 +2168,19 @@ class DatabaseInteraction(commands.Cog):
                 print(f"{interaction.user.name} confirms to write the database now.")
                 await user_response.delete()
 
-                try:
-                    pirate_steve_lock.acquire()
-
-                    data = (
-                        new_worksheet_key,
-                        new_loader_signup_form,
-                        new_sheet_id,
-                    )
-                    pirate_steve_db.execute(
-                        """
-                        UPDATE trackingforms 
-                        SET worksheet_key=?, loader_input_form_url=?, worksheet_with_data_id=?
-                      """,
-                        data,
-                    )
-
-                    pirate_steve_conn.commit()
-                    dump_database()
-                finally:
-                    pirate_steve_lock.release()
+                data = (
+                    new_worksheet_key,
+                    new_loader_signup_form,
+                    new_sheet_id,
+                )
+                await execute_commit(
+                    """
+                    UPDATE trackingforms 
+                    SET worksheet_key=?, loader_input_form_url=?, worksheet_with_data_id=?
+                  """,
+                    data,
+                )
+                request_backup()
 
                 self.worksheet_key = new_worksheet_key
                 self.worksheet_with_data_id = new_sheet_id
@@ -1976,8 +2189,8 @@ class DatabaseInteraction(commands.Cog):
                 try:
 
                     # Now go make the new updates to pull the data initially
-                    self._reconfigure_workbook_and_form()
-                    await self.report_db_update_result(self._update_db())
+                    await run_blocking(self._reconfigure_workbook_and_form)
+                    await self.refresh_db(full_resync=True)
 
                 except OSError as e:
                     self.update_allowed = init_update_value
@@ -2041,9 +2254,8 @@ class DatabaseInteraction(commands.Cog):
         self.update_allowed = False
 
         # Check the dB is empty first.
-        pirate_steve_db.execute("SELECT * FROM boozecarriers")
         all_carrier_data = [
-            BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
+            BoozeCarrier.from_db_row(carrier) for carrier in await fetch_all("SELECT * FROM boozecarriers")
         ]
         if all_carrier_data:
             # archive the database first else we will end up in issues
@@ -2083,8 +2295,8 @@ class DatabaseInteraction(commands.Cog):
                 try:
 
                     # Now go make the new updates to pull the data initially
-                    self._reconfigure_workbook_and_form()
-                    await self.report_db_update_result(self._update_db())
+                    await run_blocking(self._reconfigure_workbook_and_form)
+                    await self.refresh_db(full_resync=True)
 
                 except OSError as e:
                     self.update_allowed = init_update_value
@@ -2132,33 +2344,16 @@ class DatabaseInteraction(commands.Cog):
         print(f"{interaction.user.name} requested the biggest cruise tally, extended: {extended}.")
         await interaction.response.defer()
 
-        # Fetch the target date
-        pirate_steve_db.execute(
-            "SELECT holiday_start FROM historical GROUP BY holiday_start ORDER BY SUM(winetotal) DESC LIMIT 1;"
-        )
-        target_date = pirate_steve_db.fetchone()[0]
-
-        # Fetch all carrier data for the target date
-        pirate_steve_db.execute(
-            "SELECT * FROM historical WHERE holiday_start = ?;", (target_date,)
-        )
-        all_carrier_data = [
-            BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-        ]
-
-        # Fetch carriers with multiple trips for the target date
-        pirate_steve_db.execute(
-            "SELECT * FROM historical WHERE runtotal > 1 AND holiday_start = ?;", (target_date,)
-        )
-        total_carriers_multiple_trips = [
-            BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()
-        ]
+        biggest_cruise = await archived_cruise_stats(order_by="total_wine")
+        if biggest_cruise is None:
+            return await interaction.edit_original_response(content="Pirate Steve has no archived cruises yet.")
+        target_date, cruise_stats = biggest_cruise
 
         # Build the stat embed based on the extended flag
         if not extended:
-            stat_embed = self.build_stat_embed(all_carrier_data, total_carriers_multiple_trips, target_date)
+            stat_embed = self.build_stat_embed(cruise_stats, target_date)
         else:
-            stat_embed = self.build_extended_stat_embed(all_carrier_data, total_carriers_multiple_trips, target_date)
+            stat_embed = self.build_extended_stat_embed(cruise_stats, target_date)
 
         # Edit the original interaction response with the stat embed
         await interaction.edit_original_response(embed=stat_embed)
@@ -2175,47 +2370,78 @@ class DatabaseInteraction(commands.Cog):
         :returns: None"
         """
 
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
 
         print(f"{interaction.user.name} requested the stats for the carrier: {carrier_id}.")
         await interaction.response.defer()
 
-        pirate_steve_db.execute(
-            "SELECT * FROM historical WHERE carrierid LIKE (?)", (f'%{carrier_id}%',)
-        )
-
-        carrier_data = [BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()]
-
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)", (f'%{carrier_id}%',)
-        )
-
-        carrier_data.append(BoozeCarrier(pirate_steve_db.fetchone()))
+        # The archived totals are one row, the current cruise is merged in on top.
+        lifetime_row = await fetch_one("SELECT * FROM carrier_lifetime WHERE carrierid = (?)", (carrier_id,))
+        live_row = await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (carrier_id,))
 
-        # Remove any carriers that do not match the carrier_id (remove the None entry if carrier is not on current cruise)
-        carrier_data = [carrier for carrier in carrier_data if carrier.carrier_identifier == carrier_id]
-
-        if not carrier_data:
+        if not lifetime_row and not live_row:
             print(f'We failed to find the carrier: {carrier_id} in the database.')
             return await interaction.edit_original_response(content=f'Sorry, we could not find a carrier with the id: {carrier_id}.')
 
-        carrier_name = carrier_data[-1].carrier_name
-        total_runs = sum([carrier.run_count for carrier in carrier_data])
-        total_wine = sum([carrier.wine_total for carrier in carrier_data])
-        total_cruises = len(carrier_data)
-        owner = carrier_data[-1].discord_username
+        lifetime = CarrierLifetime.from_row(lifetime_row) if lifetime_row else CarrierLifetime(carrier_id)
+        if live_row:
+            lifetime = lifetime.with_live(BoozeCarrier.from_db_row(live_row))
 
         stat_embed = discord.Embed(
-            title=f"Stats for {carrier_name} ({carrier_id})",
+            title=f"Stats for {lifetime.carrier_name} ({carrier_id})",
             description=
-            f"Total Wine: {total_wine}\n"
-            f"Total Runs: {total_runs}\n"
-            f"Total Cruises: {total_cruises}\n"
-            f"Owner: {owner}"
+            f"Total Wine: {lifetime.total_wine}\n"
+            f"Total Runs: {lifetime.total_runs}\n"
+            f"Total Cruises: {lifetime.cruises}\n"
+            f"Owner: {lifetime.discord_username}"
         )
 
         await interaction.edit_original_response(content=None, embed=stat_embed)
 
+    @app_commands.command(name="booze_leaderboard", description="Ranks the carriers over every archived cruise.")
+    @describe(ranking="What to rank the carriers by.", count="How many carriers to show.")
+    @app_commands.choices(
+        ranking=[
+            Choice(name="Wine", value="total_wine"),
+            Choice(name="Runs", value="total_runs"),
+            Choice(name="Cruises", value="cruises"),
+        ]
+    )
+    @check_roles([*server_council_role_ids(), server_mod_role_id(), server_sommelier_role_id(), server_connoisseur_role_id(), server_wine_carrier_role_id()])
+    async def leaderboard(
+        self, interaction: discord.Interaction, ranking: str = "total_wine", count: app_commands.Range[int, 1, 100] = 25
+    ):
+        """
+        Returns the top carriers by lifetime wine, runs or cruises, from the carrier_lifetime index.
+
+        :param interaction discord.Interaction: The discord interaction context.
+        :param str ranking: The carrier_lifetime column to rank by.
+        :param int count: How many carriers to show.
+        :returns: None
+        """
+        print(f"{interaction.user.name} requested the top {count} carriers by {ranking}.")
+        await interaction.response.defer()
+
+        carriers = await carrier_leaderboard(ranking, count)
+        if not carriers:
+            return await interaction.edit_original_response(content="Pirate Steve has no archived cruises yet.")
+
+        leaderboard_data = [
+            (
+                f"{carrier.carrier_name} ({carrier.carrier_id})",
+                f"{carrier.total_wine:,} tonnes of wine over {carrier.total_runs} runs and {carrier.cruises} cruises. "
+                f"Owner: {carrier.discord_username}",
+            )
+            for carrier in carriers
+        ]
+
+        await createPagination(
+            interaction,
+            "Top carriers",
+            leaderboard_data,
+            footer="Counts archived cruises, the current cruise is added when it is archived.",
+        )
+
     @app_commands.command(name="booze_purge_full_carriers", description="Purges full carriers from the database.")
     @check_roles([*server_council_role_ids(), server_mod_role_id(), server_sommelier_role_id()])
     @check_command_channel(get_steve_says_channel())
@@ -2230,10 +2456,10 @@ class DatabaseInteraction(commands.Cog):
         print(f"{interaction.user.name} requested to purge full carriers.")
         await interaction.response.defer()
         print(f"{interaction.user.name} requested to delete all full carriers.")
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE runtotal > totalunloads"
-        )
-        carrier_data = [BoozeCarrier(carrier) for carrier in pirate_steve_db.fetchall()]
+        carrier_data = [
+            BoozeCarrier.from_db_row(carrier)
+            for carrier in await fetch_all("SELECT * FROM boozecarriers WHERE runtotal > totalunloads")
+        ]
         if len(carrier_data) == 0:
             print("No full carriers to delete.")
             await interaction.edit_original_response(content="There are no full carriers to delete.")
@@ -2263,21 +2489,17 @@ class DatabaseInteraction(commands.Cog):
                 print(f"User {interaction.user.name} accepted the request to purge full carriers.")
                 await interaction.edit_original_response(content="Purging Carriers...", embed=None)
                 failed_carriers = []
-                pirate_steve_lock.acquire()
+                carrier_ids = [carrier.carrier_identifier for carrier in carrier_data]
                 try:
-                    carrier_ids = [carrier.carrier_identifier for carrier in carrier_data]
-                    pirate_steve_db.execute(
+                    await execute_commit(
                         "DELETE FROM boozecarriers WHERE carrierid IN ({})".format(
                             ", ".join("?" * len(carrier_ids))
                         ),
                         carrier_ids,
                     )
-                    pirate_steve_conn.commit()
                 except Exception as e:
                     print(f"Error deleting carriers: {e}")
                     failed_carriers.extend(carrier_ids)
-                finally:
-                    pirate_steve_lock.release()
 
                 if failed_carriers:
                     await interaction.followup.send(content=f"Failed to delete the following carriers: {', '.join(failed_carriers)}")
@@ -2293,3 +2515,77 @@ class DatabaseInteraction(commands.Cog):
         except asyncio.TimeoutError:
             print("Timed out while waiting for confirmation response.")
             await interaction.edit_original_response(content="Waiting for user response - timed out", embed=None)
+
+    @app_commands.command(name="booze_db_stats", description="Shows the slowest database statements. Admin required.")
+    @describe(reset="Clear the collected statistics after showing them.")
+    @check_roles([*server_council_role_ids(), server_mod_role_id()])
+    @check_command_channel(get_steve_says_channel())
+    async def db_stats(self, interaction: discord.Interaction, reset: bool = False):
+        """
+        Shows the statements that took the most total time since the bot started, or since the last reset.
+
+        :param interaction discord.Interaction: The discord interaction context.
+        :param bool reset: Clear the statistics after showing them.
+        :returns: None
+        """
+        print(f"{interaction.user.name} requested the database statistics, reset: {reset}.")
+
+        top_statements = pirate_steve_profiler.top(10)
+        since = int(pirate_steve_profiler.started)
+        stats_embed = discord.Embed(
+            title="Pirate Steve's database statistics",
+            description=f"Slowest statements by total time since <t:{since}:R>. "
+            f"Sampling {pirate_steve_profiler.sample_rate:.0%} of statements.",
+        )
+        for stats in top_statements:
+            call_site, _ = stats.call_sites.most_common(1)[0]
+            stats_embed.add_field(
+                name=stats.statement[:250],
+                value=f"Calls: {stats.calls}, total: {stats.total_seconds * 1000:.1f}ms, "
+                f"mean: {stats.mean_seconds * 1000:.2f}ms, p95: <{stats.quantile_seconds(0.95) * 1000:.1f}ms, "
+                f"max: {stats.max_seconds * 1000:.1f}ms\n"
+                f"Rows: {stats.rows}, mostly from: `{call_site}`",
+                inline=False,
+            )
+        if not top_statements:
+            stats_embed.add_field(name="No statements recorded yet.", value="Pirate Steve has been idle.")
+
+        if reset:
+            pirate_steve_profiler.reset()
+            stats_embed.set_footer(text="Statistics have been reset.")
+
+        await interaction.response.send_message(embed=stats_embed)
+
+    @app_commands.command(
+        name="booze_db_export", description="Exports the database as an SQL dump. Admin required."
+    )
+    @check_roles([*server_council_role_ids(), server_mod_role_id()])
+    @check_command_channel(get_steve_says_channel())
+    async def db_export(self, interaction: discord.Interaction):
+        """
+        Writes the SQL text dump of the database on demand and attaches it. The routine backups are binary snapshots,
+        this is the readable copy.
+
+        :param interaction discord.Interaction: The discord interaction context.
+        :returns: None
+        """
+        print(f"{interaction.user.name} requested an SQL export of the database.")
+        await interaction.response.defer()
+
+        dump_path = await run_blocking(dump_database)
+
+        if pirate_steve_backups.last_backup:
+            snapshot_note = f"Last snapshot taken <t:{int(pirate_steve_backups.last_backup)}:R>."
+        else:
+            snapshot_note = "No snapshot taken since Pirate Steve started."
+
+        # Discord refuses attachments over 25MB, point at the file on disk instead.
+        if os.path.getsize(dump_path) > 25 * 1024 * 1024:
+            return await interaction.edit_original_response(
+                content=f"The SQL dump is too big to attach, it is at `{dump_path}` on the server. {snapshot_note}"
+            )
+
+        await interaction.edit_original_response(
+            content=f"Here be the SQL dump of the booze database. {snapshot_note}",
+            attachments=[discord.File(dump_path)],
+        )
@@ -12,22 +12,52 @@ from typing import Literal
 # discord.py
 import discord
 from discord.app_commands import Group, describe, Choice
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands, NotFound
 
 # local constants
 from ptn.boozebot.constants import bot, server_council_role_ids, server_sommelier_role_id, \
     server_wine_carrier_role_id, server_mod_role_id, wine_carrier_command_channel, \
-    server_hitchhiker_role_id, get_departure_announcement_channel, server_connoisseur_role_id, \
-    get_thoon_emoji_id, bot_guild_id, get_wine_carrier_channel, get_steve_says_channel
+    get_departure_announcement_channel, server_connoisseur_role_id, \
+    get_thoon_emoji_id, bot_guild_id, get_wine_carrier_channel, get_steve_says_channel, get_departure_board_settings
 
 # local classes
 from ptn.boozebot.classes.BoozeCarrier import BoozeCarrier
-from ptn.boozebot.database.database import pirate_steve_db, pirate_steve_lock
+from ptn.boozebot.database.database import (
+    fetch_one,
+    record_departure,
+    set_departure_state,
+    scheduled_departures,
+    get_departure,
+    open_departures,
+    departures_backfilled,
+    backfill_departures,
+    route_subscriptions,
+    add_route_subscriptions,
+    remove_route_subscriptions,
+)
+from ptn.boozebot.database.departures import (
+    Departure,
+    DEPARTURE_CLOSED,
+    DEPARTURE_NOTIFIED,
+    DEPARTURE_REMOVED,
+    DEPARTURE_SCHEDULED,
+    DIRECTION_DOWN,
+    DIRECTION_UP,
+    ROUTE_SYSTEMS,
+    THOON_DEPARTURE_DELAY,
+    parse_departure_message,
+    system_index,
+)
 
 # local modules
 from ptn.boozebot.modules.ErrorHandler import on_app_command_error, GenericError, CustomError, on_generic_error
 from ptn.boozebot.modules.helpers import bot_exit, check_roles, check_command_channel
+from ptn.boozebot.modules.deadline_scheduler import DeadlineScheduler
+from ptn.boozebot.modules.departure_cache import DepartureMessageCache
+from ptn.boozebot.modules.departure_board import BOARD_TITLES, DepartureBoard
+from ptn.boozebot.modules.direct_messages import DirectMessageBatcher
+from ptn.boozebot.modules.route_subscriptions import RouteSubscriptionIndex, expand_range
 
 """
 UNLOADING COMMANDS
@@ -38,6 +68,21 @@ UNLOADING COMMANDS
 class Departures(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # Departure message IDs keyed to when their owner gets reminded, rebuilt from the departure index on startup
+        self.departure_reminders = DeadlineScheduler("departure_reminders", self.send_departure_reminder)
+        # Who posted each open notice, so reactions are filtered without fetching the message
+        self.departure_messages = DepartureMessageCache()
+        # The pinned summary of upcoming departures, None unless PTN_BOOZEBOT_DEPARTURE_BOARD is on
+        board_enabled, board_edit_interval = get_departure_board_settings()
+        self.departure_board = DepartureBoard(
+            self.publish_departure_board, bot_guild_id(), board_edit_interval
+        ) if board_enabled else None
+        self.departure_board_messages = {}
+        # Who wants to hear about which routes, loaded from the database on startup
+        self.route_subscriptions = RouteSubscriptionIndex()
+        self.departure_alerts = DirectMessageBatcher(
+            "departure_alerts", self.send_departure_alert, header="New departures on your routes:"
+        )
 
     # custom global error handler
     # attaching the handler when the cog is loaded
@@ -51,6 +96,10 @@ class Departures(commands.Cog):
     def cog_unload(self):
         tree = self.bot.tree
         tree.on_error = self._old_tree_error
+        self.departure_reminders.stop()
+        if self.departure_board:
+            self.departure_board.stop()
+        self.departure_alerts.stop()
 
     """
     This class is a collection functionality for posting departure messages for carriers.
@@ -84,6 +133,10 @@ class Departures(commands.Cog):
         Choice(name="Mandhrithar", value="Mandhrithar"),
     ]
 
+    route_system_choices = [Choice(name=system, value=system) for system in ROUTE_SYSTEMS]
+
+    departure_alert_commands = Group(name="departure_alerts", description="Get a DM when a carrier departs on your routes.")
+
     departure_announcement_status: Literal["Disabled", "Upwards", "All"] = "Disabled"
     # On ready check for any completed departure messages and remove them.
     @commands.Cog.listener()
@@ -91,27 +144,127 @@ class Departures(commands.Cog):
         guild = bot.get_guild(bot_guild_id())
         departure_channel = guild.get_channel(get_departure_announcement_channel())
 
+        if not await departures_backfilled():
+            await self.backfill_departures_from_history(departure_channel)
+
         print("Checking for completed departure messages.")
 
-        async for message in departure_channel.history(limit=100):
-            try:
-                if message.pinned:
+        # Only the notices still up can have been ticked off while Steve was away, the index says which those are. They
+        # are read in one pass over the channel, from the oldest open notice onwards, rather than fetched one by one.
+        open_by_id = {departure.message_id: departure for departure in await open_departures()}
+        if open_by_id:
+            oldest = discord.Object(id=min(open_by_id) - 1)
+            async for message in departure_channel.history(limit=None, after=oldest):
+                departure = open_by_id.pop(message.id, None)
+                if departure is None:
                     continue
 
-                if message.author.id != bot.user.id:
-                    continue
+                self.departure_messages.add(message.id, departure.author_id, message.pinned, message.author.id == bot.user.id)
+
+                try:
+                    for reaction in message.reactions:
+                        # Steve adds the first tick himself, anything more is worth a look.
+                        if reaction.emoji == "✅" and reaction.count > 1:
+                            async for user in reaction.users():
+                                if departure.author_id == user.id:
+                                    await self.handle_reaction(message, user)
+                except Exception as e:
+                    print(f"Failed to process departure message while checking for closing. message: {message.id}. Error: {e}")
+
+        # Whatever was not found in the channel was deleted while Steve was away.
+        for message_id in open_by_id:
+            await set_departure_state(message_id, DEPARTURE_REMOVED)
+
+        if self.departure_board:
+            await self.find_departure_boards(departure_channel)
+
+        for user_id, departure_system, arrival_system in await route_subscriptions():
+            self.route_subscriptions.add(user_id, departure_system, arrival_system)
+        print(f"Loaded {len(self.route_subscriptions)} route subscriptions.")
+
+        print("Scheduling the departure reminders")
+        for departure in await scheduled_departures():
+            self.departure_reminders.schedule(departure.message_id, departure.departure_time)
+            if self.departure_board:
+                self.departure_board.add(departure)
+        self.departure_reminders.start()
+        if self.departure_board:
+            self.departure_board.refresh()
+
+    async def find_departure_boards(self, departure_channel):
+        """
+        Picks up the departure boards already pinned in the channel, so they are edited rather than posted again.
+
+        :param discord.TextChannel departure_channel: The departure announcement channel.
+        :returns: None
+        """
+        titles = {title: direction for direction, title in BOARD_TITLES.items()}
+        for message in await departure_channel.pins():
+            if message.author.id == bot.user.id and message.embeds and message.embeds[0].title in titles:
+                self.departure_board_messages[titles[message.embeds[0].title]] = message
+
+    async def publish_departure_board(self, direction, text):
+        """
+        Edits the departure board for one direction, posting and pinning it if it is not up yet.
+
+        :param str direction: DIRECTION_UP or DIRECTION_DOWN.
+        :param str text: The board's text.
+        :returns: None
+        """
+        embed = discord.Embed(title=BOARD_TITLES[direction], description=text)
+        message = self.departure_board_messages.get(direction)
+        if message:
+            try:
+                await message.edit(embed=embed)
+                return
+            except NotFound:
+                print(f"The {direction} departure board was deleted, posting it again.")
+
+        departure_channel = bot.get_channel(get_departure_announcement_channel())
+        message = await departure_channel.send(embed=embed, silent=True)
+        await message.pin()
+        self.departure_board_messages[direction] = message
+
+    def drop_departure(self, message_id):
+        """
+        Forgets a notice that is no longer up, so it is not reminded, closed or shown on the board.
+
+        :param int message_id: The departure message ID.
+        :returns: None
+        """
+        self.departure_reminders.cancel(message_id)
+        self.departure_messages.discard(message_id)
+        if self.departure_board:
+            self.departure_board.remove(message_id)
 
-                for reaction in message.reactions:
-                    if reaction.emoji == "✅":
-                        async for user in reaction.users():
-                            if self.get_departure_author_id(message) == user.id:
-                                await self.handle_reaction(reaction.message, user)
-            except Exception as e:
-                print(f"Failed to process departure message while checking for closing. message: {message.id}. Error: {e}")
+    async def backfill_departures_from_history(self, departure_channel):
+        """
+        Reads the departure notices posted before the departure index existed into it. Runs once.
 
-        print("Starting the departure message checker")
-        if not self.check_departure_messages_loop.is_running():
-            self.check_departure_messages_loop.start()
+        :param discord.TextChannel departure_channel: The departure announcement channel.
+        :returns: None
+        """
+        print("Indexing the departure messages already in the channel.")
+        thoon_text = f"{bot.get_emoji(get_thoon_emoji_id())}"
+        departures = []
+
+        async for message in departure_channel.history(limit=100):
+            if message.pinned or message.author.id != bot.user.id:
+                continue
+
+            posted_at = int(message.created_at.timestamp())
+            # The timer reaction is how Steve marked a notice as reminded before the index.
+            reminded = any(reaction.emoji == "⏲️" and reaction.me for reaction in message.reactions)
+            departures.append(Departure(
+                message.id,
+                message.channel.id,
+                state=DEPARTURE_NOTIFIED if reminded else DEPARTURE_SCHEDULED,
+                posted_at=posted_at,
+                **parse_departure_message(message.content, posted_at, thoon_text),
+            ))
+
+        added = await backfill_departures(departures)
+        print(f"Indexed {added or 0} departure messages from the channel history.")
 
     # On reaction check if its in the departures channel and if it was from who posted the departure, if it is remove it.
     @commands.Cog.listener()
@@ -125,81 +278,59 @@ class Departures(commands.Cog):
             if reaction_event.channel_id != get_departure_announcement_channel():
                 return
 
-            channel = await bot.fetch_channel(reaction_event.channel_id)
-            message = await channel.fetch_message(reaction_event.message_id)
-
-            if message.pinned:
-                return
-
-            if message.author.id != bot.user.id:
-                return
-
             if reaction_event.emoji.name != "✅":
                 return
 
-            if not self.get_departure_author_id(message) == user.id:
+            # Everything else is known from the cache, no need to fetch the message.
+            if not self.departure_messages.closable_by(reaction_event.message_id, user.id):
                 return
 
+            message = bot.get_channel(reaction_event.channel_id).get_partial_message(reaction_event.message_id)
             await self.handle_reaction(message, user)
         except Exception as e:
             print(f"Failed to process reaction: {reaction_event}. Error: {e}")
 
-    @tasks.loop(minutes = 10)
-    async def check_departure_messages_loop(self):
-        guild = bot.get_guild(bot_guild_id())
-        departure_channel = guild.get_channel(get_departure_announcement_channel())
-        wine_carrier_chat = guild.get_channel(get_wine_carrier_channel())
-
-        print("Checking for passed departure messages.")
-        async for message in departure_channel.history(limit=100):
-
-            try:
-                if message.pinned:
-                    continue
-
-                if message.author.id != bot.user.id:
-                    continue
-
-                print("Departure message found.")
-
-                has_reacted = False
-                for reaction in message.reactions:
-                    if reaction.emoji == "⏲️":
-                        async for user in reaction.users():
-                            if user.id == bot.user.id:
-                                has_reacted = True
-                                break
-
-                if has_reacted:
-                    print("Departure message has been responded to.")
-                    continue
-
-                content = message.content
-                departure_time = content.split("|")[1].replace(" ", "")
+    # Keep the index in step when a mod clears out a notice by hand.
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if payload.channel_id != get_departure_announcement_channel():
+            return
+        self.drop_departure(payload.message_id)
+        try:
+            await set_departure_state(payload.message_id, DEPARTURE_REMOVED, only_open=True)
+        except Exception as e:
+            print(f"Failed to mark departure message {payload.message_id} as removed. Error: {e}")
 
-                if departure_time.startswith("<t:"):
-                    departure_time = departure_time.split(":")[1]
-                elif departure_time == f"{bot.get_emoji(get_thoon_emoji_id())}":
-                    departure_time = message.created_at.timestamp() + 25 * 60
+    async def send_departure_reminder(self, message_id):
+        """
+        Tells the owner their departure time has passed. Called by the departure reminder scheduler when it comes due.
 
-                try:
-                    departure_time = int(departure_time)
-                except ValueError:
-                    print(f"Departure time was not an integer: {departure_time}, Probably means they never set a departure time.")
-                    continue
+        :param int message_id: The departure message ID.
+        :returns: None
+        """
+        departure = await get_departure(message_id)
+        if departure is None or departure.state != DEPARTURE_SCHEDULED:
+            return
 
-                print(f"Departure time: {departure_time}")
+        print(f"Departure time has passed for message {departure.message_id}: {departure.departure_time}")
+        message = bot.get_channel(departure.channel_id).get_partial_message(departure.message_id)
 
-                if int(time.time()) > departure_time:
-                    print("Departure time has passed.")
-                    author_id = self.get_departure_author_id(message)
-                    if author_id:
-                        print(f"Responding to departure message from {author_id}.")
-                        await message.add_reaction("⏲️")
-                        await wine_carrier_chat.send(f"<@{author_id}> your scheduled departure time of <t:{departure_time}:F> has passed. If your carrier has entered lockdown or completed its jump, please use the ✅ reaction under your notice to remove it. {message.jump_url}")
+        try:
+            await message.add_reaction("⏲️")
+        except NotFound:
+            print("Departure message is gone.")
+            self.drop_departure(departure.message_id)
+            await set_departure_state(departure.message_id, DEPARTURE_REMOVED)
+            return
 
-            except Exception as e:
-                print(f"Failed to process departure message while checking for time passed. message: {message.id}. Error: {e}")
+        if departure.author_id:
+            print(f"Responding to departure message from {departure.author_id}.")
+            wine_carrier_chat = bot.get_channel(get_wine_carrier_channel())
+            await wine_carrier_chat.send(f"<@{departure.author_id}> your scheduled departure time of <t:{departure.departure_time}:F> has passed. If your carrier has entered lockdown or completed its jump, please use the ✅ reaction under your notice to remove it. {message.jump_url}")
+        await set_departure_state(departure.message_id, DEPARTURE_NOTIFIED)
+        # Its time has passed, so it is no longer upcoming.
+        if self.departure_board:
+            self.departure_board.remove(departure.message_id)
 
     @app_commands.command(name="wine_carrier_departure",
                           description="Post a departure message for a wine carrier.")
@@ -228,7 +359,7 @@ class Departures(commands.Cog):
         await interaction.response.defer(ephemeral=True)
 
         # Convert carrier ID to uppercase
-        carrier_id = carrier_id.upper().strip()
+        carrier_id = carrier_id.strip().upper()
 
         guild = bot.get_guild(bot_guild_id())
         steve_says_channel = guild.get_channel(get_steve_says_channel())
@@ -241,10 +372,9 @@ class Departures(commands.Cog):
             return
 
         # Acquire the database lock and fetch carrier data
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)", (f'%{carrier_id}%',)
+        carrier_data = await fetch_one(
+            "SELECT * FROM boozecarriers WHERE carrierid = (?)", (carrier_id,)
         )
-        carrier_data = pirate_steve_db.fetchone()
 
         # Check if carrier data was found
         if not carrier_data:
@@ -319,27 +449,16 @@ class Departures(commands.Cog):
         else:
             departure_time_text = f" {bot.get_emoji(get_thoon_emoji_id())} |"
 
-        # Check if the departure needs a hitchhiker ping
-        hitchhiker_systems = [0, 1, 2, 3]
         thoon_systems = [0, 1]
 
-        try:
-            departure_system_index = int(departure_location.split(" ")[0][1:])
-        except ValueError:
-            departure_system_index = 16
-
-        try:
-            arrival_system_index = int(arrival_location.split(" ")[0][1:])
-        except ValueError:
-            arrival_system_index = 16
+        departure_system_index = system_index(departure_location)
+        arrival_system_index = system_index(arrival_location)
 
-        is_hitchhiking_trip = departure_system_index in hitchhiker_systems and arrival_system_index in hitchhiker_systems
         is_thoon_trip = departure_system_index in thoon_systems or arrival_system_index in thoon_systems
         if is_thoon_trip and departing_thoon:
             departure_time_text = f" {bot.get_emoji(get_thoon_emoji_id())} |"
 
-        hitchhiker_ping_text = ""
-        # Set the direction arrow text and determine if hitchhiker ping is needed
+        # Set the direction arrow text
         if departure_system_index == arrival_system_index:
             msg = "Departure and arrival are the same system."
             print(msg)
@@ -352,9 +471,6 @@ class Departures(commands.Cog):
         elif departure_system_index > arrival_system_index:
             print("Departure system is below arrival system.")
             direction_arrow = "⬆️"
-            if is_hitchhiking_trip:
-                print("Departure needs hitchhiker ping.")
-                hitchhiker_ping_text = f"| <@&{str(server_hitchhiker_role_id())}>"
         else:
             print("Failed to determine direction arrow.")
             direction_arrow = ""
@@ -372,15 +488,45 @@ class Departures(commands.Cog):
             return
 
         # Construct the departure message text
-        departure_message_text = f"**{direction_arrow} {departure_location} > {arrival_location}** |{departure_time_text} **{carrier_name} ({carrier_id})** | <@{interaction.user.id}> {hitchhiker_ping_text}"
+        departure_message_text = f"**{direction_arrow} {departure_location} > {arrival_location}** |{departure_time_text} **{carrier_name} ({carrier_id})** | <@{interaction.user.id}>"
 
         # Send the departure message to the departure announcement channel
         departure_channel = bot.get_channel(get_departure_announcement_channel())
         departure_message = await departure_channel.send(departure_message_text)
+
+        # Index it straight away, the reminder scheduler and startup work from the index rather than the channel.
+        posted_at = int(departure_message.created_at.timestamp())
+        shows_timestamp = departure_timestamp and not (is_thoon_trip and departing_thoon)
+        reminder_time = departure_timestamp if shows_timestamp else posted_at + THOON_DEPARTURE_DELAY
+        departure = Departure(
+            departure_message.id,
+            departure_message.channel.id,
+            carrier_id,
+            interaction.user.id,
+            departure_location,
+            arrival_location,
+            reminder_time,
+            posted_at=posted_at,
+        )
+        await record_departure(departure)
+        self.departure_reminders.schedule(departure_message.id, reminder_time)
+        self.departure_messages.add(departure_message.id, interaction.user.id)
+        if self.departure_board:
+            self.departure_board.add(departure)
+
         await departure_message.add_reaction("🛬")
         await departure_message.add_reaction("✅")
         print("Departure message sent.")
 
+        # Tell the pilots watching this route, in place of pinging the whole hitchhiker role
+        subscribers = self.route_subscriptions.match(departure_location, arrival_location) - {interaction.user.id}
+        if subscribers:
+            print(f"Queueing departure alerts for {len(subscribers)} subscribers.")
+            self.departure_alerts.queue(
+                subscribers,
+                f"{direction_arrow} **{departure_location} > {arrival_location}** |{departure_time_text} **{carrier_name} ({carrier_id})** {departure_message.jump_url}"
+            )
+
         # Edit the original interaction response with the jump URL of the departure message
         await interaction.edit_original_response(content=f"Departure message sent to {departure_message.jump_url}.")
 
@@ -409,12 +555,89 @@ class Departures(commands.Cog):
         await interaction.edit_original_response(content=f"Departure announcements are now '{status}'.")
 
 
-    def get_departure_author_id(self, message):
-        try:
-            return int(message.content.split("<@")[1].split(">")[0])
-        except IndexError:
-            return None
+    async def send_departure_alert(self, user_id, text):
+        """
+        DMs a pilot about departures on their routes. Called by the departure alert batcher.
+
+        :param int user_id: The pilot.
+        :param str text: The message.
+        :returns: None
+        """
+        user = bot.get_user(user_id) or await bot.fetch_user(user_id)
+        await user.send(text)
+
+    async def subscribe_routes(self, interaction: discord.Interaction, routes):
+        """
+        Saves the routes a pilot is not already subscribed to and tells them how many were added.
+
+        :param discord.Interaction interaction: The discord interaction context.
+        :param list[tuple[str, str | None]] routes: The (departure_system, arrival_system) routes.
+        :returns: None
+        """
+        existing = set(self.route_subscriptions.routes(interaction.user.id))
+        added = [route for route in dict.fromkeys(routes) if route not in existing]
+        if added:
+            # Saved first, so the index never holds a route that would be gone after a restart.
+            await add_route_subscriptions(interaction.user.id, added)
+            for route in added:
+                self.route_subscriptions.add(interaction.user.id, *route)
+        print(f"{interaction.user.name} subscribed to {len(added)} new routes.")
+        await interaction.edit_original_response(
+            content=f"Subscribed to {len(added)} new routes, you are watching {len(self.route_subscriptions.routes(interaction.user.id))} in total. "
+                    f"Make sure you accept DMs from this server."
+        )
+
+    @departure_alert_commands.command(name="route", description="Get a DM when a carrier departs on a route.")
+    @describe(
+        departure_location="The system carriers depart from.",
+        arrival_location="The system they arrive at. Leave empty for any."
+    )
+    @app_commands.choices(departure_location=route_system_choices, arrival_location=route_system_choices)
+    async def subscribe_route(self, interaction: discord.Interaction, departure_location: str, arrival_location: str = None):
+        await interaction.response.defer(ephemeral=True)
+        if departure_location == arrival_location:
+            await interaction.edit_original_response(content="Departure and arrival are the same system.")
+            return
+        await self.subscribe_routes(interaction, [(departure_location, arrival_location)])
+
+    @departure_alert_commands.command(name="range", description="Get a DM when a carrier departs between two systems.")
+    @describe(
+        lowest="One end of the range, for example N0.",
+        highest="The other end of the range, for example N3.",
+        direction="Which way the carriers are going."
+    )
+    @app_commands.choices(lowest=route_system_choices, highest=route_system_choices)
+    async def subscribe_range(self, interaction: discord.Interaction, lowest: str, highest: str, direction: Literal["Upwards", "Downwards", "Both"] = "Upwards"):
+        await interaction.response.defer(ephemeral=True)
+        if lowest == highest:
+            await interaction.edit_original_response(content="The range needs two different systems.")
+            return
+        route_direction = {"Upwards": DIRECTION_UP, "Downwards": DIRECTION_DOWN, "Both": None}[direction]
+        routes = expand_range(lowest, highest, route_direction)
+        if not routes:
+            await interaction.edit_original_response(content=f"There are no routes between {lowest} and {highest}.")
+            return
+        await self.subscribe_routes(interaction, routes)
+
+    @departure_alert_commands.command(name="list", description="List the routes you get departure DMs for.")
+    async def list_routes(self, interaction: discord.Interaction):
+        routes = self.route_subscriptions.routes(interaction.user.id)
+        if not routes:
+            await interaction.response.send_message("You are not subscribed to any routes.", ephemeral=True)
+            return
+        text = ", ".join(f"{departure_system} > {arrival_system or 'anywhere'}" for departure_system, arrival_system in routes)
+        await interaction.response.send_message(f"You get a DM for departures on: {text}"[:2000], ephemeral=True)
+
+    @departure_alert_commands.command(name="clear", description="Stop all your departure DMs.")
+    async def clear_routes(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        removed = await remove_route_subscriptions(interaction.user.id)
+        self.route_subscriptions.remove_user(interaction.user.id)
+        print(f"{interaction.user.name} cleared {removed} route subscriptions.")
+        await interaction.edit_original_response(content=f"Removed {removed} route subscriptions.")
 
     async def handle_reaction(self, message, user):
         print(f"User {user.name} reacted to their departure in {message.channel.name} removing.")
+        self.drop_departure(message.id)
+        await set_departure_state(message.id, DEPARTURE_CLOSED)
         await message.delete()
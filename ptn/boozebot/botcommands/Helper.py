@@ -92,6 +92,24 @@ class Helper(commands.Cog):
             "params": [],
             "channel_restrictions": [],
         }
+        booze_db_stats = {
+            "method_desc": "Show the slowest database statements.",
+            "roles": [*server_council_role_ids(), server_mod_role_id()],
+            "params": [
+                {
+                    "name": "reset",
+                    "description": "Clear the collected statistics after showing them.",
+                    "type": "bool"
+                }
+            ],
+            "channel_restrictions": [get_steve_says_channel()],
+        }
+        booze_db_export = {
+            "method_desc": "Export the database as an SQL dump.",
+            "roles": [*server_council_role_ids(), server_mod_role_id()],
+            "params": [],
+            "channel_restrictions": [get_steve_says_channel()],
+        }
         
         # Somm commands
         _ping = {
@@ -415,6 +433,23 @@ class Helper(commands.Cog):
             ],
             "channel_restrictions": [],
         }
+        booze_leaderboard = {
+            "method_desc": "Rank the carriers over every archived cruise.",
+            "roles": [*server_council_role_ids(), server_mod_role_id(), server_sommelier_role_id(), server_connoisseur_role_id(), server_wine_carrier_role_id()],
+            "params": [
+                {
+                    "name": "ranking",
+                    "description": "What to rank the carriers by: wine, runs or cruises.",
+                    "type": "str"
+                },
+                {
+                    "name": "count",
+                    "description": "How many carriers to show.",
+                    "type": "int"
+                }
+            ],
+            "channel_restrictions": [],
+        }
         
         # Everyone commands
         pirate_steve_help = {
@@ -22,7 +22,7 @@ from ptn.boozebot.constants import rackhams_holiday_channel, bot, bot_guild_id,
 # local modules
 from ptn.boozebot.modules.ErrorHandler import on_app_command_error, GenericError, CustomError, on_generic_error
 from ptn.boozebot.modules.helpers import bot_exit, check_roles, check_command_channel
-from ptn.boozebot.database.database import pirate_steve_db, pirate_steve_conn
+from ptn.boozebot.database.database import execute_commit, fetch_one
 from ptn.boozebot.modules.PHcheck import ph_check
 
 """
@@ -78,7 +78,8 @@ class PublicHoliday(commands.Cog):
         """
         try:
             print("Rackham's holiday loop running.")
-            if await ph_check():
+            # Always ask the sources here, this is what keeps the cache fresh for the commands.
+            if await ph_check(max_age=0):
                 print('PH detected, triggering the notifications.')
                 holiday_announce_channel = bot.get_channel(rackhams_holiday_channel())
                 if PublicHoliday.admin_override_state:
@@ -86,18 +87,14 @@ class PublicHoliday(commands.Cog):
                     PublicHoliday.admin_override_state = False
 
                 # Check if we had a holiday flagged already
-                pirate_steve_db.execute(
-                    '''SELECT state FROM holidaystate'''
-                )
-                holiday_sqlite3 = pirate_steve_db.fetchone()
+                holiday_sqlite3 = await fetch_one('''SELECT state FROM holidaystate''')
                 holiday_ongoing = bool(dict(holiday_sqlite3).get('state'))
                 print(f'Holiday state from database: {holiday_ongoing}')
                 if not holiday_ongoing:
 
-                    pirate_steve_db.execute(
+                    await execute_commit(
                         '''UPDATE holidaystate SET state=TRUE, timestamp=CURRENT_TIMESTAMP'''
                     )
-                    pirate_steve_conn.commit()
                     print('Holiday was not ongoing, started now - flag it accordingly')
                     await holiday_announce_channel.send(holiday_start_gif)
                     await holiday_announce_channel.send(
@@ -111,10 +108,7 @@ class PublicHoliday(commands.Cog):
                 # Check if the 48 hours have expired first, to avoid scenarios of the HTTP request failing and turning
                 # off an ongoing holiday.
 
-                pirate_steve_db.execute(
-                    '''SELECT timestamp FROM holidaystate'''
-                )
-                timestamp = pirate_steve_db.fetchone()
+                timestamp = await fetch_one('''SELECT timestamp FROM holidaystate''')
 
                 start_time = datetime.strptime(dict(timestamp).get('timestamp'), '%Y-%m-%d %H:%M:%S')
                 end_time = start_time + timedelta(hours=48)
@@ -128,18 +122,14 @@ class PublicHoliday(commands.Cog):
                     holiday_announce_channel = bot.get_channel(rackhams_holiday_channel())
 
                     # Check if we had a holiday flagged already
-                    pirate_steve_db.execute(
-                        '''SELECT state FROM holidaystate'''
-                    )
-                    holiday_sqlite3 = pirate_steve_db.fetchone()
+                    holiday_sqlite3 = await fetch_one('''SELECT state FROM holidaystate''')
                     holiday_ongoing = bool(dict(holiday_sqlite3).get('state'))
 
                     print(f'Holiday state from database: {holiday_ongoing}')
                     if holiday_ongoing:
-                        pirate_steve_db.execute(
+                        await execute_commit(
                             '''UPDATE holidaystate SET state=False, timestamp=CURRENT_TIMESTAMP'''
                         )
-                        pirate_steve_conn.commit()
                         # Only post it if it is a state change.
                         print('Holiday was ongoing, no longer ongoing - flag it accordingly')
                         await holiday_announce_channel.send(holiday_ended_gif)
@@ -203,19 +193,15 @@ class PublicHoliday(commands.Cog):
             return
 
         # Check if we had a holiday flagged already
-        pirate_steve_db.execute(
-            '''SELECT state FROM holidaystate'''
-        )
-        holiday_sqlite3 = pirate_steve_db.fetchone()
+        holiday_sqlite3 = await fetch_one('''SELECT state FROM holidaystate''')
         holiday_ongoing = bool(dict(holiday_sqlite3).get('state'))
         print(f'Holiday state from database: {holiday_ongoing}')
         if holiday_ongoing:
             print('Holiday ongoing - updating timestamp')
 
-            pirate_steve_db.execute(
-                f'''UPDATE holidaystate SET state=TRUE, timestamp=\'{timestamp}\''''
+            await execute_commit(
+                '''UPDATE holidaystate SET state=TRUE, timestamp=?''', (timestamp,)
             )
-            pirate_steve_conn.commit()
             
             await interaction.response.send_message(f'Set the cruise start time to: {timestamp}. Check with /booze_duration_remaining.')
             
@@ -238,10 +224,7 @@ class PublicHoliday(commands.Cog):
 
         # Get the starting timestamp
 
-        pirate_steve_db.execute(
-            '''SELECT timestamp FROM holidaystate'''
-        )
-        timestamp = pirate_steve_db.fetchone()
+        timestamp = await fetch_one('''SELECT timestamp FROM holidaystate''')
 
         start_time = datetime.strptime(dict(timestamp).get('timestamp'), '%Y-%m-%d %H:%M:%S')
         end_time = start_time + timedelta(hours=duration_hours)
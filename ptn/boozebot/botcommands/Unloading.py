@@ -26,7 +26,7 @@ from ptn.boozebot.classes.BoozeCarrier import BoozeCarrier
 # local modules
 from ptn.boozebot.modules.ErrorHandler import on_app_command_error, GenericError, CustomError, on_generic_error
 from ptn.boozebot.modules.helpers import bot_exit, check_roles, check_command_channel
-from ptn.boozebot.database.database import pirate_steve_db, pirate_steve_lock, pirate_steve_conn
+from ptn.boozebot.database.database import execute_commit, fetch_one
 
 """
 UNLOADING COMMANDS
@@ -143,7 +143,7 @@ class Unloading(commands.Cog):
               f'body: {planetary_body} using unload channel: "{unload_channel}" using market type: {market_type}.')
 
         # Cast this to upper case just in case
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
 
         # Check the carrier ID regex
         if not re.match(r"\w{3}-\w{3}", carrier_id):
@@ -156,14 +156,10 @@ class Unloading(commands.Cog):
             return await interaction.channel.name.send(f'Sorry, to run a timed market we need an unload channel, you '
                                           f'provided: {unload_channel}.')
 
-        pirate_steve_lock.acquire()
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)", (f'%{carrier_id}%',)
-        )
-
         # We will only get a single entry back here as the carrierid is a unique field.
-        carrier_data = BoozeCarrier(pirate_steve_db.fetchone())
-        pirate_steve_lock.release()
+        carrier_data = BoozeCarrier(
+            await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (carrier_id,))
+        )
 
         if not carrier_data:
             print(f'We failed to find the carrier: {carrier_id} in the database.')
@@ -218,21 +214,16 @@ class Unloading(commands.Cog):
 
         print(f'Posted the wine unload alert for {carrier_data.carrier_name} ({carrier_data.carrier_identifier})')
 
-        try:
-            pirate_steve_lock.acquire()
-            data = (
-                discord_alert_id,
-                f'%{carrier_id}%'
-            )
+        data = (
+            discord_alert_id,
+            carrier_id
+        )
 
-            pirate_steve_db.execute('''
-                UPDATE boozecarriers
-                SET discord_unload_in_progress=?, totalunloads=totalunloads+1
-                WHERE carrierid LIKE (?)
-            ''', data)
-            pirate_steve_conn.commit()
-        finally:
-            pirate_steve_lock.release()
+        await execute_commit('''
+            UPDATE boozecarriers
+            SET discord_unload_in_progress=?, totalunloads=totalunloads+1
+            WHERE carrierid = (?)
+        ''', data)
         print(f'Discord alert ID written to database for {carrier_data.carrier_identifier}')
 
         if unload_channel:
@@ -265,7 +256,7 @@ class Unloading(commands.Cog):
     async def wine_unloading_complete(self, interaction: discord.Interaction, carrier_id: str):
         print(f'Wine unloading complete for {carrier_id} flagged by {interaction.user.name}.')
         # Cast this to upper case just in case
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
 
         # Check the carrier ID regex
         if not re.match(r"\w{3}-\w{3}", carrier_id):
@@ -273,12 +264,10 @@ class Unloading(commands.Cog):
             return await interaction.response.send_message(f'{interaction.user.name}, the carrier ID was invalid, XXX-XXX expected received, '
                                           f'{carrier_id}.')
 
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)", (f'%{carrier_id}%',)
-        )
-
         # We will only get a single entry back here as the carrierid is a unique field.
-        carrier_data = BoozeCarrier(pirate_steve_db.fetchone())
+        carrier_data = BoozeCarrier(
+            await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (carrier_id,))
+        )
         if not carrier_data:
             print(f'No carrier found while searching the DB for: {carrier_id}')
             return await interaction.response.send_message(f'Sorry, could not find a carrier for the ID data in DB: {carrier_id}.')
@@ -290,17 +279,12 @@ class Unloading(commands.Cog):
             message = await wine_alert_channel.fetch_message(carrier_data.discord_unload_notification)
             # Now delete it in the database
 
-            try:
-                pirate_steve_lock.acquire()
-                data = (f'%{carrier_id}%',)
-                pirate_steve_db.execute('''
-                    UPDATE boozecarriers
-                    SET discord_unload_in_progress=NULL
-                    WHERE carrierid LIKE (?)
-                ''', data)
-                pirate_steve_conn.commit()
-            finally:
-                pirate_steve_lock.release()
+            data = (carrier_id,)
+            await execute_commit('''
+                UPDATE boozecarriers
+                SET discord_unload_in_progress=NULL
+                WHERE carrierid = (?)
+            ''', data)
 
             await message.delete()
             response = f'Removed the unload notification for {carrier_data.carrier_name} ({carrier_id})'
@@ -333,7 +317,7 @@ class Unloading(commands.Cog):
               f'body: {planetary_body} in system: "{system_name}".')
 
         # Cast this to upper case just in case
-        carrier_id = carrier_id.upper()
+        carrier_id = carrier_id.strip().upper()
 
         # Check the carrier ID regex
         if not re.match(r"\w{3}-\w{3}", carrier_id):
@@ -341,14 +325,10 @@ class Unloading(commands.Cog):
             return await interaction.channel.name.send(f'{interaction.user.name}, the carrier ID was invalid during tanker unload, '
                                           f'XXX-XXX expected received, {carrier_id}.')
 
-        pirate_steve_lock.acquire()
-        pirate_steve_db.execute(
-            "SELECT * FROM boozecarriers WHERE carrierid LIKE (?)", (f'%{carrier_id}%',)
-        )
-
         # We will only get a single entry back here as the carrierid is a unique field.
-        carrier_data = BoozeCarrier(pirate_steve_db.fetchone())
-        pirate_steve_lock.release()
+        carrier_data = BoozeCarrier(
+            await fetch_one("SELECT * FROM boozecarriers WHERE carrierid = (?)", (carrier_id,))
+        )
 
         if not carrier_data:
             print(f'We failed to find the carrier: {carrier_id} in the database.')
@@ -376,21 +356,16 @@ class Unloading(commands.Cog):
 
         print(f'Posted the tanker unload alert for {carrier_data.carrier_name} ({carrier_data.carrier_identifier})')
 
-        try:
-            pirate_steve_lock.acquire()
-            data = (
-                discord_alert_id,
-                f'%{carrier_id}%'
-            )
+        data = (
+            discord_alert_id,
+            carrier_id
+        )
 
-            pirate_steve_db.execute('''
-                UPDATE boozecarriers
-                SET discord_unload_in_progress=?, totalunloads=totalunloads+1
-                WHERE carrierid LIKE (?)
-            ''', data)
-            pirate_steve_conn.commit()
-        finally:
-            pirate_steve_lock.release()
+        await execute_commit('''
+            UPDATE boozecarriers
+            SET discord_unload_in_progress=?, totalunloads=totalunloads+1
+            WHERE carrierid = (?)
+        ''', data)
         print(f'Discord alert ID written to database for {carrier_data.carrier_identifier}')
 
         # Also post a note into the primary channel to go read the announcements.
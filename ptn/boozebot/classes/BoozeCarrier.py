@@ -1,45 +1,126 @@
 import re
+import sqlite3
+
+from ptn.boozebot.database.schema import normalize_carrier_id
+
+# Compiled once, every carrier built from the sheet or the database is checked against it.
+CARRIER_ID_PATTERN = re.compile(r"\w{3}-\w{3}")
 
 
 class BoozeCarrier:
-    
+
     COMPARISON_KEYS = ["carrier_name", "wine_total", "carrier_identifier", "discord_username", "run_count"]
 
+    # Thousands of these get built per sync and per tally, slots keep them small and quick to create.
+    __slots__ = (
+        'carrier_name',
+        'wine_total',
+        'carrier_identifier',
+        'platform',
+        'ptn_carrier',
+        'discord_username',
+        'timestamp',
+        'discord_unload_notification',
+        'run_count',
+        'total_unloads',
+        'timezone',
+    )
+
     def __init__(self, info_dict=None):
         """
         Class represents a carrier object as returned from the database.
 
+        Prefer from_db_row or from_sheet_record when the source is known, this accepts either.
+
         :param sqlite3.Row info_dict: A single row from the sqlite query.
         """
+        if isinstance(info_dict, sqlite3.Row):
+            self._load_db_row(info_dict)
+            return
 
-        if info_dict:
-            # Convert the sqlite3.Row object to a dictionary
-            info_dict = dict(info_dict)
-        else:
-            info_dict = dict()
+        info_dict = dict(info_dict) if info_dict else {}
 
         # Because we also pass a DB object, we should also covert those to the same fields
-        self.carrier_name = info_dict.get('Carrier Name', None) or info_dict.get('carriername', None)
-        
-        if self.carrier_name:
-            self.carrier_name = str(self.carrier_name)
-        
-        self.wine_total = info_dict.get('Wine Total (tons)', None) or info_dict.get('winetotal', None)
-        
-        if self.wine_total:
+        self._load(
+            info_dict.get('Carrier Name', None) or info_dict.get('carriername', None),
+            info_dict.get('Wine Total (tons)', None) or info_dict.get('winetotal', None),
+            info_dict.get('Carrier ID', None) or info_dict.get('carrierid', None),
+            info_dict.get('Discord Username', None) or info_dict.get('discordusername', None),
+            info_dict.get('Timestamp', None) or info_dict.get('timestamp', None),
+            info_dict.get('discord_unload_in_progress', None),
+            info_dict.get('run_count', None) or info_dict.get('runtotal', None),
+            info_dict.get('totalunloads', None),
+            info_dict.get('user_timezone_in_utc', None),
+        )
+
+    @classmethod
+    def from_db_row(cls, row):
+        """
+        Builds a carrier from a boozecarriers or historical row.
+
+        :param sqlite3.Row row: A SELECT * row.
+        :returns: The carrier, empty if row is None.
+        :rtype: BoozeCarrier
+        """
+        carrier = cls.__new__(cls)
+        if row is None:
+            carrier._load()
+        else:
+            carrier._load_db_row(row)
+        return carrier
+
+    @classmethod
+    def from_sheet_record(cls, record):
+        """
+        Builds a carrier from a signup form response.
+
+        :param dict record: A record keyed by the sheet headers.
+        :returns: The carrier.
+        :rtype: BoozeCarrier
+        :raises ValueError: If the record holds an invalid carrier ID.
+        """
+        carrier = cls.__new__(cls)
+        carrier._load(
+            record.get('Carrier Name'),
+            record.get('Wine Total (tons)'),
+            record.get('Carrier ID'),
+            record.get('Discord Username'),
+            record.get('Timestamp'),
+        )
+        return carrier
+
+    def _load_db_row(self, row):
+        self._load(
+            row['carriername'],
+            row['winetotal'],
+            row['carrierid'],
+            row['discordusername'],
+            row['timestamp'],
+            row['discord_unload_in_progress'],
+            row['runtotal'],
+            row['totalunloads'],
+            row['user_timezone_in_utc'],
+        )
+
+    def _load(self, carrier_name=None, wine_total=None, carrier_identifier=None, discord_username=None,
+              timestamp=None, discord_unload_notification=None, run_count=None, total_unloads=None, timezone=None):
+        self.carrier_name = str(carrier_name) if carrier_name else carrier_name
+
+        if wine_total:
             try:
-                self.wine_total = int(self.wine_total)
+                wine_total = int(wine_total)
             except ValueError:
-                self.wine_total = None
-        
-        self.carrier_identifier = info_dict.get('Carrier ID', None) or info_dict.get('carrierid', None)
-        if self.carrier_identifier:
-            # Cast the carrier ID to upper case for consistency
-            self.carrier_identifier = str(self.carrier_identifier).upper()
+                wine_total = None
+        self.wine_total = wine_total
+
+        if carrier_identifier:
+            # Cast the carrier ID to upper case for consistency, the DB lookups are exact matches on this form
+            carrier_identifier = normalize_carrier_id(carrier_identifier)
 
             # make sure it matches the regex
-            if not re.match(r"\w{3}-\w{3}", self.carrier_identifier):
-                raise ValueError(f'Incompatible carrier ID found: {self.carrier_identifier} - {self.carrier_name}')
+            if not CARRIER_ID_PATTERN.match(carrier_identifier):
+                raise ValueError(f'Incompatible carrier ID found: {carrier_identifier} - {self.carrier_name}')
+        self.carrier_identifier = carrier_identifier
 
         self.platform = "PC (Horizons + Odyssey)"
 
@@ -47,31 +128,28 @@ class BoozeCarrier:
         # still contains this field, set it to False for now and phase it out
         self.ptn_carrier = False
 
-        self.discord_username = info_dict.get('Discord Username', None) or info_dict.get('discordusername', None)
-        
-        if self.discord_username:
-            self.discord_username = str(self.discord_username)
-        
-        self.timestamp = info_dict.get('Timestamp', None) or info_dict.get('timestamp', None)
+        self.discord_username = str(discord_username) if discord_username else discord_username
+
+        self.timestamp = timestamp
 
         # This being set that an unload is ongoing
-        self.discord_unload_notification = info_dict.get('discord_unload_in_progress', None)
+        self.discord_unload_notification = discord_unload_notification
 
         # Track number of runs the carrier completed
-        self.run_count = info_dict.get('run_count', None) or info_dict.get('runtotal', None)
-        if self.carrier_name and not self.run_count:
+        if carrier_name and not run_count:
             # Increment to 1 in the case of a carrier name without a run count defined
-            self.run_count = 1
+            run_count = 1
+        self.run_count = run_count
 
         # How many unloading operations are completed.
-        self.total_unloads = info_dict.get('totalunloads', None)
-        if self.carrier_name and not self.total_unloads:
+        if carrier_name and not total_unloads:
             # Set to 0 in the case of a carrier name without a total unloads value defined
-            self.total_unloads = 0
+            total_unloads = 0
+        self.total_unloads = total_unloads
 
         # A UTC representation of when the user usually is available. We use UTC as we need a common reference time,
         # and game time works for that.
-        self.timezone = info_dict.get('user_timezone_in_utc', None)
+        self.timezone = timezone
 
     def to_dictionary(self):
         """
@@ -81,7 +159,8 @@ class BoozeCarrier:
         :rtype: dict
         """
         response = {}
-        for key, value in vars(self).items():
+        for key in self.__slots__:
+            value = getattr(self, key)
             if value is not None:
                 response[key] = value
         return response
@@ -104,7 +183,14 @@ class BoozeCarrier:
 
         :rtype: bool
         """
-        return any([value for key, value in vars(self).items() if key not in ['timestamp', 'platform'] and value])
+        # Platform is always set and the timestamp alone does not make a carrier, ptn_carrier is always False.
+        return bool(
+            self.carrier_name or self.wine_total or self.carrier_identifier or self.discord_username
+            or self.discord_unload_notification or self.run_count or self.total_unloads or self.timezone
+        )
+
+    def _comparison_values(self):
+        return self.carrier_name, self.wine_total, self.carrier_identifier, self.discord_username, self.run_count
 
     def __eq__(self, other):
         """
@@ -114,5 +200,14 @@ class BoozeCarrier:
         :rtype: bool
         """
         if isinstance(other, BoozeCarrier):
-            return all(getattr(self, key) == getattr(other, key) for key in self.COMPARISON_KEYS)
+            return self._comparison_values() == other._comparison_values()
         return False
+
+    def __hash__(self):
+        """
+        Hashes the same fields equality compares, so equal carriers land in the same set or dict slot. Don't change a
+        carrier while it is in a set.
+
+        :rtype: int
+        """
+        return hash(self._comparison_values())
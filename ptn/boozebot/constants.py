@@ -23,6 +23,7 @@ DB_PATH = os.path.join(DATA_DIR, 'database')
 DB_DUMPS_PATH = os.path.join(DATA_DIR, 'database')
 CARRIERS_DB_PATH = os.path.join(DATA_DIR, 'database', 'booze_carriers.db')
 CARRIERS_DB_DUMPS_PATH = os.path.join(DATA_DIR, 'sql', 'booze_carriers.sql')
+CARRIERS_DB_SNAPSHOT_PATH = os.path.join(DATA_DIR, 'sql', 'booze_carriers.snapshot.db')
 SETTINGS_PATH = os.path.join(DATA_DIR, 'settings')
 WELCOME_MESSAGE_FILE = "welcome_message.txt"
 WELCOME_MESSAGE_FILE_PATH = os.path.join(SETTINGS_PATH, WELCOME_MESSAGE_FILE)
@@ -102,6 +103,46 @@ RACKHAMS_PEAK_POP = 150000
 
 EMBED_COLOUR_ERROR = 0x800000
 
+# How many seconds a sheet refresh is reused for before a command triggers a new one
+SHEET_REFRESH_MAX_AGE = int(os.getenv('PTN_BOOZEBOT_SHEET_REFRESH_MAX_AGE', '60'))
+
+# Seconds between full resyncs of the signup sheet. Polls in between only read appended rows, the full resync picks up
+# edits to rows already synced and carriers removed from the sheet
+SHEET_FULL_RESYNC_INTERVAL = int(os.getenv('PTN_BOOZEBOT_SHEET_FULL_RESYNC_INTERVAL', '3600'))
+
+# Fraction of SQL statements the query profiler times, 1 records every statement
+DB_PROFILE_SAMPLE_RATE = float(os.getenv('PTN_BOOZEBOT_DB_PROFILE_SAMPLE_RATE', '1.0'))
+
+# Seconds of quiet after a write before the database snapshot is taken, so a burst of writes makes one backup
+DB_BACKUP_DELAY = float(os.getenv('PTN_BOOZEBOT_DB_BACKUP_DELAY', '30'))
+
+# Local port for pushed form responses, see modules/ingest.py. 0 leaves the endpoint off and the sheet is polled only
+INGEST_PORT = int(os.getenv('PTN_BOOZEBOT_INGEST_PORT', '0'))
+INGEST_HOST = os.getenv('PTN_BOOZEBOT_INGEST_HOST', '127.0.0.1')
+INGEST_TOKEN = os.getenv('PTN_BOOZEBOT_INGEST_TOKEN')
+
+# With pushes coming in, how many seconds a sheet refresh is reused for before the poll reconciles against the sheet
+INGEST_BACKSTOP_INTERVAL = int(os.getenv('PTN_BOOZEBOT_INGEST_BACKSTOP_INTERVAL', '3600'))
+
+# Seconds a public holiday check is answered from cache. The holiday loop refreshes it every 10 minutes, the TTL is longer
+# so commands run just before the loop fires are still answered from cache
+HOLIDAY_CHECK_TTL = int(os.getenv('PTN_BOOZEBOT_HOLIDAY_CHECK_TTL', '900'))
+
+# Seconds to wait on EBGS before asking EDSM as well, the first to answer wins
+HOLIDAY_HEDGE_DELAY = float(os.getenv('PTN_BOOZEBOT_HOLIDAY_HEDGE_DELAY', '1.0'))
+
+# Google Sheets read requests allowed per minute, the API quota per user per project is 60 by default
+SHEETS_READS_PER_MINUTE = int(os.getenv('PTN_BOOZEBOT_SHEETS_READS_PER_MINUTE', '60'))
+
+# Of those, how many are held back for refreshes a user asked for so the periodic loop cannot use them all up
+SHEETS_PRIORITY_RESERVE = int(os.getenv('PTN_BOOZEBOT_SHEETS_PRIORITY_RESERVE', '10'))
+
+# Keep a pinned board of upcoming departures in the departure channel, one per direction, see modules/departure_board.py
+DEPARTURE_BOARD = ast.literal_eval(os.getenv('PTN_BOOZEBOT_DEPARTURE_BOARD', 'False'))
+
+# Shortest gap, in seconds, between edits of the departure board. Changes in between are made in one edit
+DEPARTURE_BOARD_EDIT_INTERVAL = float(os.getenv('PTN_BOOZEBOT_DEPARTURE_BOARD_EDIT_INTERVAL', '5'))
+
 ping_response_messages = [
     'Yarrr, <@{message_author_id}>, you summoned me?',
     'https://tenor.com/view/hello-there-baby-yoda-mandolorian-hello-gif-20136589',
@@ -349,6 +390,126 @@ def get_db_dumps_path():
     return CARRIERS_DB_DUMPS_PATH
 
 
+def get_db_snapshot_path():
+    """
+    Returns the path for the binary database snapshot
+
+    :returns: A string representation of the path
+    :rtype: str
+    """
+    return CARRIERS_DB_SNAPSHOT_PATH
+
+
+def get_db_backup_delay():
+    """
+    Returns how long, in seconds, the database has to be quiet before a snapshot is taken
+
+    :returns: The delay in seconds
+    :rtype: float
+    """
+    return DB_BACKUP_DELAY
+
+
+def get_ingest_settings():
+    """
+    Returns where the form response ingestion endpoint listens and the token callers have to present
+
+    :returns: The host, the port (0 when the endpoint is off) and the token
+    :rtype: tuple[str, int, str | None]
+    """
+    return INGEST_HOST, INGEST_PORT, INGEST_TOKEN
+
+
+def get_ingest_backstop_interval():
+    """
+    Returns how long, in seconds, a sheet refresh stays fresh enough to reuse while form responses are pushed to us
+
+    :returns: The interval in seconds
+    :rtype: int
+    """
+    return INGEST_BACKSTOP_INTERVAL
+
+
+def get_holiday_check_ttl():
+    """
+    Returns how long, in seconds, a public holiday check is answered from cache
+
+    :returns: The TTL in seconds
+    :rtype: int
+    """
+    return HOLIDAY_CHECK_TTL
+
+
+def get_holiday_hedge_delay():
+    """
+    Returns how long, in seconds, the holiday check waits on EBGS before asking EDSM as well
+
+    :returns: The delay in seconds
+    :rtype: float
+    """
+    return HOLIDAY_HEDGE_DELAY
+
+
+def get_departure_board_settings():
+    """
+    Returns whether the departure board is kept and how often it may be edited
+
+    :returns: Whether the board is on and the shortest gap between edits in seconds
+    :rtype: tuple[bool, float]
+    """
+    return DEPARTURE_BOARD, DEPARTURE_BOARD_EDIT_INTERVAL
+
+
+def get_sheets_reads_per_minute():
+    """
+    Returns how many Google Sheets read requests Steve makes per minute at most
+
+    :returns: The request budget per minute
+    :rtype: int
+    """
+    return SHEETS_READS_PER_MINUTE
+
+
+def get_sheets_priority_reserve():
+    """
+    Returns how many Google Sheets requests per minute are kept for user triggered refreshes
+
+    :returns: The reserved requests
+    :rtype: int
+    """
+    return SHEETS_PRIORITY_RESERVE
+
+
+def get_sheet_full_resync_interval():
+    """
+    Returns how long, in seconds, the sheet sync goes on reading only appended rows before it resyncs the whole sheet
+
+    :returns: The interval in seconds
+    :rtype: int
+    """
+    return SHEET_FULL_RESYNC_INTERVAL
+
+
+def get_sheet_refresh_max_age():
+    """
+    Returns how long, in seconds, a refresh of the signup sheet stays fresh enough to reuse
+
+    :returns: The staleness window in seconds
+    :rtype: int
+    """
+    return SHEET_REFRESH_MAX_AGE
+
+
+def get_db_profile_sample_rate():
+    """
+    Returns the fraction of SQL statements the query profiler records
+
+    :returns: The sample rate between 0 and 1
+    :rtype: float
+    """
+    return DB_PROFILE_SAMPLE_RATE
+
+
 def get_bot_control_channel():
     """
     Returns the channel ID for the bot control channel.
@@ -0,0 +1,134 @@
+"""
+Background snapshots of the booze carriers database.
+
+Writers call request() after they commit. The snapshot is taken on a timer thread once the database has been quiet for
+the debounce delay, so a burst of writes makes one backup and nothing runs on the event loop. Snapshots use SQLite's
+online backup API from a pooled read connection, which in WAL mode copies a consistent state without holding up the
+writer. The snapshot is written next to its final path and swapped in, so a crash mid backup leaves the last good one.
+
+Depends on: connections
+"""
+
+# import libraries
+import os
+import sqlite3
+import threading
+import time
+
+
+class BackupScheduler:
+
+    def __init__(self, connections, snapshot_path, delay=30, max_delay=None):
+        """
+        :param ConnectionManager connections: The connections to back up.
+        :param str snapshot_path: Where the snapshot is kept.
+        :param float delay: Seconds of quiet after the last request before the snapshot is taken.
+        :param float max_delay: The longest a request waits while writes keep coming, defaults to ten times delay.
+        """
+        self.connections = connections
+        self.snapshot_path = snapshot_path
+        self.delay = delay
+        self.max_delay = max_delay if max_delay is not None else delay * 10
+
+        self.last_backup = None
+        self.last_duration = None
+
+        self._lock = threading.Lock()
+        self._backup_lock = threading.Lock()
+        self._timer = None
+        self._first_request = None
+
+    @property
+    def pending(self):
+        """
+        :returns: True if a snapshot has been requested and not yet taken.
+        :rtype: bool
+        """
+        return self._timer is not None
+
+    def request(self):
+        """
+        Asks for a snapshot once writes settle down. Cheap enough to call after every commit.
+
+        :returns: None
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+            if self._timer is not None:
+                self._timer.cancel()
+
+            # Push the snapshot back while writes keep coming, but never past max_delay from the first request.
+            wait = min(self.delay, max(self._first_request + self.max_delay - now, 0))
+            self._timer = threading.Timer(wait, self._run_scheduled)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _take_pending(self):
+        with self._lock:
+            if self._timer is None:
+                return False
+            self._timer.cancel()
+            self._timer = None
+            self._first_request = None
+            return True
+
+    def _run_scheduled(self):
+        if not self._take_pending():
+            return
+        try:
+            self.backup_now()
+        except (sqlite3.Error, OSError) as e:
+            # Leave the previous snapshot in place, the next write asks again.
+            print(f'Database snapshot failed: {e}')
+
+    def flush(self):
+        """
+        Takes any pending snapshot straight away, for shutdown.
+
+        :returns: True if a snapshot was taken.
+        :rtype: bool
+        """
+        if not self._take_pending():
+            return False
+        self.backup_now()
+        return True
+
+    def backup_now(self):
+        """
+        Copies the database to the snapshot path. Blocking, run it off the event loop.
+
+        :returns: Seconds the backup took.
+        :rtype: float
+        """
+        with self._backup_lock:
+            started_at = time.perf_counter()
+            temp_path = f'{self.snapshot_path}.tmp'
+            destination = sqlite3.connect(temp_path)
+            try:
+                with self.connections.read_cursor() as cursor:
+                    cursor.connection.backup(destination)
+            finally:
+                destination.close()
+            os.replace(temp_path, self.snapshot_path)
+
+            self.last_duration = time.perf_counter() - started_at
+            self.last_backup = time.time()
+            print(f'Database snapshot written in {self.last_duration:.2f}s.')
+            return self.last_duration
+
+
+def restore_snapshot(snapshot_path, connection):
+    """
+    Copies a snapshot into the given connection, replacing whatever it held.
+
+    :param str snapshot_path: The snapshot written by BackupScheduler.
+    :param sqlite3.Connection connection: The writer connection. The caller holds the write lock.
+    :returns: None
+    """
+    source = sqlite3.connect(f'file:{snapshot_path}?mode=ro', uri=True)
+    try:
+        source.backup(connection)
+    finally:
+        source.close()
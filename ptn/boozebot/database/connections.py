@@ -0,0 +1,131 @@
+"""
+SQLite connection manager for the booze carriers database.
+
+The database runs in WAL mode with one writer connection and a small pool of read only connections. Cursors are only
+handed out through the read_cursor and write_cursor context managers, so no two callers ever share a result set and
+readers never wait on the writer.
+
+Depends on: nothing
+"""
+
+# import libraries
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionManager:
+
+    def __init__(self, db_path, read_pool_size=4, timeout=30, factory=sqlite3.Connection):
+        """
+        Opens the writer connection and switches the database to WAL mode. Read connections are opened on demand up to
+        read_pool_size.
+
+        :param str db_path: Path to the sqlite database file.
+        :param int read_pool_size: The most read connections open at once.
+        :param float timeout: Seconds a connection waits on a locked database before raising.
+        :param type factory: The sqlite3.Connection class to open connections with.
+        """
+        self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self.timeout = timeout
+        self.factory = factory
+
+        # The writer is used from whichever executor thread holds the write lock, not the thread that opened it.
+        self.writer = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False, factory=factory)
+        self.writer.row_factory = sqlite3.Row
+        self.writer.execute('PRAGMA journal_mode=WAL')
+
+        # Re-entrant so a write_cursor block can call helpers that take the lock again, dump_database for example.
+        self.write_lock = threading.RLock()
+
+        self._readers = queue.LifoQueue()
+        self._readers_opened = 0
+        self._readers_lock = threading.Lock()
+
+    def _open_reader(self):
+        connection = sqlite3.connect(
+            f'file:{self.db_path}?mode=ro', uri=True, timeout=self.timeout, check_same_thread=False,
+            factory=self.factory,
+        )
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if self._readers_opened < self.read_pool_size:
+                self._readers_opened += 1
+                open_new = True
+            else:
+                open_new = False
+
+        if open_new:
+            try:
+                return self._open_reader()
+            except sqlite3.Error:
+                with self._readers_lock:
+                    self._readers_opened -= 1
+                raise
+
+        # Pool is exhausted, wait for another reader to come back.
+        return self._readers.get(timeout=self.timeout)
+
+    @contextmanager
+    def read_cursor(self):
+        """
+        Gives out a cursor on a pooled read only connection. Each read sees the last committed state of the database
+        and never blocks on the writer.
+
+        :returns: A context manager yielding the cursor.
+        :rtype: Iterator[sqlite3.Cursor]
+        """
+        connection = self._acquire_reader()
+        cursor = connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            # End the implicit read transaction so the next user of this connection sees fresh data.
+            connection.rollback()
+            self._readers.put(connection)
+
+    @contextmanager
+    def write_cursor(self):
+        """
+        Gives out a cursor on the writer connection under the write lock. The block runs as one transaction that is
+        committed on exit, or rolled back if the block raises.
+
+        :returns: A context manager yielding the cursor.
+        :rtype: Iterator[sqlite3.Cursor]
+        """
+        with self.write_lock:
+            cursor = self.writer.cursor()
+            try:
+                yield cursor
+                self.writer.commit()
+            except BaseException:
+                self.writer.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        """
+        Closes the writer and every pooled reader.
+
+        :returns: None
+        """
+        with self.write_lock:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._readers_opened = 0
+            self.writer.close()
@@ -0,0 +1,225 @@
+"""
+Running totals for the tally embeds.
+
+The cruise_summary table holds one row with the totals for the current cruise. Triggers on boozecarriers keep it up to
+date on every insert, update and delete, whichever code path makes the write, so the totals never need rebuilding from
+the carrier rows. CruiseSummaryCache keeps that row in memory and only reads it again once another connection has
+committed something.
+
+Archived cruises are rolled up the same way into cruise_rollups, one row per cruise, written when the cruise is
+archived. Historical tallies read that row instead of summing historical.
+
+Depends on: nothing
+"""
+
+# import libraries
+import sqlite3
+import threading
+
+
+def _carrier_terms(row):
+    # The per carrier contributions, counted the same way BoozeCarrier reads the row: a missing or zero run count is
+    # one run, missing wine and unloads are zero.
+    runs = f'MAX(COALESCE({row}.runtotal, 1), 1)'
+    unloads = f'COALESCE({row}.totalunloads, 0)'
+    return {
+        'total_wine': f'COALESCE({row}.winetotal, 0)',
+        'unique_carriers': '1',
+        'extra_trips': f'{runs} - 1',
+        'multiple_trip_carriers': f'({runs} > 1)',
+        'total_unloads': unloads,
+        'remaining_carriers': f'({runs} - {unloads} > 0)',
+    }
+
+
+SUMMARY_COLUMNS = tuple(_carrier_terms('x'))
+
+
+def _apply(row, sign):
+    return ', '.join(f'{column} = {column} {sign} ({term})' for column, term in _carrier_terms(row).items())
+
+
+def aggregate_sql(table):
+    """
+    Returns a query that sums the summary columns over a carriers table, from scratch.
+
+    :param str table: boozecarriers or historical.
+    :returns: The SELECT, without a WHERE clause.
+    :rtype: str
+    """
+    terms = _carrier_terms(table)
+    return 'SELECT ' + ', '.join(f'COALESCE(SUM({term}), 0)' for term in terms.values()) + f' FROM {table}'
+
+
+def create_cruise_summary(cursor):
+    """
+    Creates the cruise_summary table, fills it from boozecarriers and adds the triggers that keep it current.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS cruise_summary(id INTEGER PRIMARY KEY CHECK (id = 1), '
+        + ', '.join(f'{column} INT NOT NULL DEFAULT 0' for column in SUMMARY_COLUMNS)
+        + ')'
+    )
+    cursor.execute('DELETE FROM cruise_summary')
+    cursor.execute(
+        f'INSERT INTO cruise_summary (id, {", ".join(SUMMARY_COLUMNS)}) SELECT 1, * FROM ({aggregate_sql("boozecarriers")})'
+    )
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cruise_summary_insert AFTER INSERT ON boozecarriers BEGIN
+            UPDATE cruise_summary SET {_apply('NEW', '+')} WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cruise_summary_delete AFTER DELETE ON boozecarriers BEGIN
+            UPDATE cruise_summary SET {_apply('OLD', '-')} WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cruise_summary_update AFTER UPDATE ON boozecarriers BEGIN
+            UPDATE cruise_summary SET {_apply('OLD', '-')} WHERE id = 1;
+            UPDATE cruise_summary SET {_apply('NEW', '+')} WHERE id = 1;
+        END
+    ''')
+
+
+def rollup_cruises(cursor, holiday_start=None):
+    """
+    Rebuilds the cruise_rollups rows from historical, for one cruise or for every cruise.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :param str holiday_start: The cruise to roll up, or None for all of them.
+    :returns: The number of cruises rolled up.
+    :rtype: int
+    """
+    terms = _carrier_terms('historical')
+    where = 'WHERE holiday_start = (?)' if holiday_start is not None else 'WHERE holiday_start IS NOT NULL'
+    cursor.execute(
+        f'''
+        INSERT OR REPLACE INTO cruise_rollups (holiday_start, holiday_end, {", ".join(SUMMARY_COLUMNS)})
+        SELECT holiday_start, MAX(holiday_end), {", ".join(f"SUM({term})" for term in terms.values())}
+        FROM historical {where} GROUP BY holiday_start
+        ''',
+        (holiday_start,) if holiday_start is not None else (),
+    )
+    return max(cursor.rowcount, 0)
+
+
+def create_cruise_rollups(cursor):
+    """
+    Creates the cruise_rollups table and backfills it from the cruises already in historical.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS cruise_rollups(holiday_start DATE PRIMARY KEY, holiday_end DATE, '
+        + ', '.join(f'{column} INT NOT NULL DEFAULT 0' for column in SUMMARY_COLUMNS)
+        + ')'
+    )
+    # For /biggest_cruise_tally.
+    cursor.execute('CREATE INDEX IF NOT EXISTS cruise_rollups_total_wine ON cruise_rollups(total_wine)')
+    backfilled = rollup_cruises(cursor)
+    if backfilled:
+        print(f'Rolled up {backfilled} archived cruises.')
+
+
+class CruiseStats:
+
+    def __init__(self, total_wine=0, unique_carriers=0, extra_trips=0, multiple_trip_carriers=0, total_unloads=0,
+                 remaining_carriers=0):
+        """
+        The totals a tally embed is built from.
+
+        :param int total_wine: Tonnes of wine across every carrier.
+        :param int unique_carriers: Number of carriers signed up.
+        :param int extra_trips: Runs beyond each carrier's first.
+        :param int multiple_trip_carriers: Carriers making more than one run.
+        :param int total_unloads: Unloads completed.
+        :param int remaining_carriers: Carriers with runs still to unload.
+        """
+        self.total_wine = total_wine
+        self.unique_carriers = unique_carriers
+        self.extra_trips = extra_trips
+        self.multiple_trip_carriers = multiple_trip_carriers
+        self.total_unloads = total_unloads
+        self.remaining_carriers = remaining_carriers
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        :param tuple row: The summary columns in SUMMARY_COLUMNS order, as returned by aggregate_sql.
+        :rtype: CruiseStats
+        """
+        return cls(*(int(value or 0) for value in row))
+
+    @property
+    def total_trips(self):
+        """
+        :returns: Carrier trips including repeat runs.
+        :rtype: int
+        """
+        return self.unique_carriers + self.extra_trips
+
+    def __eq__(self, other):
+        if isinstance(other, CruiseStats):
+            return vars(self) == vars(other)
+        return False
+
+    def __str__(self):
+        return 'CruiseStats: ' + ' '.join(f'{key}:{value}' for key, value in vars(self).items())
+
+
+class CruiseSummaryCache:
+
+    def __init__(self, db_path):
+        """
+        Holds the cruise_summary row in memory. PRAGMA data_version on a dedicated connection changes whenever another
+        connection commits, so checking it is enough to know the cached row is still current.
+
+        :param str db_path: Path to the sqlite database file.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._data_version = None
+        self._stats = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False
+            )
+        return self._connection
+
+    def get(self):
+        """
+        Returns the current cruise totals, reading the summary row only if the database changed. Blocking, run it on
+        the database executor.
+
+        :returns: The totals.
+        :rtype: CruiseStats
+        """
+        with self._lock:
+            connection = self._connect()
+            data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+            if self._stats is None or data_version != self._data_version:
+                row = connection.execute(
+                    f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM cruise_summary WHERE id = 1'
+                ).fetchone()
+                self._stats = CruiseStats.from_row(row) if row else CruiseStats()
+                self._data_version = data_version
+            return self._stats
+
+    def close(self):
+        """
+        :returns: None
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._stats = None
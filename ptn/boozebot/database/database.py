@@ -1,177 +1,446 @@
+import asyncio
 import os
 import sqlite3
-import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from ptn.boozebot.constants import get_db_path, get_db_dumps_path
+from prometheus_client import Histogram
+
+from ptn.boozebot.constants import (
+    get_db_path,
+    get_db_dumps_path,
+    get_db_profile_sample_rate,
+    get_db_snapshot_path,
+    get_db_backup_delay,
+)
+from ptn.boozebot.database.backup import BackupScheduler, restore_snapshot
+from ptn.boozebot.database.connections import ConnectionManager
+from ptn.boozebot.database.cruise_stats import CruiseStats, CruiseSummaryCache, SUMMARY_COLUMNS
+from ptn.boozebot.database.departures import Departure, DEPARTURE_SCHEDULED, OPEN_DEPARTURE_STATES
+from ptn.boozebot.database.lifetime import CarrierLifetime, LEADERBOARD_COLUMNS
+from ptn.boozebot.database.profiler import (
+    QueryProfiler,
+    capture_call_site,
+    executor_call_site,
+    profiled_connection_factory,
+)
+from ptn.boozebot.database.migrations import current_version, latest_version, run_migrations
 
 print(f'Starting DB at: {get_db_path()}')
 
-pirate_steve_conn = sqlite3.connect(get_db_path())
-pirate_steve_conn.row_factory = sqlite3.Row
-pirate_steve_db = pirate_steve_conn.cursor()
-pirate_steve_conn.set_trace_callback(print)
+DB_READ_POOL_SIZE = 4
+
+# Every statement is timed into the profiler rather than printed, see /booze_db_stats and boozebot_db_query_seconds.
+pirate_steve_profiler = QueryProfiler(sample_rate=get_db_profile_sample_rate())
+pirate_steve_connections = ConnectionManager(
+    get_db_path(), read_pool_size=DB_READ_POOL_SIZE, factory=profiled_connection_factory(pirate_steve_profiler)
+)
+
+# The current cruise totals for the tally embeds, kept in step with boozecarriers by triggers.
+pirate_steve_cruise_summary = CruiseSummaryCache(get_db_path())
 
 db_sql_store = get_db_dumps_path()
-pirate_steve_lock = threading.Lock()
+db_snapshot_store = get_db_snapshot_path()
 
+# Writers ask for a backup after they commit, the snapshot itself is taken on a timer thread once things are quiet.
+pirate_steve_backups = BackupScheduler(pirate_steve_connections, db_snapshot_store, delay=get_db_backup_delay())
 
-def dump_database():
+# Keeps every SQLite and GoogleSheets call off the discord.py event loop. Each call takes its own cursor from the
+# connection manager, so there is a worker per pooled reader plus one for the writer.
+pirate_steve_executor = ThreadPoolExecutor(max_workers=DB_READ_POOL_SIZE + 1, thread_name_prefix='pirate_steve_db')
+
+blocking_call_seconds = Histogram(
+    'boozebot_blocking_call_seconds',
+    'Time spent in blocking database and sheet calls run on the database executor.',
+    ['call'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+blocking_call_wait_seconds = Histogram(
+    'boozebot_blocking_call_wait_seconds',
+    'Time blocking calls spent queued for the database executor.',
+    ['call'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+async def run_blocking(func, *args, **kwargs):
     """
-    Dumps the booze cruise carrier database into sql.
+    Runs a blocking callable on the database executor and awaits its result.
 
-    :returns: None
+    :param callable func: The blocking function to run.
+    :returns: Whatever the function returns.
     """
-    with open(db_sql_store, 'w', encoding="utf-8") as f:
-        for line in pirate_steve_conn.iterdump():
-            f.write(line)
+    call_name = getattr(func, '__name__', repr(func))
+    call_site = capture_call_site()
+    queued_at = time.perf_counter()
 
+    def timed_call():
+        started_at = time.perf_counter()
+        blocking_call_wait_seconds.labels(call_name).observe(started_at - queued_at)
+        token = executor_call_site.set(call_site)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            executor_call_site.reset(token)
+            duration = time.perf_counter() - started_at
+            blocking_call_seconds.labels(call_name).observe(duration)
+            if duration > 1:
+                print(f'Blocking call {call_name} took {duration:.2f}s on the database executor.')
 
-def build_database_on_startup():
-    print('Checking whether the booze carriers db exists')
-    pirate_steve_db.execute(
-        '''SELECT count(name) FROM sqlite_master WHERE TYPE = 'table' AND name = 'boozecarriers' ''')
-    if not bool(pirate_steve_db.fetchone()[0]):
-
-        if os.path.exists(db_sql_store):
-            # recreate from backup file
-            print('Recreating database from backup ...')
-            with open(db_sql_store) as f:
-                sql_script = f.read()
-                pirate_steve_db.executescript(sql_script)
-        else:
-            print('Creating a fresh database')
-            pirate_steve_db.execute('''
-                CREATE TABLE boozecarriers( 
-                    entry INTEGER PRIMARY KEY AUTOINCREMENT,
-                    carriername TEXT NOT NULL, 
-                    carrierid TEXT UNIQUE,
-                    winetotal INT,
-                    platform TEXT NOT NULL,
-                    officialcarrier BOOLEAN,
-                    discordusername TEXT NOT NULL,
-                    timestamp DATETIME,
-                    runtotal INT,
-                    totalunloads INT,
-                    discord_unload_in_progress INT,
-                    user_timezone_in_utc TEXT
-                ) 
-            ''')
-            print('Database created')
-    else:
-        print('The booze carrier database already exists')
-
-    print('Checking whether the holiday database db exists')
-    pirate_steve_db.execute(
-        '''SELECT count(name) FROM sqlite_master WHERE TYPE = 'table' AND name = 'holidaystate' '''
+    return await asyncio.get_running_loop().run_in_executor(pirate_steve_executor, timed_call)
+
+
+def read_cursor():
+    """
+    Gives out a cursor on a pooled read only connection, see ConnectionManager.read_cursor.
+
+    :returns: A context manager yielding the cursor.
+    :rtype: Iterator[sqlite3.Cursor]
+    """
+    return pirate_steve_connections.read_cursor()
+
+
+def write_cursor():
+    """
+    Gives out a cursor on the writer connection, committed when the block exits. See ConnectionManager.write_cursor.
+
+    :returns: A context manager yielding the cursor.
+    :rtype: Iterator[sqlite3.Cursor]
+    """
+    return pirate_steve_connections.write_cursor()
+
+
+def _fetch_all(sql, params):
+    with read_cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _fetch_one(sql, params):
+    with read_cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def _execute_commit(sql, params):
+    with write_cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+async def fetch_all(sql, params=()):
+    """
+    Runs a query on the database executor.
+
+    :param str sql: The query.
+    :param tuple params: The query parameters.
+    :returns: All the rows.
+    :rtype: list[sqlite3.Row]
+    """
+    return await run_blocking(_fetch_all, sql, params)
+
+
+async def fetch_one(sql, params=()):
+    """
+    Runs a query on the database executor.
+
+    :param str sql: The query.
+    :param tuple params: The query parameters.
+    :returns: The first row, or None.
+    :rtype: sqlite3.Row | None
+    """
+    return await run_blocking(_fetch_one, sql, params)
+
+
+async def execute_commit(sql, params=()):
+    """
+    Runs a single write statement on the writer connection on the executor and commits it.
+
+    :param str sql: The statement.
+    :param tuple params: The statement parameters.
+    :returns: The number of rows modified.
+    :rtype: int
+    """
+    return await run_blocking(_execute_commit, sql, params)
+
+
+async def current_cruise_stats():
+    """
+    Returns the totals for the current cruise from the cruise summary, see CruiseSummaryCache.
+
+    :returns: The totals.
+    :rtype: CruiseStats
+    """
+    return await run_blocking(pirate_steve_cruise_summary.get)
+
+
+async def archived_cruise_stats(cruises_back=1, order_by='holiday_start'):
+    """
+    Picks an archived cruise from the rollups.
+
+    :param int cruises_back: 1 for the first cruise in the ordering, 2 for the next and so on.
+    :param str order_by: holiday_start for the most recent first, total_wine for the biggest first.
+    :returns: The cruise's holiday_start and its totals, or None if there are not that many cruises.
+    :rtype: tuple[str, CruiseStats] | None
+    """
+    if order_by not in ('holiday_start', 'total_wine'):
+        raise ValueError(f'Cannot order cruises by {order_by}')
+    row = await fetch_one(
+        f'''
+        SELECT holiday_start, {", ".join(SUMMARY_COLUMNS)} FROM cruise_rollups
+        ORDER BY {order_by} DESC LIMIT 1 OFFSET (?)
+        ''',
+        (cruises_back - 1,),
     )
-    if not bool(pirate_steve_db.fetchone()[0]):
-        print('Creating a fresh holiday database')
-        pirate_steve_db.execute('''
-            CREATE TABLE holidaystate(
-                entry INTEGER PRIMARY KEY AUTOINCREMENT,
-                state BOOL, 
-                timestamp DATETIME
-            ) 
-        ''')
-        # Write some defaults
-        pirate_steve_db.execute('''
-            INSERT INTO holidaystate VALUES(
-                NULL,
-                0,
-                CURRENT_TIMESTAMP
-                ) 
-            ''')
-        pirate_steve_conn.commit()
-        print('Database created')
-    else:
-        print('The holiday state database already exists')
-
-    print('Checking whether the historical database exists')
-    pirate_steve_db.execute(
-        '''SELECT count(name) FROM sqlite_master WHERE TYPE = 'table' AND name = 'historical' '''
+    if row is None:
+        return None
+    return row[0], CruiseStats.from_row(tuple(row)[1:])
+
+
+async def archived_cruise_count():
+    """
+    :returns: The number of archived cruises.
+    :rtype: int
+    """
+    return (await fetch_one('SELECT count(*) FROM cruise_rollups'))[0]
+
+
+async def carrier_leaderboard(order_by='total_wine', limit=100):
+    """
+    Returns the carriers with the highest lifetime totals over the archived cruises.
+
+    :param str order_by: One of LEADERBOARD_COLUMNS.
+    :param int limit: How many carriers to return.
+    :returns: The carriers, highest first.
+    :rtype: list[CarrierLifetime]
+    """
+    if order_by not in LEADERBOARD_COLUMNS:
+        raise ValueError(f'Cannot rank carriers by {order_by}')
+    rows = await fetch_all(f'SELECT * FROM carrier_lifetime ORDER BY {order_by} DESC LIMIT (?)', (limit,))
+    return [CarrierLifetime.from_row(row) for row in rows]
+
+
+async def record_departure(departure):
+    """
+    Adds a departure notice to the departure index.
+
+    :param Departure departure: The notice just posted.
+    :returns: None
+    """
+    await execute_commit(
+        '''
+        INSERT OR REPLACE INTO departures (message_id, channel_id, carrierid, author_id, departure_location,
+            arrival_location, departure_time, state, posted_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        (departure.message_id, departure.channel_id, departure.carrier_id, departure.author_id,
+         departure.departure_location, departure.arrival_location, departure.departure_time, departure.state,
+         departure.posted_at),
     )
-    if not bool(pirate_steve_db.fetchone()[0]):
-        print('Creating a fresh historical state database')
-        pirate_steve_db.execute('''
-            CREATE TABLE historical(
-                entry INTEGER PRIMARY KEY AUTOINCREMENT,
-                holiday_start DATE,
-                holiday_end DATE,
-                carriername TEXT NOT NULL, 
-                carrierid TEXT,
-                winetotal INT,
-                platform TEXT NOT NULL,
-                officialcarrier BOOLEAN,
-                discordusername TEXT NOT NULL,
-                timestamp DATETIME,
-                runtotal INT,
-                totalunloads INT,
-                discord_unload_in_progress INT,
-                user_timezone_in_utc TEXT
-            ) 
-        ''')
-        pirate_steve_conn.commit()
-        print('Historical Database created')
-    else:
-        print('The historical state database already exists')
-
-    print('Checking whether the the input tracking database exists')
-    pirate_steve_db.execute(
-        '''SELECT count(name) FROM sqlite_master WHERE TYPE = 'table' AND name = 'trackingforms' '''
+    request_backup()
+
+
+async def set_departure_state(message_id, state, only_open=False):
+    """
+    Moves a departure notice on to its next state.
+
+    :param int message_id: The notice's message ID.
+    :param str state: One of the DEPARTURE_ states.
+    :param bool only_open: Leave notices that are already closed or removed alone.
+    :returns: True if a notice was updated.
+    :rtype: bool
+    """
+    sql = 'UPDATE departures SET state = (?) WHERE message_id = (?)'
+    params = (state, message_id)
+    if only_open:
+        sql += f' AND state IN ({", ".join("?" * len(OPEN_DEPARTURE_STATES))})'
+        params += OPEN_DEPARTURE_STATES
+    return bool(await execute_commit(sql, params))
+
+
+async def scheduled_departures():
+    """
+    Returns the departures still waiting on their reminder, soonest first. Those without a time are left out, they
+    never come due.
+
+    :rtype: list[Departure]
+    """
+    rows = await fetch_all(
+        'SELECT * FROM departures WHERE state = (?) AND departure_time IS NOT NULL ORDER BY departure_time',
+        (DEPARTURE_SCHEDULED,),
     )
-    if not bool(pirate_steve_db.fetchone()[0]):
-        print('Creating a fresh trackingforms database')
-        pirate_steve_db.execute('''
-                CREATE TABLE trackingforms(
-                    entry INTEGER PRIMARY KEY AUTOINCREMENT,
-                    worksheet_key TEXT UNIQUE,
-                    loader_input_form_url TEXT UNIQUE,
-                    worksheet_with_data_id INT
-                ) 
-            ''')
-        # Some default values in the case we need to make the table. These will need to be set accordingly,
-        # remove this once we have them in place
-        pirate_steve_db.execute('''
-            INSERT INTO trackingforms VALUES(
-                NULL,
-                '1Etk2sZRKKV7LsDVNJ60qrzJs3ZE8Wa99KTv7r6bwgIw',
-                'https://forms.gle/dWugae3M3i76NNVi7',
-                1
-            ) 
-        ''')
-        pirate_steve_conn.commit()
-        print('Forms Database created')
-    else:
-        print('The tracking forms database already exists')
-            
-    print('Checking whether the the pinned message tracking database exists')
-    pirate_steve_db.execute(
-        '''SELECT count(name) FROM sqlite_master WHERE TYPE = 'table' AND name = 'pinned_messages' '''
+    return [Departure.from_row(row) for row in rows]
+
+
+async def get_departure(message_id):
+    """
+    :param int message_id: The notice's message ID.
+    :returns: The departure, or None if the notice is not in the index.
+    :rtype: Departure | None
+    """
+    row = await fetch_one('SELECT * FROM departures WHERE message_id = (?)', (message_id,))
+    return Departure.from_row(row) if row else None
+
+
+async def open_departures():
+    """
+    Returns the departure notices still up in the channel.
+
+    :rtype: list[Departure]
+    """
+    rows = await fetch_all(
+        f'SELECT * FROM departures WHERE state IN ({", ".join("?" * len(OPEN_DEPARTURE_STATES))})',
+        OPEN_DEPARTURE_STATES,
     )
-    if not bool(pirate_steve_db.fetchone()[0]):
-        print('Creating a fresh pinned_messages database')
-        pirate_steve_db.execute('''
-                CREATE TABLE pinned_messages(
-                    entry INTEGER PRIMARY KEY AUTOINCREMENT,
-                    message_id TEXT UNIQUE,
-                    channel_id TEXT UNIQUE
-                ) 
-            ''')
-        pirate_steve_conn.commit()
-        print('Pinned message Database created')
-    else:
-        print('The pinned message database already exists')
-
-    # Check to add any new columns to the database tables.
-    pirate_steve_db.execute('''PRAGMA table_info (boozecarriers)''')
-    result = [dict(col) for col in pirate_steve_db.fetchall()]
-    col_names = [element['name'] for element in result]
-
-    if 'user_timezone_in_utc' not in col_names:
-        print('Adding the user_timezone_in_utc field.')
-        # Go add it
-        pirate_steve_db.execute(
-            '''ALTER TABLE boozecarriers ADD COLUMN user_timezone_in_utc TEXT'''
+    return [Departure.from_row(row) for row in rows]
+
+
+def _backfill_departures(departures):
+    with write_cursor() as cursor:
+        cursor.execute('SELECT 1 FROM departure_backfill')
+        if cursor.fetchone():
+            return None
+        cursor.executemany(
+            '''
+            INSERT OR IGNORE INTO departures (message_id, channel_id, carrierid, author_id, departure_location,
+                arrival_location, departure_time, state, posted_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            [
+                (departure.message_id, departure.channel_id, departure.carrier_id, departure.author_id,
+                 departure.departure_location, departure.arrival_location, departure.departure_time,
+                 departure.state, departure.posted_at)
+                for departure in departures
+            ],
         )
-        pirate_steve_conn.commit()
-        
\ No newline at end of file
+        added = cursor.rowcount
+        cursor.execute('INSERT INTO departure_backfill (completed_at) VALUES (CURRENT_TIMESTAMP)')
+        return added
+
+
+async def departures_backfilled():
+    """
+    :returns: True once the departure notices from before the index existed have been read in.
+    :rtype: bool
+    """
+    return await fetch_one('SELECT 1 FROM departure_backfill') is not None
+
+
+async def backfill_departures(departures):
+    """
+    Adds the notices found in the channel history to the index and records that the backfill ran. Notices already
+    indexed are left as they are.
+
+    :param list[Departure] departures: The notices read from the channel.
+    :returns: How many were added, or None if the backfill had already run.
+    :rtype: int | None
+    """
+    added = await run_blocking(_backfill_departures, departures)
+    request_backup()
+    return added
+
+
+async def route_subscriptions():
+    """
+    :returns: Every route subscription, as (user_id, departure_system, arrival_system) rows. A None arrival_system
+        matches any arrival.
+    :rtype: list[sqlite3.Row]
+    """
+    return await fetch_all('SELECT user_id, departure_system, arrival_system FROM route_subscriptions')
+
+
+def _add_route_subscriptions(user_id, routes):
+    with write_cursor() as cursor:
+        cursor.executemany(
+            'INSERT OR IGNORE INTO route_subscriptions (user_id, departure_system, arrival_system) VALUES (?, ?, ?)',
+            [(user_id, departure_system, arrival_system) for departure_system, arrival_system in routes],
+        )
+
+
+async def add_route_subscriptions(user_id, routes):
+    """
+    :param int user_id: The pilot subscribing.
+    :param list[tuple[str, str | None]] routes: (departure_system, arrival_system) pairs. Only pass routes the pilot
+        is not already subscribed to, NULL arrivals are not caught by the unique constraint.
+    :returns: None
+    """
+    await run_blocking(_add_route_subscriptions, user_id, routes)
+    request_backup()
+
+
+async def remove_route_subscriptions(user_id):
+    """
+    :param int user_id: The pilot unsubscribing.
+    :returns: How many subscriptions were removed.
+    :rtype: int
+    """
+    removed = await execute_commit('DELETE FROM route_subscriptions WHERE user_id = (?)', (user_id,))
+    request_backup()
+    return removed
+
+
+def request_backup():
+    """
+    Schedules a snapshot of the database once writes settle. Returns straight away, see BackupScheduler.
+
+    :returns: None
+    """
+    pirate_steve_backups.request()
+
+
+def dump_database():
+    """
+    Dumps the booze cruise carrier database into sql. This is the human readable export, the routine backups are the
+    snapshots from request_backup.
+
+    :returns: The path of the dump.
+    :rtype: str
+    """
+    # Hold the write lock so the dump never sees a half finished transaction.
+    with pirate_steve_connections.write_lock, open(db_sql_store, 'w', encoding="utf-8") as f:
+        for line in pirate_steve_connections.writer.iterdump():
+            f.write(line)
+    return db_sql_store
+
+
+def _restore_from_backup(connection):
+    # The snapshot is a straight page copy, much faster than replaying the SQL dump. The dump is the fallback for a
+    # missing or unreadable snapshot.
+    if os.path.exists(db_snapshot_store):
+        print('Recreating database from snapshot ...')
+        try:
+            restore_snapshot(db_snapshot_store, connection)
+            return
+        except sqlite3.DatabaseError as e:
+            print(f'Could not restore the snapshot, falling back to the SQL dump: {e}')
+
+    if os.path.exists(db_sql_store):
+        print('Recreating database from SQL dump ...')
+        with open(db_sql_store) as f:
+            connection.executescript(f.read())
+
+
+def build_database_on_startup():
+    """
+    Restores the database from the last snapshot, or the SQL dump if there is no snapshot, when it is missing. Then
+    brings the schema up to date.
+
+    :returns: None
+    """
+    with pirate_steve_connections.write_lock:
+        connection = pirate_steve_connections.writer
+
+        if current_version(connection) == 0:
+            # Either a brand new database, or one from before migrations. Only a missing boozecarriers table means
+            # there is nothing to keep, in which case restore the last backup if there is one.
+            has_carriers = connection.execute(
+                '''SELECT count(name) FROM sqlite_master WHERE TYPE = 'table' AND name = 'boozecarriers' '''
+            ).fetchone()[0]
+            if not has_carriers:
+                _restore_from_backup(connection)
+
+        applied = run_migrations(connection)
+        if applied:
+            print(f'Database migrated to version {latest_version()}.')
+        else:
+            print(f'Database schema is up to date at version {latest_version()}.')
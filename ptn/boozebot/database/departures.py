@@ -0,0 +1,203 @@
+"""
+The departure index.
+
+Every departure notice /wine_carrier_departure posts gets a row in departures, so the reminder scheduler and startup can
+find what is due with one query instead of paging through the channel history. Notices posted before the table
+existed are read back out of the channel once, see parse_departure_message.
+
+A departure is scheduled until its time passes and the owner is reminded, then notified. It is closed when the owner
+ticks it off, or removed if the notice was deleted some other way.
+
+Depends on: nothing
+"""
+
+# import libraries
+import re
+
+DEPARTURE_SCHEDULED = 'scheduled'
+DEPARTURE_NOTIFIED = 'notified'
+DEPARTURE_CLOSED = 'closed'
+DEPARTURE_REMOVED = 'removed'
+
+# The notices still in the channel.
+OPEN_DEPARTURE_STATES = (DEPARTURE_SCHEDULED, DEPARTURE_NOTIFIED)
+
+# Notices without a time are due this long after they were posted.
+THOON_DEPARTURE_DELAY = 25 * 60
+
+# Up is towards N0.
+DIRECTION_UP = 'up'
+DIRECTION_DOWN = 'down'
+
+# Gali and Mandhrithar sit past the end of the numbered systems.
+OUTER_SYSTEM_INDEX = 16
+
+# The systems a route can start or end at, in route order.
+ROUTE_SYSTEMS = [f'N{index}' for index in range(OUTER_SYSTEM_INDEX)] + ['Gali', 'Mandhrithar']
+
+# **⬆️ N1 > N0** | <t:1700000000:f> (<t:1700000000:R>) | **Carrier Name (ABC-123)** | <@1234> | <@&5678>
+_ROUTE = re.compile(r'^\*\*\S+ (.+?) > (.+?)\*\*')
+_CARRIER_ID = re.compile(r'\((\w{3}-\w{3})\)\*\*')
+_TIMESTAMP = re.compile(r'^\s*<t:(\d+)')
+
+
+def create_departures(cursor):
+    """
+    Creates the departures table, its due time index and the marker for the one off history backfill.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS departures(
+            message_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            carrierid TEXT,
+            author_id INTEGER,
+            departure_location TEXT,
+            arrival_location TEXT,
+            departure_time INTEGER,
+            state TEXT NOT NULL DEFAULT 'scheduled',
+            posted_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS departures_due ON departures(state, departure_time)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS departure_backfill(completed_at DATETIME NOT NULL)')
+
+
+def create_route_subscriptions(cursor):
+    """
+    Creates the table of routes pilots want to be told about. A NULL arrival_system matches any arrival.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS route_subscriptions(
+            user_id INTEGER NOT NULL,
+            departure_system TEXT NOT NULL,
+            arrival_system TEXT,
+            UNIQUE(user_id, departure_system, arrival_system)
+        )
+    ''')
+
+
+def route_system(location):
+    """
+    :param str location: A departure or arrival location, such as N0 Planet 3.
+    :returns: The system it is in, such as N0.
+    :rtype: str
+    """
+    return location.split(' ')[0]
+
+
+def system_index(location):
+    """
+    :param str location: A departure or arrival location, such as N0 Planet 3 or Gali.
+    :returns: How far down the route the location is, N0 is 0.
+    :rtype: int
+    """
+    try:
+        return int(location.split(' ')[0][1:])
+    except ValueError:
+        return OUTER_SYSTEM_INDEX
+
+
+def departure_direction(departure_location, arrival_location):
+    """
+    :param str departure_location: Where the carrier leaves from.
+    :param str arrival_location: Where the carrier is going.
+    :returns: DIRECTION_UP or DIRECTION_DOWN, None if either end is not known or they are the same system.
+    :rtype: str | None
+    """
+    if not departure_location or not arrival_location:
+        return None
+    departure_index = system_index(departure_location)
+    arrival_index = system_index(arrival_location)
+    if departure_index == arrival_index:
+        return None
+    return DIRECTION_UP if departure_index > arrival_index else DIRECTION_DOWN
+
+
+def parse_departure_message(content, posted_at, thoon_text):
+    """
+    Reads a departure notice back into the fields the departures table keeps, for the history backfill.
+
+    :param str content: The notice text.
+    :param int posted_at: When the notice was posted, as a unix timestamp.
+    :param str thoon_text: How the thoon emoji renders in the notice.
+    :returns: The departure fields as Departure keyword arguments, anything that could not be read is None.
+    :rtype: dict
+    """
+    sections = content.split('|')
+
+    route = _ROUTE.match(content)
+    carrier_id = _CARRIER_ID.search(content)
+    try:
+        author_id = int(content.split('<@')[1].split('>')[0])
+    except (IndexError, ValueError):
+        author_id = None
+
+    departure_time = None
+    if len(sections) > 1:
+        timestamp = _TIMESTAMP.match(sections[1])
+        if timestamp:
+            departure_time = int(timestamp.group(1))
+        elif sections[1].strip() == thoon_text:
+            departure_time = posted_at + THOON_DEPARTURE_DELAY
+
+    return {
+        'carrier_id': carrier_id.group(1) if carrier_id else None,
+        'author_id': author_id,
+        'departure_location': route.group(1) if route else None,
+        'arrival_location': route.group(2) if route else None,
+        'departure_time': departure_time,
+    }
+
+
+class Departure:
+
+    def __init__(self, message_id, channel_id, carrier_id=None, author_id=None, departure_location=None,
+                 arrival_location=None, departure_time=None, state=DEPARTURE_SCHEDULED, posted_at=None):
+        """
+        A departure notice as indexed in the departures table.
+
+        :param int message_id: The notice's message ID.
+        :param int channel_id: The channel the notice is in.
+        :param str carrier_id: The departing carrier.
+        :param int author_id: Who posted the departure.
+        :param str departure_location: Where the carrier leaves from.
+        :param str arrival_location: Where the carrier is going.
+        :param int departure_time: When the owner is reminded, as a unix timestamp. None if it was never given.
+        :param str state: One of scheduled, notified, closed or removed.
+        :param int posted_at: When the notice was posted, as a unix timestamp.
+        """
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.carrier_id = carrier_id
+        self.author_id = author_id
+        self.departure_location = departure_location
+        self.arrival_location = arrival_location
+        self.departure_time = departure_time
+        self.state = state
+        self.posted_at = posted_at
+
+    @property
+    def direction(self):
+        """
+        :returns: DIRECTION_UP or DIRECTION_DOWN, None if the route is not known.
+        :rtype: str | None
+        """
+        return departure_direction(self.departure_location, self.arrival_location)
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        :param sqlite3.Row row: A departures row.
+        :rtype: Departure
+        """
+        row = dict(row)
+        return cls(
+            row['message_id'], row['channel_id'], row['carrierid'], row['author_id'], row['departure_location'],
+            row['arrival_location'], row['departure_time'], row['state'], row['posted_at'],
+        )
@@ -0,0 +1,148 @@
+"""
+Lifetime statistics per carrier across every archived cruise.
+
+carrier_lifetime holds one row per carrier ID with the totals over historical. Archiving a cruise adds that cruise's
+rows on top, so the table never needs rebuilding from historical. The current cruise is not archived yet, so lookups
+merge in the live boozecarriers row on demand.
+
+Depends on: nothing
+"""
+
+# The orderings /booze_leaderboard offers, each backed by an index.
+LEADERBOARD_COLUMNS = ('total_wine', 'total_runs', 'cruises')
+
+
+def create_carrier_lifetime(cursor):
+    """
+    Creates the carrier_lifetime table and its leaderboard indexes, then backfills it from historical.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS carrier_lifetime(
+            carrierid TEXT PRIMARY KEY,
+            carriername TEXT,
+            discordusername TEXT,
+            total_wine INT NOT NULL DEFAULT 0,
+            total_runs INT NOT NULL DEFAULT 0,
+            total_unloads INT NOT NULL DEFAULT 0,
+            cruises INT NOT NULL DEFAULT 0,
+            first_cruise DATE,
+            last_cruise DATE
+        )
+    ''')
+    for column in LEADERBOARD_COLUMNS:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS carrier_lifetime_{column} ON carrier_lifetime({column})')
+
+    cursor.execute('DELETE FROM carrier_lifetime')
+    carriers = add_cruise_to_lifetime(cursor)
+    if carriers:
+        print(f'Built lifetime statistics for {carriers} carriers.')
+
+
+def add_cruise_to_lifetime(cursor, holiday_start=None):
+    """
+    Adds an archived cruise to the lifetime totals. Only call this once per cruise, the totals are added on top of
+    whatever is already there.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :param str holiday_start: The cruise just archived, or None to add every cruise in historical.
+    :returns: The number of carriers updated.
+    :rtype: int
+    """
+    where = 'carrierid IS NOT NULL AND holiday_start IS NOT NULL'
+    params = ()
+    if holiday_start is not None:
+        where += ' AND holiday_start = (?)'
+        params = (holiday_start,)
+
+    # The names come from the carrier's latest cruise, carriers get renamed and change hands.
+    cursor.execute(
+        f'''
+        INSERT INTO carrier_lifetime (carrierid, carriername, discordusername, total_wine, total_runs, total_unloads,
+            cruises, first_cruise, last_cruise)
+        SELECT carrierid,
+            (SELECT latest.carriername FROM historical AS latest WHERE latest.carrierid = historical.carrierid
+                ORDER BY latest.holiday_start DESC LIMIT 1),
+            (SELECT latest.discordusername FROM historical AS latest WHERE latest.carrierid = historical.carrierid
+                ORDER BY latest.holiday_start DESC LIMIT 1),
+            SUM(COALESCE(winetotal, 0)), SUM(MAX(COALESCE(runtotal, 1), 1)), SUM(COALESCE(totalunloads, 0)),
+            COUNT(DISTINCT holiday_start), MIN(holiday_start), MAX(holiday_start)
+        FROM historical WHERE {where} GROUP BY carrierid
+        ON CONFLICT(carrierid) DO UPDATE SET
+            carriername = excluded.carriername,
+            discordusername = excluded.discordusername,
+            total_wine = total_wine + excluded.total_wine,
+            total_runs = total_runs + excluded.total_runs,
+            total_unloads = total_unloads + excluded.total_unloads,
+            cruises = cruises + excluded.cruises,
+            first_cruise = MIN(COALESCE(first_cruise, excluded.first_cruise), excluded.first_cruise),
+            last_cruise = MAX(COALESCE(last_cruise, excluded.last_cruise), excluded.last_cruise)
+        ''',
+        params,
+    )
+    return max(cursor.rowcount, 0)
+
+
+class CarrierLifetime:
+
+    def __init__(self, carrier_id, carrier_name=None, discord_username=None, total_wine=0, total_runs=0,
+                 total_unloads=0, cruises=0, first_cruise=None, last_cruise=None):
+        """
+        A carrier's totals over every cruise it took part in.
+
+        :param str carrier_id: The XXX-XXX carrier ID.
+        :param str carrier_name: The carrier's most recent name.
+        :param str discord_username: The carrier's most recent owner.
+        :param int total_wine: Tonnes of wine brought.
+        :param int total_runs: Runs made.
+        :param int total_unloads: Unloads completed.
+        :param int cruises: Cruises taken part in.
+        :param str first_cruise: holiday_start of the first cruise.
+        :param str last_cruise: holiday_start of the latest archived cruise.
+        """
+        self.carrier_id = carrier_id
+        self.carrier_name = carrier_name
+        self.discord_username = discord_username
+        self.total_wine = total_wine
+        self.total_runs = total_runs
+        self.total_unloads = total_unloads
+        self.cruises = cruises
+        self.first_cruise = first_cruise
+        self.last_cruise = last_cruise
+        self.on_current_cruise = False
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        :param sqlite3.Row row: A carrier_lifetime row.
+        :rtype: CarrierLifetime
+        """
+        row = dict(row)
+        return cls(
+            row['carrierid'], row['carriername'], row['discordusername'], row['total_wine'], row['total_runs'],
+            row['total_unloads'], row['cruises'], row['first_cruise'], row['last_cruise'],
+        )
+
+    def with_live(self, carrier):
+        """
+        Adds the carrier's row from the current cruise on top of the archived totals.
+
+        :param BoozeCarrier carrier: The carrier as it stands in boozecarriers.
+        :returns: A new CarrierLifetime including the current cruise.
+        :rtype: CarrierLifetime
+        """
+        merged = CarrierLifetime(
+            self.carrier_id,
+            carrier.carrier_name or self.carrier_name,
+            carrier.discord_username or self.discord_username,
+            self.total_wine + (carrier.wine_total or 0),
+            self.total_runs + (carrier.run_count or 1),
+            self.total_unloads + (carrier.total_unloads or 0),
+            self.cruises + 1,
+            self.first_cruise,
+            self.last_cruise,
+        )
+        merged.on_current_cruise = True
+        return merged
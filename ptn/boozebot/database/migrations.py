@@ -0,0 +1,204 @@
+"""
+Versioned schema migrations for the booze carriers database.
+
+Each migration is a numbered step. The highest applied number is kept in the schema_version table, and any pending
+steps are applied in order inside a single transaction. When the database is up to date, startup costs one query.
+
+To change the schema, append a new step to MIGRATIONS. Never edit or reorder a step that has shipped.
+
+Depends on: schema, cruise_stats, lifetime, reconcile, departures
+"""
+
+# import libraries
+import sqlite3
+
+# local modules
+from ptn.boozebot.database.cruise_stats import create_cruise_rollups, create_cruise_summary
+from ptn.boozebot.database.departures import create_departures, create_route_subscriptions
+from ptn.boozebot.database.lifetime import create_carrier_lifetime
+from ptn.boozebot.database.reconcile import add_sheet_hash_column
+from ptn.boozebot.database.schema import create_carrier_lookup_indexes, normalize_carrier_ids
+
+
+def _create_base_tables(cursor):
+    """
+    The tables as they were before migrations existed. Everything is IF NOT EXISTS so databases created by the old
+    startup checks pick up where they are.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS boozecarriers(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            carriername TEXT NOT NULL,
+            carrierid TEXT UNIQUE,
+            winetotal INT,
+            platform TEXT NOT NULL,
+            officialcarrier BOOLEAN,
+            discordusername TEXT NOT NULL,
+            timestamp DATETIME,
+            runtotal INT,
+            totalunloads INT,
+            discord_unload_in_progress INT,
+            user_timezone_in_utc TEXT
+        )
+    ''')
+
+    # Databases from before the timezone column was added need it bolting on.
+    cursor.execute('''PRAGMA table_info (boozecarriers)''')
+    # Column 1 of table_info is the column name.
+    if 'user_timezone_in_utc' not in [col[1] for col in cursor.fetchall()]:
+        print('Adding the user_timezone_in_utc field.')
+        cursor.execute('''ALTER TABLE boozecarriers ADD COLUMN user_timezone_in_utc TEXT''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS holidaystate(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            state BOOL,
+            timestamp DATETIME
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO holidaystate (state, timestamp)
+        SELECT 0, CURRENT_TIMESTAMP WHERE NOT EXISTS (SELECT 1 FROM holidaystate)
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historical(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            holiday_start DATE,
+            holiday_end DATE,
+            carriername TEXT NOT NULL,
+            carrierid TEXT,
+            winetotal INT,
+            platform TEXT NOT NULL,
+            officialcarrier BOOLEAN,
+            discordusername TEXT NOT NULL,
+            timestamp DATETIME,
+            runtotal INT,
+            totalunloads INT,
+            discord_unload_in_progress INT,
+            user_timezone_in_utc TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trackingforms(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            worksheet_key TEXT UNIQUE,
+            loader_input_form_url TEXT UNIQUE,
+            worksheet_with_data_id INT
+        )
+    ''')
+    # Some default values in the case we need to make the table. These will need to be set accordingly with
+    # /booze_configure_signup_forms.
+    cursor.execute('''
+        INSERT INTO trackingforms (worksheet_key, loader_input_form_url, worksheet_with_data_id)
+        SELECT '1Etk2sZRKKV7LsDVNJ60qrzJs3ZE8Wa99KTv7r6bwgIw', 'https://forms.gle/dWugae3M3i76NNVi7', 1
+        WHERE NOT EXISTS (SELECT 1 FROM trackingforms)
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sheetsyncstate(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            worksheet_key TEXT,
+            worksheet_with_data_id INT,
+            last_processed_row INT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pinned_messages(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_id TEXT UNIQUE,
+            channel_id TEXT UNIQUE
+        )
+    ''')
+
+
+def _carrier_lookup_indexes(cursor):
+    """
+    Normalized carrier IDs plus indexes for the exact match lookups.
+    """
+    normalized = normalize_carrier_ids(cursor)
+    if normalized:
+        print(f'Normalized {normalized} carrier IDs.')
+    create_carrier_lookup_indexes(cursor)
+
+
+# (version, description, step). Append only.
+MIGRATIONS = [
+    (1, 'Base tables', _create_base_tables),
+    (2, 'Carrier lookup indexes', _carrier_lookup_indexes),
+    (3, 'Cruise summary table and triggers', create_cruise_summary),
+    (4, 'Cruise rollups', create_cruise_rollups),
+    (5, 'Carrier lifetime statistics', create_carrier_lifetime),
+    (6, 'Sheet fingerprints on boozecarriers', add_sheet_hash_column),
+    (7, 'Departure index', create_departures),
+    (8, 'Route subscriptions', create_route_subscriptions),
+]
+
+
+def latest_version():
+    """
+    Returns the version the database ends up at once every migration is applied.
+
+    :returns: The version
+    :rtype: int
+    """
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(connection):
+    """
+    Returns the schema version of the database.
+
+    :param sqlite3.Connection connection: The database connection.
+    :returns: The version, 0 for a database that has never been migrated.
+    :rtype: int
+    """
+    try:
+        row = connection.execute('SELECT version FROM schema_version').fetchone()
+    except sqlite3.OperationalError as e:
+        if 'no such table' not in str(e):
+            raise
+        return 0
+    return row[0] if row else 0
+
+
+def run_migrations(connection, migrations=None):
+    """
+    Applies every pending migration in order, in a single transaction. If any step fails the whole run is rolled back
+    and the database stays at its previous version.
+
+    :param sqlite3.Connection connection: The writer connection. The caller holds the write lock.
+    :param list migrations: The migrations to apply, defaults to MIGRATIONS.
+    :returns: The versions that were applied.
+    :rtype: list[int]
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+
+    version = current_version(connection)
+    pending = [migration for migration in migrations if migration[0] > version]
+    if not pending:
+        return []
+
+    # Make sure nothing from before is half open, then take the transaction explicitly so the DDL is covered too.
+    connection.commit()
+    cursor = connection.cursor()
+    try:
+        cursor.execute('BEGIN')
+        for step_version, description, step in pending:
+            print(f'Applying database migration {step_version}: {description}')
+            step(cursor)
+
+        cursor.execute('CREATE TABLE IF NOT EXISTS schema_version(version INTEGER NOT NULL)')
+        cursor.execute('DELETE FROM schema_version')
+        cursor.execute('INSERT INTO schema_version (version) VALUES(?)', (pending[-1][0],))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return [migration[0] for migration in pending]
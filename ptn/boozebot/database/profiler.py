@@ -0,0 +1,301 @@
+"""
+Query profiler for the booze carriers database.
+
+Connections built from profiled_connection_factory hand out cursors that time every statement and count the rows it
+touched. The numbers are kept per statement in memory for /booze_db_stats and exported to prometheus, which the
+PrometheusCog already serves.
+
+Depends on: nothing
+"""
+
+# import libraries
+import bisect
+import contextvars
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+from prometheus_client import Counter as PrometheusCounter, Histogram
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+db_query_seconds = Histogram(
+    'boozebot_db_query_seconds',
+    'Time spent executing SQL statements, by statement.',
+    ['statement'],
+    buckets=LATENCY_BUCKETS,
+)
+db_query_rows = PrometheusCounter(
+    'boozebot_db_query_rows',
+    'Rows returned or modified by SQL statements, by statement.',
+    ['statement'],
+)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+)', re.IGNORECASE)
+
+# Frames from these files are skipped when working out who ran a statement.
+_SKIPPED_FILES = (os.path.normcase(__file__), os.path.normcase(os.path.join(os.path.dirname(__file__), 'database.py')),
+                  os.path.normcase(os.path.join(os.path.dirname(__file__), 'connections.py')))
+
+
+def normalise_statement(sql):
+    """
+    Reduces a SQL statement to its shape, so statements that only differ in their literals or in how many values an
+    IN list holds are counted together. Keeps the in-memory stats to one entry per statement in the code.
+
+    :param str sql: The SQL statement.
+    :returns: The statement with whitespace collapsed, literals as ? and IN lists as IN (...).
+    :rtype: str
+    """
+    statement = _STRING_LITERAL.sub('?', sql)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    return _IN_LIST.sub('IN (...)', statement)
+
+
+def statement_label(sql):
+    """
+    Reduces a SQL statement to its verb and first table, e.g. "SELECT boozecarriers". Used as the prometheus label so
+    the number of series stays bounded no matter how the statement is formatted.
+
+    :param str sql: The SQL statement.
+    :returns: The label.
+    :rtype: str
+    """
+    sql = sql.strip()
+    verb = sql.split(None, 1)[0].upper() if sql else ''
+    table = _TABLE.search(sql)
+    return f'{verb} {table.group(1)}' if table else verb
+
+
+class QueryStats:
+    __slots__ = ('statement', 'calls', 'total_seconds', 'max_seconds', 'rows', 'buckets', 'call_sites')
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.call_sites = Counter()
+
+    @property
+    def mean_seconds(self):
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+    def quantile_seconds(self, quantile):
+        """
+        Estimates a latency quantile from the histogram buckets, returning the upper bound of the bucket it falls in.
+
+        :param float quantile: The quantile, between 0 and 1.
+        :returns: The estimated latency in seconds.
+        :rtype: float
+        """
+        target = quantile * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max_seconds
+        return self.max_seconds
+
+
+class QueryProfiler:
+
+    def __init__(self, sample_rate=1.0):
+        """
+        Collects per statement timings.
+
+        :param float sample_rate: Fraction of statements to record, between 0 and 1. The rest run untimed.
+        """
+        self.sample_rate = sample_rate
+        self.stats = {}  # type: dict[str, QueryStats]
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def should_sample(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, sql, seconds, rows):
+        """
+        Records one statement execution.
+
+        :param str sql: The SQL statement.
+        :param float seconds: How long it took.
+        :param int rows: The rows returned or modified.
+        :returns: None
+        """
+        statement = normalise_statement(sql)
+        call_site = capture_call_site(2)
+        label = statement_label(statement)
+
+        with self._lock:
+            stats = self.stats.get(statement)
+            if stats is None:
+                stats = self.stats[statement] = QueryStats(statement)
+            stats.calls += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.rows += max(rows, 0)
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.call_sites[call_site] += 1
+
+        db_query_seconds.labels(label).observe(seconds)
+        if rows > 0:
+            db_query_rows.labels(label).inc(rows)
+
+    def add_rows(self, sql, seconds, rows):
+        """
+        Adds the time and rows spent fetching the results of an already recorded statement.
+
+        :param str sql: The SQL statement.
+        :param float seconds: How long the fetch took.
+        :param int rows: The rows fetched.
+        :returns: None
+        """
+        statement = normalise_statement(sql)
+        label = statement_label(statement)
+
+        with self._lock:
+            stats = self.stats.get(statement)
+            if stats is None:
+                return
+            stats.total_seconds += seconds
+            stats.rows += rows
+
+        if rows:
+            db_query_rows.labels(label).inc(rows)
+
+    def top(self, count=10, key='total_seconds'):
+        """
+        Returns the statements with the highest value of key.
+
+        :param int count: How many to return.
+        :param str key: The QueryStats attribute to sort on.
+        :returns: The statements, highest first.
+        :rtype: list[QueryStats]
+        """
+        with self._lock:
+            stats = list(self.stats.values())
+        return sorted(stats, key=lambda entry: getattr(entry, key), reverse=True)[:count]
+
+    def reset(self):
+        """
+        Clears the in-memory statistics. The prometheus series keep counting.
+
+        :returns: None
+        """
+        with self._lock:
+            self.stats = {}
+            self.started = time.time()
+
+
+# Set by run_blocking to the code that queued the work, since the executor thread's own stack ends at the executor.
+executor_call_site = contextvars.ContextVar('executor_call_site', default='unknown')
+
+
+def capture_call_site(depth=1):
+    """
+    Returns "file:line function" for the first frame above depth that is outside the database package plumbing.
+
+    :param int depth: How many frames above the caller to start from.
+    :returns: The call site.
+    :rtype: str
+    """
+    frame = sys._getframe(depth + 1)
+    while frame is not None and os.path.normcase(frame.f_code.co_filename) in _SKIPPED_FILES:
+        if frame.f_code.co_name == 'timed_call':
+            # We walked back to the executor entry point, so the real caller is on the event loop.
+            return executor_call_site.get()
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}'
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that reports every statement it runs to the profiler of its connection.
+    """
+
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        profiler = self.connection.profiler
+        if not profiler.should_sample():
+            self._sql = None
+            return super().execute(sql, parameters)
+
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._sql = sql
+            profiler.record(sql, time.perf_counter() - start, self.rowcount)
+
+    def executemany(self, sql, seq_of_parameters):
+        profiler = self.connection.profiler
+        if not profiler.should_sample():
+            self._sql = None
+            return super().executemany(sql, seq_of_parameters)
+
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._sql = None
+            profiler.record(sql, time.perf_counter() - start, self.rowcount)
+
+    def _timed_fetch(self, fetch, *args):
+        if self._sql is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        result = fetch(*args)
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        self.connection.profiler.add_rows(self._sql, time.perf_counter() - start, rows)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+def profiled_connection_factory(profiler):
+    """
+    Builds a sqlite3.Connection subclass whose cursors report to the given profiler. Pass it as the factory argument
+    of sqlite3.connect.
+
+    :param QueryProfiler profiler: The profiler to report to.
+    :returns: The connection class.
+    :rtype: type[sqlite3.Connection]
+    """
+
+    class ProfiledConnection(sqlite3.Connection):
+
+        def cursor(self, factory=ProfiledCursor):
+            return super().cursor(factory)
+
+        # Connection.execute does not go through cursor(), so route the shortcuts through it explicitly.
+        def execute(self, sql, parameters=()):
+            return self.cursor().execute(sql, parameters)
+
+        def executemany(self, sql, seq_of_parameters):
+            return self.cursor().executemany(sql, seq_of_parameters)
+
+    ProfiledConnection.profiler = profiler
+    return ProfiledConnection
@@ -0,0 +1,266 @@
+"""
+Set based reconciliation of the GoogleSheets signup records against the boozecarriers table.
+
+Every boozecarriers row stores a fingerprint of the sheet fields it was written from in sheet_hash. A sync compares
+fingerprints only, so carriers whose sheet data did not change are skipped without being loaded or compared.
+
+Depends on: BoozeCarrier
+"""
+
+# import libraries
+import hashlib
+
+# local classes
+from ptn.boozebot.classes.BoozeCarrier import BoozeCarrier
+
+
+def aggregate_sheet_records(records_data):
+    """
+    Aggregates the raw form responses into a single BoozeCarrier per carrier ID. Every extra response for the same
+    carrier counts as another trip to the peak.
+
+    :param list[dict] records_data: The records as returned from the sheet.
+    :returns: A dict of carrier ID to the aggregated carrier object.
+    :rtype: dict[str, BoozeCarrier]
+    :raises ValueError: If a record holds an invalid carrier ID.
+    """
+    all_carriers_data = {}  # type: dict[str, BoozeCarrier]
+
+    for record in records_data:
+        carrier_data = BoozeCarrier.from_sheet_record(record)
+
+        # Check if there is already a object for this carrier and update it if so
+        if carrier_data.carrier_identifier in all_carriers_data:
+            all_carriers_data[carrier_data.carrier_identifier].wine_total += carrier_data.wine_total
+            all_carriers_data[carrier_data.carrier_identifier].run_count += 1
+        else:
+            all_carriers_data[carrier_data.carrier_identifier] = carrier_data
+
+    return all_carriers_data
+
+
+def merge_sheet_records(all_carriers_data, records_data):
+    """
+    Folds newly appended form responses into an existing aggregate, using the same rules as
+    aggregate_sheet_records.
+
+    :param dict[str, BoozeCarrier] all_carriers_data: The aggregate to update in place.
+    :param list[dict] records_data: The new records from the sheet.
+    :returns: The carrier IDs touched by the new records.
+    :rtype: set[str]
+    :raises ValueError: If a record holds an invalid carrier ID.
+    """
+    new_carriers = aggregate_sheet_records(records_data)
+
+    for carrier_id, carrier_data in new_carriers.items():
+        if carrier_id in all_carriers_data:
+            all_carriers_data[carrier_id].wine_total += carrier_data.wine_total
+            all_carriers_data[carrier_id].run_count += carrier_data.run_count
+        else:
+            all_carriers_data[carrier_id] = carrier_data
+
+    return set(new_carriers)
+
+
+def carrier_fingerprint(carrier):
+    """
+    Returns a short hash of the sheet fields the sync writes for a carrier.
+
+    :param BoozeCarrier carrier: The aggregated carrier, or one read back from the database.
+    :returns: The fingerprint as hex.
+    :rtype: str
+    """
+    values = (
+        carrier.carrier_identifier,
+        carrier.carrier_name,
+        carrier.wine_total,
+        carrier.discord_username,
+        carrier.timestamp,
+        carrier.run_count,
+    )
+    return hashlib.blake2b(repr(values).encode(), digest_size=8).hexdigest()
+
+
+def add_sheet_hash_column(cursor):
+    """
+    Adds boozecarriers.sheet_hash and fills it in for the carriers already there.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    cursor.execute('''PRAGMA table_info (boozecarriers)''')
+    if 'sheet_hash' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute('''ALTER TABLE boozecarriers ADD COLUMN sheet_hash TEXT''')
+
+    cursor.execute('''SELECT * FROM boozecarriers''')
+    columns = [description[0] for description in cursor.description]
+    fingerprints = []
+    for values in cursor.fetchall():
+        row = dict(zip(columns, values))
+        try:
+            fingerprints.append((carrier_fingerprint(BoozeCarrier(row)), row['entry']))
+        except ValueError:
+            # Left NULL, the next sync rewrites the row and sets it.
+            continue
+    cursor.executemany('''UPDATE boozecarriers SET sheet_hash = ? WHERE entry = ?''', fingerprints)
+
+
+def load_sheet_sync_state(connection):
+    """
+    Returns the persisted position of the incremental sheet sync.
+
+    :param sqlite3.Connection | sqlite3.Cursor connection: The database connection or a cursor on it.
+    :returns: The worksheet key, worksheet ID and last processed sheet row, or None if no sync has run yet.
+    :rtype: dict | None
+    """
+    state = connection.execute("SELECT * FROM sheetsyncstate LIMIT 1").fetchone()
+    return dict(state) if state else None
+
+
+def reconcile_carriers(connection, lock, sheet_carriers, only_ids=None, sync_state=None):
+    """
+    Diffs the aggregated sheet carriers against the boozecarriers table in a single pass and writes every insert and
+    update in one transaction.
+
+    Only the carrier IDs and fingerprints are read, and only carriers whose fingerprint changed are written, so the
+    work beyond hashing is proportional to the changes. An incremental sync passes the carrier IDs touched by the new
+    rows as only_ids, in which case only those rows are read and nothing is flagged as missing from the sheet.
+
+    :param sqlite3.Connection connection: The database connection to write with.
+    :param threading.Lock lock: The lock guarding writes on the connection. It is held for the whole diff so the
+        rows read cannot change under us before the writes land.
+    :param dict[str, BoozeCarrier] sheet_carriers: The aggregated carriers from the sheet, keyed by carrier ID.
+    :param set[str] only_ids: Restrict the diff to these carrier IDs.
+    :param tuple sync_state: The (worksheet key, worksheet ID, last processed row) to persist in the same
+        transaction, so the recorded sheet position never runs ahead of the carrier data.
+    :returns: The reconciliation result. The new carriers are returned as BoozeCarrier objects so the caller can
+        announce them.
+    :rtype: dict
+    """
+    with lock:
+        result = _reconcile_carriers(connection, sheet_carriers, only_ids, sync_state)
+
+    print(
+        f"Reconciled {result['total_carriers']} carriers: {result['added_count']} added, "
+        f"{result['updated_count']} updated, {result['unchanged_count']} unchanged "
+        f"({result['skipped_count']} skipped on a matching fingerprint), "
+        f"{len(result['invalid_database_entries'])} no longer in the sheet."
+    )
+    return result
+
+
+def _reconcile_carriers(connection, sheet_carriers, only_ids, sync_state):
+    cursor = connection.cursor()
+    if only_ids is None:
+        cursor.execute("SELECT entry, carrierid, sheet_hash FROM boozecarriers")
+    else:
+        only_ids = list(only_ids)
+        cursor.execute(
+            "SELECT entry, carrierid, sheet_hash FROM boozecarriers WHERE carrierid IN ({})".format(
+                ", ".join("?" * len(only_ids))
+            ),
+            only_ids,
+        )
+    database_fingerprints = {carrier_id: (entry, sheet_hash) for entry, carrier_id, sheet_hash in cursor.fetchall()}
+
+    inserts = []
+    updates = []
+    new_carriers = []
+    skipped_count = 0
+
+    for carrier_id in sheet_carriers if only_ids is None else only_ids:
+        carrier_data = sheet_carriers[carrier_id]
+        fingerprint = carrier_fingerprint(carrier_data)
+        existing = database_fingerprints.get(carrier_id)
+
+        if existing is None:
+            new_carriers.append(carrier_data)
+            inserts.append(
+                (
+                    carrier_data.carrier_name,
+                    carrier_data.carrier_identifier,
+                    carrier_data.wine_total,
+                    carrier_data.platform,
+                    carrier_data.ptn_carrier,
+                    carrier_data.discord_username,
+                    carrier_data.timestamp,
+                    carrier_data.run_count,
+                    carrier_data.total_unloads,
+                    carrier_data.timezone,
+                    fingerprint,
+                )
+            )
+        elif existing[1] != fingerprint:
+            updates.append(
+                (
+                    carrier_data.carrier_name,
+                    carrier_data.wine_total,
+                    carrier_data.discord_username,
+                    carrier_data.timestamp,
+                    carrier_data.run_count,
+                    fingerprint,
+                    existing[0],
+                )
+            )
+        else:
+            skipped_count += 1
+
+    unchanged_count = len(sheet_carriers) - len(inserts) - len(updates)
+
+    # Anything left in the database that the sheet no longer knows about needs flagging to the sommeliers. Only these
+    # rows are read in full.
+    missing_ids = [carrier_id for carrier_id in database_fingerprints if carrier_id not in sheet_carriers]
+    invalid_database_entries = []
+    if missing_ids:
+        cursor.execute(
+            "SELECT * FROM boozecarriers WHERE carrierid IN ({})".format(", ".join("?" * len(missing_ids))),
+            missing_ids,
+        )
+        columns = [description[0] for description in cursor.description]
+        invalid_database_entries = [BoozeCarrier(dict(zip(columns, row))) for row in cursor.fetchall()]
+
+    updated_db = bool(inserts or updates)
+    if updated_db or sync_state:
+        try:
+            if inserts:
+                cursor.executemany(
+                    """
+                    INSERT INTO boozecarriers (carriername, carrierid, winetotal, platform, officialcarrier,
+                    discordusername, timestamp, runtotal, totalunloads, user_timezone_in_utc, sheet_hash)
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    inserts,
+                )
+            if updates:
+                cursor.executemany(
+                    """
+                    UPDATE boozecarriers
+                    SET carriername=?, winetotal=?, discordusername=?, timestamp=?, runtotal=?, sheet_hash=?
+                    WHERE entry=?
+                    """,
+                    updates,
+                )
+            if sync_state:
+                cursor.execute("DELETE FROM sheetsyncstate")
+                cursor.execute(
+                    """
+                    INSERT INTO sheetsyncstate (worksheet_key, worksheet_with_data_id, last_processed_row)
+                    VALUES(?, ?, ?)
+                    """,
+                    sync_state,
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    return {
+        "updated_db": updated_db,
+        "added_count": len(inserts),
+        "updated_count": len(updates),
+        "unchanged_count": unchanged_count,
+        "skipped_count": skipped_count,
+        "total_carriers": len(sheet_carriers),
+        "invalid_database_entries": invalid_database_entries,
+        "new_carriers": new_carriers,
+    }
@@ -0,0 +1,56 @@
+"""
+Schema helpers shared by the migrations and the benchmarks.
+
+Depends on: nothing
+"""
+
+# Carrier IDs are stored upper case and trimmed, so every lookup can be an exact match that uses these indexes.
+# boozecarriers.carrierid is UNIQUE and already has its automatic index.
+CARRIER_LOOKUP_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS historical_carrierid ON historical(carrierid)',
+    'CREATE INDEX IF NOT EXISTS historical_holiday_start ON historical(holiday_start)',
+)
+
+
+def normalize_carrier_id(carrier_id):
+    """
+    Returns the stored form of a carrier ID.
+
+    :param str carrier_id: The carrier ID as typed or entered in the form.
+    :returns: The ID upper cased with surrounding whitespace removed.
+    :rtype: str
+    """
+    return str(carrier_id).strip().upper()
+
+
+def normalize_carrier_ids(cursor):
+    """
+    Rewrites any carrier IDs that are not yet upper case and trimmed. Rows that are already normalized are left alone,
+    so this is cheap to run on every startup. A row whose normalized ID would collide with an existing carrier is
+    skipped rather than failing the startup.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: The number of rows rewritten.
+    :rtype: int
+    """
+    changed = 0
+    for table in ('boozecarriers', 'historical'):
+        cursor.execute(
+            f'''
+            UPDATE OR IGNORE {table} SET carrierid = UPPER(TRIM(carrierid))
+            WHERE carrierid IS NOT NULL AND carrierid != UPPER(TRIM(carrierid))
+            '''
+        )
+        changed += max(cursor.rowcount, 0)
+    return changed
+
+
+def create_carrier_lookup_indexes(cursor):
+    """
+    Creates the indexes the carrier lookups rely on.
+
+    :param sqlite3.Cursor cursor: A cursor on the writer connection.
+    :returns: None
+    """
+    for statement in CARRIER_LOOKUP_INDEXES:
+        cursor.execute(statement)
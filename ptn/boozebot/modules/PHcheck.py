@@ -1,65 +1,353 @@
 # Checking for a public holiday at Rackham's (HIP 58832)
 # Returns True or False based on whether or not Rackham's is in public holiday
 # Rackham Capital Investments is the faction controlling Rackham's Peak
+#
+# The checks go through holiday_state, which keeps one pooled HTTP client for the life of the bot and caches the last
+# answer. public_holiday_loop refreshes it, commands answer from the cache.
+#
+# EBGS is asked first. If it has not answered within the hedge delay EDSM is asked as well and the first answer wins,
+# so a slow EBGS costs a second rather than the whole timeout. A source that keeps failing is skipped for a while.
+
+import asyncio
+import functools
+import json
+import re
+import time
 
 import httpx
-from json import JSONDecodeError
-
-async def get_state_from_ebgs() -> bool:
-    ebgs_params = {
-        'name': 'Rackham Capital Investments'
-    }
-    async with httpx.AsyncClient() as client:
-        r = await client.get('https://elitebgs.app/api/ebgs/v5/factions', params=ebgs_params, timeout=5)
-        r.raise_for_status()
-        result = r.json()
-        
-    # Search each element in the result
-    for element in result['docs']:
-        # Search each system in which the faction is present
-        for system in element['faction_presence']:
-            # If there are no active states in the system, skip to the next system
-            if not system['active_states']:
+from prometheus_client import Counter, Gauge, Histogram
+
+from ptn.boozebot.constants import get_holiday_check_ttl, get_holiday_hedge_delay
+from ptn.boozebot.modules.ratelimit import CircuitBreaker
+
+holiday_checks = Counter(
+    'boozebot_holiday_checks',
+    'Public holiday checks, by whether they were answered from the cache, joined a check in flight or went out.',
+    ['result'],
+)
+holiday_source_seconds = Histogram(
+    'boozebot_holiday_source_seconds',
+    'Time taken by requests to the holiday state sources, by source.',
+    ['source'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10),
+)
+holiday_source_requests = Counter(
+    'boozebot_holiday_source_requests',
+    'Requests to the holiday state sources, by source and outcome.',
+    ['source', 'outcome'],
+)
+holiday_source_circuit_open = Gauge(
+    'boozebot_holiday_source_circuit_open',
+    '1 while a holiday state source is being skipped after repeated failures.',
+    ['source'],
+)
+
+
+EBGS_URL = 'https://elitebgs.app/api/ebgs/v5/factions'
+EDSM_URL = 'https://www.edsm.net/api-v1/system'
+
+RACKHAMS_SYSTEM = 'hip 58832'
+
+_decoder = json.JSONDecoder()
+
+
+@functools.lru_cache(maxsize=8)
+def _system_marker(system_name_lower):
+    return re.compile(r'"system_name_lower"\s*:\s*' + re.escape(json.dumps(system_name_lower)))
+
+
+def find_system_presence(text, system_name_lower):
+    """
+    Finds one system in the faction_presence lists of an EBGS factions response without decoding the document.
+
+    The system's name is searched for in the raw text, then the entry around it is the nearest opening brace before
+    it that decodes to an entry for that system. Only that entry, and any small objects it holds ahead of the name,
+    ever gets decoded.
+
+    :param str text: The response body.
+    :param str system_name_lower: The system's name in lower case.
+    :returns: The faction_presence entry, or None if the faction is not in the system.
+    :rtype: dict | None
+    """
+    for match in _system_marker(system_name_lower).finditer(text):
+        start = match.start()
+        while start > 0:
+            start = text.rfind('{', 0, start)
+            if start < 0:
+                break
+            try:
+                candidate, end = _decoder.raw_decode(text, start)
+            except ValueError:
+                # A brace inside a string, or one that does not open a complete object.
                 continue
-            # If there is an active state, look through the active states for a public holiday
-            else:
-                for active_states in system['active_states']:
-                    # If the system is in public holiday, return True
-                    if active_states['state'] == 'publicholiday':
-                        print('PH state matched from ebgs')
-                        return True
+            if end > match.start() and isinstance(candidate, dict) \
+                    and candidate.get('system_name_lower') == system_name_lower:
+                return candidate
+    return None
+
+
+def parse_ebgs_response(text) -> bool:
+    """
+    Only Rackham's Peak matters, so only the HIP 58832 entry of the faction's presence is looked at.
+
+    :param str text: The response body.
+    :returns: True if HIP 58832 is in public holiday.
+    :rtype: bool
+    """
+    presence = find_system_presence(text, RACKHAMS_SYSTEM)
+    if presence is None:
+        if '"docs"' not in text:
+            raise ValueError('Not an EBGS factions response')
+        return False
+
+    for active_state in presence['active_states']:
+        # If the system is in public holiday, return True
+        if active_state['state'] == 'publicholiday':
+            return True
     return False
 
 
-async def get_state_from_edsm() -> bool:
-    async with httpx.AsyncClient() as client:
-        r = await client.get('https://www.edsm.net/api-v1/system?systemName=HIP%2058832&showInformation=1', timeout=5)
-        r.raise_for_status()
-        result = r.json()
-    
+def parse_edsm_response(text) -> bool:
+    """
+    :param str text: The response body.
+    :returns: True if HIP 58832 is in public holiday.
+    :rtype: bool
+    """
+    result = json.loads(text)
     if result.get('information', {}).get('factionState') == 'Public Holiday':
-        print('PH state matched from edsm')
         return True
     return False
 
 
-async def ph_check() -> bool:
+class HolidaySource:
+
+    def __init__(self, name, url, params, parse, breaker=None):
+        """
+        One of the APIs that knows Rackham's state.
+
+        :param str name: The name metrics and logs use.
+        :param str url: The endpoint.
+        :param dict params: The query string.
+        :param callable parse: Turns the response body into True or False.
+        :param CircuitBreaker breaker: Skips the source while it keeps failing.
+        """
+        self.name = name
+        self.url = url
+        self.params = params
+        self.parse = parse
+        self.breaker = breaker or CircuitBreaker(failure_threshold=3, reset_timeout=300)
+
+    async def query(self, client: httpx.AsyncClient) -> bool:
+        """
+        :param httpx.AsyncClient client: The client to make the request with.
+        :returns: Whether the holiday is on.
+        :rtype: bool
+        :raises httpx.HTTPError: If the request failed.
+        :raises ValueError: If the response was not the JSON expected.
+        """
+        started_at = time.perf_counter()
+        try:
+            r = await client.get(self.url, params=self.params)
+            r.raise_for_status()
+            state = self.parse(r.text)
+        except asyncio.CancelledError:
+            # Lost the race to the other source, that says nothing about this one.
+            self.breaker.record_abandoned()
+            holiday_source_requests.labels(self.name, 'abandoned').inc()
+            raise
+        except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError) as exc:
+            self.breaker.record_failure()
+            holiday_source_requests.labels(self.name, 'error').inc()
+            holiday_source_circuit_open.labels(self.name).set(int(self.breaker.is_open))
+            print(f'Problem while getting the state from {self.name}: {exc!r}')
+            if isinstance(exc, (KeyError, TypeError, AttributeError)):
+                raise ValueError(f'Unexpected response from {self.name}') from exc
+            raise
+        finally:
+            holiday_source_seconds.labels(self.name).observe(time.perf_counter() - started_at)
+
+        self.breaker.record_success()
+        holiday_source_requests.labels(self.name, 'ok').inc()
+        holiday_source_circuit_open.labels(self.name).set(0)
+        if state:
+            print(f'PH state matched from {self.name}')
+        return state
+
+
+def default_sources():
+    """
+    :returns: EBGS first, EDSM as the hedge.
+    :rtype: list[HolidaySource]
+    """
+    return [
+        HolidaySource('ebgs', EBGS_URL, {'name': 'Rackham Capital Investments'}, parse_ebgs_response),
+        HolidaySource('edsm', EDSM_URL, {'systemName': 'HIP 58832', 'showInformation': 1}, parse_edsm_response),
+    ]
+
+
+async def query_sources(sources, client: httpx.AsyncClient, hedge_delay=None):
+    """
+    Asks the sources in order and returns the first answer.
+
+    With a hedge_delay, the next source is asked as soon as the current one has been out that long without answering,
+    and whichever answers first wins. Without one, the next source is only asked once the current one fails. Either
+    way a failure moves straight on to the next source, and sources whose circuit is open are skipped.
+
+    :param list[HolidaySource] sources: The sources in order of preference.
+    :param httpx.AsyncClient client: The client to make the requests with.
+    :param float hedge_delay: Seconds to wait on a source before also asking the next, None to never hedge.
+    :returns: Whether the holiday is on, or None if no source answered.
+    :rtype: bool | None
+    """
+    remaining = list(sources)
+    started = []
+    pending = set()
+
+    def ask_next():
+        # The breaker is only asked about a source that is about to be sent, so a trial call it allows is always made
+        # and always reported on.
+        while remaining:
+            source = remaining.pop(0)
+            if source.breaker.allow():
+                task = asyncio.create_task(source.query(client))
+                started.append(task)
+                pending.add(task)
+                return
+            holiday_source_requests.labels(source.name, 'skipped').inc()
+
     try:
-        if await get_state_from_ebgs():
-            return True
-    except (httpx.HTTPError, JSONDecodeError) as exc:
-        print('Problem while getting the state from ebgs.')
-        print(f"HTTP Exception for {exc.request.url} - {exc}")
-        print("Attempting to get the state from the edsm.")
-        
+        while True:
+            if not pending:
+                ask_next()
+                if not pending:
+                    return None
+
+            timeout = hedge_delay if remaining and hedge_delay is not None else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                ask_next()
+                continue
+
+            pending -= done
+            # Prefer the earlier source if two finished together.
+            for task in started:
+                if task in done and task.exception() is None:
+                    return task.result()
+            if remaining:
+                ask_next()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+class HolidayStateService:
+
+    def __init__(self, ttl=900, timeout=5, hedge_delay=1.0, sources=None, clock=time.monotonic):
+        """
+        Holds the holiday state for Rackham's. One HTTP client is kept open so the checks reuse their connections,
+        the last answer is cached for ttl seconds, and checks made while one is already out wait on that one rather
+        than sending their own.
+
+        :param float ttl: Seconds a cached answer is served for.
+        :param float timeout: Seconds before a request to EBGS or EDSM is given up on.
+        :param float hedge_delay: Seconds to wait on a source before also asking the next, None to only fall back on
+            failure.
+        :param list[HolidaySource] sources: The sources in order of preference, defaults to EBGS then EDSM.
+        :param callable clock: Monotonic time source, swappable for tests.
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.sources = sources if sources is not None else default_sources()
+        self.clock = clock
+        self._client = None  # type: httpx.AsyncClient | None
+        self._state = None  # type: bool | None
+        self._checked_at = None
+        self._in_flight = None  # type: asyncio.Task | None
+
+    def _get_client(self):
+        # Made on first use so it belongs to the bot's event loop.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+            )
+        return self._client
+
+    @property
+    def age(self):
+        """
+        :returns: Seconds since a source last answered, or None if none has yet.
+        :rtype: float | None
+        """
+        if self._checked_at is None:
+            return None
+        return self.clock() - self._checked_at
+
+    async def check(self, max_age=None):
+        """
+        Returns whether Rackham's is in public holiday.
+
+        :param float max_age: How old a cached answer may be, defaults to the ttl. 0 always asks the sources, though
+            it still shares a check that is already out.
+        :returns: True if the holiday is on. If neither source answers, the last known state, or False if there is
+            none, so an outage does not end a holiday early.
+        :rtype: bool
+        """
+        if max_age is None:
+            max_age = self.ttl
+
+        age = self.age
+        if age is not None and age <= max_age:
+            holiday_checks.labels('hit').inc()
+            return self._state
+
+        if self._in_flight is None:
+            holiday_checks.labels('miss').inc()
+            self._in_flight = asyncio.create_task(self._refresh())
+        else:
+            holiday_checks.labels('joined').inc()
+        # Shielded so one caller giving up does not cancel the check for the others.
+        return await asyncio.shield(self._in_flight)
+
+    async def _refresh(self):
         try:
-            if await get_state_from_edsm():
-                return True
-        except (httpx.HTTPError, JSONDecodeError) as exc:
-            print('Problem while getting the state from edsm.')
-            print(f"HTTP Exception for {exc.request.url} - {exc}")
-            print(exc)
-
-    # Return false if there are no public holiday hits
-    print('PH was not hit - Returning False.')
-    return False
\ No newline at end of file
+            state = await query_sources(self.sources, self._get_client(), self.hedge_delay)
+            if state is None:
+                print(f'No source answered, keeping the last known holiday state: {bool(self._state)}.')
+                return bool(self._state)
+            self._state = state
+            self._checked_at = self.clock()
+            return state
+        finally:
+            self._in_flight = None
+
+    async def close(self):
+        """
+        Closes the HTTP client.
+
+        :returns: None
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+holiday_state = HolidayStateService(ttl=get_holiday_check_ttl(), hedge_delay=get_holiday_hedge_delay())
+
+
+async def ph_check(max_age=None) -> bool:
+    """
+    Checks whether Rackham's is in public holiday, see HolidayStateService.check.
+
+    :param float max_age: How old a cached answer may be, defaults to PTN_BOOZEBOT_HOLIDAY_CHECK_TTL.
+    :returns: True if the holiday is on.
+    :rtype: bool
+    """
+    state = await holiday_state.check(max_age)
+    if not state:
+        # Return false if there are no public holiday hits
+        print('PH was not hit - Returning False.')
+    return state
@@ -0,0 +1,153 @@
+"""
+Fires a callback at a wall clock time per key, without polling.
+
+Pending deadlines sit in a min-heap. The scheduler task sleeps until the earliest one, or until something earlier is
+added, so callbacks run on time rather than on the next tick of a loop. Adding and rescheduling are a heap push.
+Cancelling only marks the entry, and marked entries are thrown away when they reach the top, so every operation stays
+O(log n).
+
+Depends on: nothing
+"""
+
+# import libraries
+import asyncio
+import heapq
+import itertools
+import time
+
+from prometheus_client import Gauge, Histogram
+
+scheduler_lag_seconds = Histogram(
+    'boozebot_scheduler_lag_seconds',
+    'How long after its deadline a scheduled callback started, by scheduler.',
+    ['scheduler'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+scheduler_pending = Gauge(
+    'boozebot_scheduler_pending',
+    'Deadlines waiting to fire, by scheduler.',
+    ['scheduler'],
+)
+
+# Pending callbacks are started this long before they are due to make up for the loop waking slightly late.
+_EARLY_WAKE = 0.001
+
+
+class DeadlineScheduler:
+
+    def __init__(self, name, callback, clock=time.time):
+        """
+        :param str name: The name metrics and logs use.
+        :param callable callback: Coroutine function called with the key once its deadline passes.
+        :param callable clock: Wall clock time source, swappable for tests.
+        """
+        self.name = name
+        self.callback = callback
+        self.clock = clock
+        self._heap = []
+        self._entries = {}  # key -> [deadline, sequence, key, active]
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def next_deadline(self):
+        """
+        :returns: The earliest pending deadline as a unix timestamp, or None if nothing is pending.
+        :rtype: float | None
+        """
+        self._discard_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def schedule(self, key, deadline):
+        """
+        Sets when the callback runs for key, replacing any deadline it already had.
+
+        :param key: Anything hashable that identifies the deadline.
+        :param float deadline: When to run, as a unix timestamp. A time already passed runs straight away.
+        :returns: None
+        """
+        self.cancel(key)
+        entry = [deadline, next(self._sequence), key, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        scheduler_pending.labels(self.name).set(len(self._entries))
+        if self._heap[0] is entry:
+            # Earlier than whatever the task is sleeping towards.
+            self._wakeup.set()
+
+    def cancel(self, key):
+        """
+        Drops the deadline for key, if it has one.
+
+        :param key: The key it was scheduled under.
+        :returns: True if a deadline was dropped.
+        :rtype: bool
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[-1] = False
+        scheduler_pending.labels(self.name).set(len(self._entries))
+        return True
+
+    def _discard_cancelled(self):
+        while self._heap and not self._heap[0][-1]:
+            heapq.heappop(self._heap)
+
+    def is_running(self):
+        """
+        :returns: True while the scheduler task is running and has not been asked to stop.
+        :rtype: bool
+        """
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self):
+        """
+        Starts the scheduler task on the running loop.
+
+        :returns: None
+        """
+        # A task still finishing its last callback just carries on.
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """
+        Stops the scheduler task. A callback already running is left to finish. Pending deadlines are kept and fire
+        once it is started again.
+
+        :returns: None
+        """
+        self._stopping = True
+        self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            deadline = self.next_deadline
+            delay = None if deadline is None else deadline - self.clock()
+
+            if delay is None or delay > _EARLY_WAKE:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key, _ = heapq.heappop(self._heap)
+            del self._entries[key]
+            scheduler_pending.labels(self.name).set(len(self._entries))
+            scheduler_lag_seconds.labels(self.name).observe(max(0.0, self.clock() - deadline))
+            try:
+                await self.callback(key)
+            except Exception as e:
+                print(f'{self.name} callback failed for {key}: {e}')
@@ -0,0 +1,171 @@
+"""
+The departure board, a pinned summary of the upcoming departures in each direction.
+
+The departures on each board are kept sorted by time, so adding or dropping one is a bisect. The text of a board is
+only rendered when it is published. Changes mark the board dirty and one flush task publishes every dirty board,
+at most once per edit interval. However many departures are posted or ticked off in between, Discord sees one edit
+per board.
+
+Depends on: nothing
+"""
+
+# import libraries
+import asyncio
+import bisect
+import time
+
+from prometheus_client import Counter
+
+from ptn.boozebot.database.departures import DIRECTION_DOWN, DIRECTION_UP
+
+departure_board_changes = Counter(
+    'boozebot_departure_board_changes',
+    'Departures added to or dropped from the departure board.',
+)
+departure_board_edits = Counter(
+    'boozebot_departure_board_edits',
+    'Departure board publishes, by direction.',
+    ['direction'],
+)
+
+BOARD_TITLES = {
+    DIRECTION_UP: '⬆️ Upcoming departures towards N0',
+    DIRECTION_DOWN: '⬇️ Upcoming departures away from N0',
+}
+
+
+class DepartureBoard:
+
+    def __init__(self, publish, guild_id, edit_interval=5.0, max_entries=20, clock=time.monotonic):
+        """
+        :param callable publish: Coroutine called with the direction and the board's text, puts it in Discord.
+        :param int guild_id: The guild the departure notices are in, for the links to them.
+        :param float edit_interval: Shortest gap, in seconds, between two publishes.
+        :param int max_entries: Most departures listed on one board, the rest are counted.
+        :param callable clock: Monotonic time source, swappable for tests.
+        """
+        self.publish = publish
+        self.guild_id = guild_id
+        self.edit_interval = edit_interval
+        self.max_entries = max_entries
+        self.clock = clock
+        self._boards = {DIRECTION_UP: [], DIRECTION_DOWN: []}  # direction -> sorted [(departure_time, message_id)]
+        self._departures = {}  # message_id -> Departure
+        self._dirty = set()
+        self._last_publish = None
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self._departures)
+
+    def __contains__(self, message_id):
+        return message_id in self._departures
+
+    def entries(self, direction):
+        """
+        :param str direction: DIRECTION_UP or DIRECTION_DOWN.
+        :returns: The departures on that board, soonest first.
+        :rtype: list[Departure]
+        """
+        return [self._departures[message_id] for _, message_id in self._boards[direction]]
+
+    def add(self, departure):
+        """
+        Puts a departure on the board for its direction, replacing it if it is already there. Departures without a
+        time or a known route are left off.
+
+        :param Departure departure: The departure.
+        :returns: None
+        """
+        direction = departure.direction
+        if direction is None or departure.departure_time is None:
+            return
+        self.remove(departure.message_id)
+        bisect.insort(self._boards[direction], (departure.departure_time, departure.message_id))
+        self._departures[departure.message_id] = departure
+        self._changed(direction)
+
+    def remove(self, message_id):
+        """
+        Drops a departure off the board, if it is on it.
+
+        :param int message_id: The departure's message ID.
+        :returns: None
+        """
+        departure = self._departures.pop(message_id, None)
+        if departure is None:
+            return
+        board = self._boards[departure.direction]
+        del board[bisect.bisect_left(board, (departure.departure_time, message_id))]
+        self._changed(departure.direction)
+
+    def render(self, direction):
+        """
+        :param str direction: DIRECTION_UP or DIRECTION_DOWN.
+        :returns: The board's text.
+        :rtype: str
+        """
+        departures = self.entries(direction)
+        if not departures:
+            return 'No departures posted.'
+
+        lines = [
+            f'<t:{departure.departure_time}:R> **{departure.departure_location} > {departure.arrival_location}** '
+            f'{departure.carrier_id or ""} '
+            f'https://discord.com/channels/{self.guild_id}/{departure.channel_id}/{departure.message_id}'
+            for departure in departures[:self.max_entries]
+        ]
+        if len(departures) > self.max_entries:
+            lines.append(f'... and {len(departures) - self.max_entries} more.')
+        return '\n'.join(lines)
+
+    def refresh(self):
+        """
+        Marks both boards for publishing, used on startup to put whatever is in Discord in step.
+
+        :returns: None
+        """
+        self._dirty.update(self._boards)
+        self._start_flush()
+
+    def _changed(self, direction):
+        departure_board_changes.inc()
+        self._dirty.add(direction)
+        self._start_flush()
+
+    def _start_flush(self):
+        if self._flush_task is None:
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+            except RuntimeError:
+                # No loop yet, refresh() publishes once there is one.
+                pass
+
+    async def _flush(self):
+        try:
+            while self._dirty:
+                # Whatever changes while this waits goes out in the same edit.
+                wait = 0 if self._last_publish is None else self._last_publish + self.edit_interval - self.clock()
+                await asyncio.sleep(max(wait, 0))
+
+                dirty, self._dirty = self._dirty, set()
+                self._last_publish = self.clock()
+                for direction in sorted(dirty):
+                    departure_board_edits.labels(direction).inc()
+                    try:
+                        await self.publish(direction, self.render(direction))
+                    except Exception as e:
+                        print(f'Failed to publish the {direction} departure board: {e}')
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    def stop(self):
+        """
+        Cancels a publish that is waiting to go out.
+
+        :returns: None
+        """
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
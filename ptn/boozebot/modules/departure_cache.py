@@ -0,0 +1,74 @@
+"""
+In memory index of the departure notices that are up, so reactions in the departures channel can be turned away
+without fetching the channel and the message first.
+
+Depends on: nothing
+"""
+
+# import libraries
+from collections import namedtuple
+
+from prometheus_client import Counter
+
+departure_message_cache = Counter(
+    'boozebot_departure_message_cache',
+    'Departure channel reactions, by whether the message was in the departure message cache.',
+    ['result'],
+)
+
+DepartureMessage = namedtuple('DepartureMessage', ['author_id', 'pinned', 'bot_authored'])
+
+
+class DepartureMessageCache:
+
+    def __init__(self):
+        """
+        The departure notices Steve posted, keyed by message ID. Messages that are not in here are not notices a
+        reaction can close.
+        """
+        self._messages = {}  # type: dict[int, DepartureMessage]
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, message_id):
+        return message_id in self._messages
+
+    def add(self, message_id, author_id, pinned=False, bot_authored=True):
+        """
+        :param int message_id: The notice's message ID.
+        :param int author_id: Who posted the departure, None if it is not known.
+        :param bool pinned: Whether the message is pinned.
+        :param bool bot_authored: Whether Steve posted the message.
+        :returns: None
+        """
+        self._messages[message_id] = DepartureMessage(author_id, pinned, bot_authored)
+
+    def discard(self, message_id):
+        """
+        :param int message_id: The message ID.
+        :returns: None
+        """
+        self._messages.pop(message_id, None)
+
+    def get(self, message_id):
+        """
+        Looks a message up, counting the hit or miss.
+
+        :param int message_id: The message ID.
+        :returns: The cached metadata, or None if the message is not a departure notice.
+        :rtype: DepartureMessage | None
+        """
+        message = self._messages.get(message_id)
+        departure_message_cache.labels('hit' if message else 'miss').inc()
+        return message
+
+    def closable_by(self, message_id, user_id):
+        """
+        :param int message_id: The message reacted to.
+        :param int user_id: Who reacted.
+        :returns: True if the message is a departure notice the user posted, so their tick closes it.
+        :rtype: bool
+        """
+        message = self.get(message_id)
+        return bool(message) and message.bot_authored and not message.pinned and message.author_id == user_id
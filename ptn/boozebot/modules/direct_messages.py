@@ -0,0 +1,105 @@
+"""
+Batched, rate limited direct messages.
+
+Lines queued for a pilot are held for a short while and sent as one message, so a burst of departures on their routes
+is one DM rather than several. The DMs themselves go out one at a time at a fixed rate, which keeps a popular route
+from tripping Discord's rate limits or its spam detection.
+
+Depends on: nothing
+"""
+
+# import libraries
+import asyncio
+
+from prometheus_client import Counter
+
+direct_messages_sent = Counter(
+    'boozebot_direct_messages',
+    'Batched direct messages, by batcher and outcome.',
+    ['batcher', 'outcome'],
+)
+
+# Discord's limit on the length of a message.
+MAX_MESSAGE_LENGTH = 2000
+
+
+class DirectMessageBatcher:
+
+    def __init__(self, name, send, header='', gather_delay=5.0, per_second=1.0):
+        """
+        :param str name: The name metrics and logs use.
+        :param callable send: Coroutine called with a user ID and the text to send them.
+        :param str header: Text put above the lines in every message.
+        :param float gather_delay: Seconds to wait for more lines before sending.
+        :param float per_second: Most messages sent per second.
+        """
+        self.name = name
+        self.send = send
+        self.header = header
+        self.gather_delay = gather_delay
+        self.per_second = per_second
+        self._pending = {}  # type: dict[int, list[str]]
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def queue(self, user_ids, line):
+        """
+        Adds a line to the next message for each user.
+
+        :param iterable[int] user_ids: Who to tell.
+        :param str line: What to tell them.
+        :returns: None
+        """
+        for user_id in user_ids:
+            self._pending.setdefault(user_id, []).append(line)
+        if self._pending and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    def messages(self, lines):
+        """
+        :param list[str] lines: The lines queued for one user.
+        :returns: The lines under the header, split to fit Discord's message limit.
+        :rtype: list[str]
+        """
+        messages = []
+        current = self.header
+        for line in lines:
+            if current and len(current) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+                messages.append(current)
+                current = ''
+            current = f'{current}\n{line}' if current else line
+        messages.append(current)
+        return messages
+
+    async def _drain(self):
+        try:
+            await asyncio.sleep(self.gather_delay)
+            while self._pending:
+                # Oldest first. Lines added for a user still waiting join their message.
+                user_id = next(iter(self._pending))
+                for text in self.messages(self._pending.pop(user_id)):
+                    try:
+                        await self.send(user_id, text)
+                        direct_messages_sent.labels(self.name, 'sent').inc()
+                    except Exception as e:
+                        direct_messages_sent.labels(self.name, 'failed').inc()
+                        print(f'{self.name} could not message {user_id}: {e}')
+                        break
+                    finally:
+                        await asyncio.sleep(1 / self.per_second)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    def stop(self):
+        """
+        Stops sending. Messages not sent yet are dropped.
+
+        :returns: None
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._pending.clear()
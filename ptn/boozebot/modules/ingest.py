@@ -0,0 +1,111 @@
+"""
+Local HTTP endpoint that form responses are pushed to as they come in.
+
+The signup form's submit script POSTs each response here, numbered by its sheet row, and the carrier it belongs to is
+written straight away instead of waiting for the next sheet poll. Polling carries on as a backstop on a much longer
+interval and picks up anything a push missed.
+
+    POST /form-response
+    Authorization: Bearer <PTN_BOOZEBOT_INGEST_TOKEN>
+
+    {"row": 42, "record": {"Timestamp": "...", "Carrier Name": "...", "Carrier ID": "...", ...}}
+
+The record is keyed by the sheet headers, a Google Apps Script onFormSubmit trigger can send e.range.getRow() and
+e.namedValues as they are.
+
+Depends on: nothing
+"""
+
+# import libraries
+import hmac
+
+from aiohttp import web
+from prometheus_client import Counter
+
+form_responses_pushed = Counter(
+    'boozebot_form_responses_pushed',
+    'Form responses pushed to the ingestion endpoint, by outcome.',
+    ['outcome'],
+)
+
+
+class IngestServer:
+
+    def __init__(self, handler, host, port, token):
+        """
+        Serves the ingestion endpoint on the bot's event loop.
+
+        :param callable handler: Coroutine called with the sheet row and the record, returns a JSON friendly dict with
+            a status key. Raises ValueError for a record that cannot be used.
+        :param str host: Address to listen on, keep this local.
+        :param int port: Port to listen on.
+        :param str token: The bearer token callers have to present.
+        """
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.token = token
+        self._runner = None
+
+    def build_app(self):
+        """
+        :returns: The aiohttp application with the ingestion route.
+        :rtype: aiohttp.web.Application
+        """
+        app = web.Application(client_max_size=64 * 1024)
+        app.router.add_post('/form-response', self.handle_form_response)
+        return app
+
+    async def start(self):
+        """
+        Starts listening.
+
+        :returns: None
+        """
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f'Listening for pushed form responses on {self.host}:{self.port}.')
+
+    async def stop(self):
+        """
+        Stops listening.
+
+        :returns: None
+        """
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_form_response(self, request):
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode(), f'Bearer {self.token}'.encode()):
+            form_responses_pushed.labels('unauthorised').inc()
+            return web.json_response({'error': 'unauthorised'}, status=401)
+
+        try:
+            payload = await request.json()
+        except ValueError:
+            form_responses_pushed.labels('invalid').inc()
+            return web.json_response({'error': 'body is not JSON'}, status=400)
+
+        row = payload.get('row') if isinstance(payload, dict) else None
+        record = payload.get('record') if isinstance(payload, dict) else None
+        if not isinstance(row, int) or isinstance(row, bool) or row < 2 or not isinstance(record, dict):
+            form_responses_pushed.labels('invalid').inc()
+            return web.json_response({'error': 'expected a sheet row number and a record'}, status=400)
+
+        # Apps Script namedValues wraps every answer in a list.
+        record = {
+            str(key): value[0] if isinstance(value, list) and len(value) == 1 else value
+            for key, value in record.items()
+        }
+
+        try:
+            result = await self.handler(row, record)
+        except ValueError as e:
+            form_responses_pushed.labels('rejected').inc()
+            return web.json_response({'error': str(e)}, status=422)
+
+        form_responses_pushed.labels(result['status']).inc()
+        return web.json_response(result)
@@ -0,0 +1,78 @@
+"""
+Watches the discord.py event loop for stalls.
+
+A task sleeps for a fixed interval and measures how late it wakes up. Anything run synchronously on the loop shows up
+as lag, so this is how we see the difference between blocking calls on the loop and calls on the database executor.
+
+Depends on: nothing
+"""
+
+# import libraries
+import asyncio
+import time
+
+from prometheus_client import Gauge, Histogram
+
+event_loop_lag_seconds = Histogram(
+    'boozebot_event_loop_lag_seconds',
+    'How late the event loop monitor woke up compared to when it asked to.',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+event_loop_max_lag_seconds = Gauge(
+    'boozebot_event_loop_max_lag_seconds',
+    'The worst event loop stall seen since the bot started.',
+)
+
+
+class LoopLagMonitor:
+
+    def __init__(self, interval=0.5, report_threshold=0.25):
+        """
+        Measures the event loop lag.
+
+        :param float interval: Seconds between samples.
+        :param float report_threshold: Stalls longer than this are printed to the log.
+        """
+        self.interval = interval
+        self.report_threshold = report_threshold
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.stall_count = 0
+        self._task = None
+
+    def start(self):
+        """
+        Starts sampling on the running loop.
+
+        :returns: None
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """
+        Stops sampling.
+
+        :returns: None
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+
+            self.last_lag = lag
+            event_loop_lag_seconds.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+                event_loop_max_lag_seconds.set(lag)
+            if lag > self.report_threshold:
+                self.stall_count += 1
+                print(f'Event loop stalled for {lag:.3f}s (worst so far {self.max_lag:.3f}s).')
+
+
+loop_lag_monitor = LoopLagMonitor()
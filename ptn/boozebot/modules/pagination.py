@@ -12,7 +12,7 @@ from ptn.boozebot.constants import bot
 # local modules
 from ptn.boozebot.modules.ErrorHandler import on_app_command_error, GenericError, CustomError, on_generic_error
 
-async def createPagination(interaction: discord.Interaction, title: str, content: list[tuple[str, str]], pageLength: int = 10):
+async def createPagination(interaction: discord.Interaction, title: str, content: list[tuple[str, str]], pageLength: int = 10, footer: str = None):
     print("Creating a pagination.")
 
     def chunk(chunk_list, max_size=10):
@@ -45,6 +45,8 @@ async def createPagination(interaction: discord.Interaction, title: str, content
                         value=f"{entry[1]}",
                         inline=False,
                     )
+        if footer:
+            embed.set_footer(text=footer)
         return embed
         
 
@@ -0,0 +1,197 @@
+"""
+Rate limiting, retry and circuit breaker helpers for the external APIs Pirate Steve polls.
+
+TokenBucket and retry_with_backoff block and are thread safe, they are meant for calls already running on the database
+executor. CircuitBreaker never blocks and is meant for the event loop.
+
+Depends on: nothing
+"""
+
+# import libraries
+import random
+import threading
+import time
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity, reserve=0, clock=time.monotonic):
+        """
+        A token bucket with a priority lane. Each call takes one token, tokens refill at a steady rate up to capacity.
+        The last reserve tokens are kept for priority callers, and while a priority caller is waiting nobody else is
+        served, so a background loop can never starve a user waiting on a command.
+
+        :param float rate: Tokens added per second.
+        :param int capacity: The most tokens the bucket holds, which is the largest burst allowed.
+        :param int reserve: Tokens only priority callers may take.
+        :param callable clock: Monotonic time source, swappable for tests.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = min(reserve, capacity - 1)
+        self.clock = clock
+
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._condition = threading.Condition()
+        self._priority_waiting = 0
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self):
+        """
+        :returns: The tokens in the bucket right now, priority reserve included.
+        :rtype: float
+        """
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, priority=False):
+        """
+        Takes a token if one is free for this lane, without waiting.
+
+        :param bool priority: Take from the priority lane.
+        :returns: True if a token was taken.
+        :rtype: bool
+        """
+        with self._condition:
+            return self._take(priority)
+
+    def _take(self, priority):
+        self._refill()
+        floor = 1 if priority else 1 + self.reserve
+        if self._tokens >= floor and (priority or self._priority_waiting == 0):
+            self._tokens -= 1
+            return True
+        return False
+
+    def acquire(self, priority=False, timeout=None):
+        """
+        Waits for a token.
+
+        :param bool priority: Take from the priority lane.
+        :param float timeout: The longest to wait, None waits as long as it takes.
+        :returns: Seconds spent waiting.
+        :rtype: float
+        :raises TimeoutError: If no token came free within the timeout.
+        """
+        started_at = self.clock()
+        with self._condition:
+            if priority:
+                self._priority_waiting += 1
+            try:
+                while not self._take(priority):
+                    floor = 1 if priority else 1 + self.reserve
+                    # Time until enough tokens have dripped in, or a short nap while a priority caller goes first.
+                    wait = max((floor - self._tokens) / self.rate, 1 / self.rate)
+                    if timeout is not None:
+                        remaining = timeout - (self.clock() - started_at)
+                        if remaining <= 0:
+                            raise TimeoutError(f'No rate limit token within {timeout}s')
+                        wait = min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                if priority:
+                    self._priority_waiting -= 1
+                    self._condition.notify_all()
+        return self.clock() - started_at
+
+
+def retry_with_backoff(func, should_retry, attempts=5, base_delay=1.0, max_delay=32.0, on_retry=None,
+                       sleep=time.sleep):
+    """
+    Calls func, retrying failures that should_retry accepts with exponential backoff and full jitter, so callers that
+    failed together do not all come back at the same moment.
+
+    :param callable func: The call to make, with no arguments.
+    :param callable should_retry: Given the exception, returns True if it is worth another go.
+    :param int attempts: The most calls made in total.
+    :param float base_delay: The backoff ceiling for the first retry, doubled for each retry after it.
+    :param float max_delay: The largest backoff ceiling.
+    :param callable on_retry: Called with the exception, the retry number and the delay before each retry.
+    :param callable sleep: Sleep function, swappable for tests.
+    :returns: Whatever func returns.
+    :raises Exception: The last failure, once attempts run out or should_retry says no.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts - 1 or not should_retry(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if on_retry:
+                on_retry(e, attempt + 1, delay)
+            sleep(delay)
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold=3, reset_timeout=300, clock=time.monotonic):
+        """
+        Stops calls to a dependency that keeps failing. After failure_threshold failures in a row the circuit opens
+        and allow() turns callers away. Once reset_timeout has passed a single trial call is let through, success
+        closes the circuit again and failure keeps it open for another reset_timeout.
+
+        :param int failure_threshold: Failures in a row that open the circuit.
+        :param float reset_timeout: Seconds the circuit stays open before a trial call.
+        :param callable clock: Monotonic time source, swappable for tests.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def is_open(self):
+        """
+        :returns: True while callers are being turned away, a trial in progress counts as open.
+        :rtype: bool
+        """
+        return self._opened_at is not None
+
+    def allow(self):
+        """
+        Asks whether a call may go ahead. A True while open is the trial call, report how it went.
+
+        :returns: True if the call may be made.
+        :rtype: bool
+        """
+        if self._opened_at is None:
+            return True
+        if not self._trial_running and self.clock() - self._opened_at >= self.reset_timeout:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        """
+        :returns: None
+        """
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        """
+        :returns: None
+        """
+        self.failures += 1
+        self._trial_running = False
+        if self.failures >= self.failure_threshold:
+            self._opened_at = self.clock()
+
+    def record_abandoned(self):
+        """
+        For a call given up on before it finished, which says nothing about the dependency either way.
+
+        :returns: None
+        """
+        self._trial_running = False
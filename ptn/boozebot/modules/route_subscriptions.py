@@ -0,0 +1,115 @@
+"""
+The routes pilots have asked to be told about, indexed by departure system.
+
+A departure is matched by looking up its departure system, then the subscribers to its arrival system and those happy
+with any arrival, so the work done per departure is only the subscribers it matches. Ranges of systems are stored as
+the routes they cover.
+
+Depends on: nothing
+"""
+
+# import libraries
+from prometheus_client import Counter
+
+from ptn.boozebot.database.departures import ROUTE_SYSTEMS, departure_direction, route_system
+
+route_subscription_matches = Counter(
+    'boozebot_route_subscription_matches',
+    'Subscribers matched to posted departures.',
+)
+
+
+def expand_range(lowest, highest, direction=None):
+    """
+    Lists the routes with both ends inside a range of systems.
+
+    :param str lowest: One end of the range, such as N0.
+    :param str highest: The other end, such as N3.
+    :param str direction: DIRECTION_UP or DIRECTION_DOWN to only cover routes that way, None for both.
+    :returns: The (departure_system, arrival_system) routes.
+    :rtype: list[tuple[str, str]]
+    :raises ValueError: If either end is not in ROUTE_SYSTEMS.
+    """
+    start, end = sorted((ROUTE_SYSTEMS.index(lowest), ROUTE_SYSTEMS.index(highest)))
+    systems = ROUTE_SYSTEMS[start:end + 1]
+    routes = []
+    for departure_system in systems:
+        for arrival_system in systems:
+            route_direction = departure_direction(departure_system, arrival_system)
+            if route_direction is not None and direction in (None, route_direction):
+                routes.append((departure_system, arrival_system))
+    return routes
+
+
+class RouteSubscriptionIndex:
+
+    def __init__(self):
+        """
+        Subscribers keyed by departure system, then arrival system. The None arrival holds those subscribed to every
+        route out of a system.
+        """
+        self._by_departure = {}  # type: dict[str, dict[str | None, set[int]]]
+        self._by_user = {}  # type: dict[int, set[tuple[str, str | None]]]
+
+    def __len__(self):
+        return sum(len(routes) for routes in self._by_user.values())
+
+    def add(self, user_id, departure_system, arrival_system=None):
+        """
+        :param int user_id: The pilot subscribing.
+        :param str departure_system: The system departures leave from.
+        :param str arrival_system: The system they go to, None for anywhere.
+        :returns: True if the pilot was not already subscribed to the route.
+        :rtype: bool
+        """
+        routes = self._by_user.setdefault(user_id, set())
+        if (departure_system, arrival_system) in routes:
+            return False
+        routes.add((departure_system, arrival_system))
+        self._by_departure.setdefault(departure_system, {}).setdefault(arrival_system, set()).add(user_id)
+        return True
+
+    def remove_user(self, user_id):
+        """
+        Drops every subscription a pilot has.
+
+        :param int user_id: The pilot.
+        :returns: How many subscriptions were dropped.
+        :rtype: int
+        """
+        routes = self._by_user.pop(user_id, set())
+        for departure_system, arrival_system in routes:
+            arrivals = self._by_departure[departure_system]
+            arrivals[arrival_system].discard(user_id)
+            if not arrivals[arrival_system]:
+                del arrivals[arrival_system]
+            if not arrivals:
+                del self._by_departure[departure_system]
+        return len(routes)
+
+    def routes(self, user_id):
+        """
+        :param int user_id: The pilot.
+        :returns: The pilot's (departure_system, arrival_system) routes in route order, any arrival first.
+        :rtype: list[tuple[str, str | None]]
+        """
+        def route_order(route):
+            departure_system, arrival_system = route
+            return ROUTE_SYSTEMS.index(departure_system), -1 if arrival_system is None else \
+                ROUTE_SYSTEMS.index(arrival_system)
+
+        return sorted(self._by_user.get(user_id, ()), key=route_order)
+
+    def match(self, departure_location, arrival_location):
+        """
+        :param str departure_location: Where the carrier leaves from, such as N0 Planet 3.
+        :param str arrival_location: Where the carrier is going.
+        :returns: The pilots subscribed to the route.
+        :rtype: set[int]
+        """
+        arrivals = self._by_departure.get(route_system(departure_location))
+        if not arrivals:
+            return set()
+        subscribers = arrivals.get(route_system(arrival_location), set()) | arrivals.get(None, set())
+        route_subscription_matches.inc(len(subscribers))
+        return subscribers
@@ -0,0 +1,280 @@
+"""
+Access to the signup form response sheet.
+
+DatabaseInteraction talks to the sheet through SheetBackend so the sync can be run against a local fake in tests and
+benchmarks. The backend also offers change_token, a cheap probe that changes whenever the sheet does, so a poll can
+skip downloading any values when nothing moved.
+
+Every request to Google goes through SheetsQuota, which keeps Steve inside the per minute read quota and retries the
+requests Google turns away with backoff. Refreshes a user is waiting on are marked with sheet_priority and go ahead of
+the periodic loop.
+
+Depends on: nothing
+"""
+
+# import libraries
+import abc
+import contextlib
+import contextvars
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from ptn.boozebot.modules.ratelimit import TokenBucket, retry_with_backoff
+
+sheets_requests = Counter(
+    'boozebot_sheets_requests',
+    'Requests made to the Google Sheets and Drive APIs, by call, lane and outcome.',
+    ['call', 'lane', 'outcome'],
+)
+sheets_retries = Counter(
+    'boozebot_sheets_retries',
+    'Google API requests retried after a rate limit or server error, by status code.',
+    ['status'],
+)
+sheets_throttle_seconds = Histogram(
+    'boozebot_sheets_throttle_seconds',
+    'Time Google API requests waited for the rate limiter, by lane.',
+    ['lane'],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+sheets_quota_available = Gauge(
+    'boozebot_sheets_quota_available',
+    'Google API requests that could be made right now without waiting.',
+)
+sheets_quota_limit = Gauge(
+    'boozebot_sheets_quota_limit',
+    'Google API requests allowed per minute.',
+)
+
+# Whether sheet calls made from this context are for a user waiting on a command, see sheet_priority.
+sheet_call_priority = contextvars.ContextVar('sheet_call_priority', default=True)
+
+
+@contextlib.contextmanager
+def sheet_priority(priority):
+    """
+    Marks the sheet calls made inside the block as user triggered or background work.
+
+    :param bool priority: True if a user is waiting on the result.
+    """
+    token = sheet_call_priority.set(priority)
+    try:
+        yield
+    finally:
+        sheet_call_priority.reset(token)
+
+
+def api_error_status(error):
+    """
+    :param Exception error: The failure.
+    :returns: The HTTP status of a gspread APIError, or None for anything else.
+    :rtype: int | None
+    """
+    # gspread 6 has the status on the error itself, older versions only keep the response.
+    status = getattr(error, 'code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error):
+    """
+    :param Exception error: The failure.
+    :returns: True for rate limit and server errors, which are worth trying again after a pause.
+    :rtype: bool
+    """
+    status = api_error_status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class SheetsQuota:
+
+    def __init__(self, requests_per_minute=60, priority_reserve=10, attempts=5, base_delay=1.0, max_delay=32.0):
+        """
+        Rate limits and retries the requests made to Google. Sized to the read quota, which is the one the bot runs
+        into at the start of a cruise.
+
+        :param int requests_per_minute: The quota, requests made per minute at most.
+        :param int priority_reserve: Requests per minute only priority calls may use.
+        :param int attempts: The most times a request is made before the error is passed on.
+        :param float base_delay: The backoff ceiling for the first retry, in seconds.
+        :param float max_delay: The largest backoff ceiling, in seconds.
+        """
+        self.bucket = TokenBucket(requests_per_minute / 60, requests_per_minute, priority_reserve)
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        sheets_quota_limit.set(requests_per_minute)
+        sheets_quota_available.set(requests_per_minute)
+
+    def call(self, call_name, func, *args, **kwargs):
+        """
+        Makes one request to Google once the rate limiter allows it, retrying on 429 and 5xx responses.
+
+        :param str call_name: The name the request is recorded under.
+        :param callable func: The gspread call.
+        :returns: Whatever the call returns.
+        :raises gspread.exceptions.APIError: If the request still fails once the attempts run out.
+        """
+        priority = sheet_call_priority.get()
+        lane = 'priority' if priority else 'background'
+
+        def attempt():
+            sheets_throttle_seconds.labels(lane).observe(self.bucket.acquire(priority))
+            sheets_quota_available.set(self.bucket.available)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                sheets_requests.labels(call_name, lane, str(api_error_status(e) or 'error')).inc()
+                raise
+            sheets_requests.labels(call_name, lane, 'ok').inc()
+            return result
+
+        def on_retry(error, retry, delay):
+            status = api_error_status(error)
+            sheets_retries.labels(str(status)).inc()
+            print(f'Google returned {status} for {call_name}, retry {retry} in {delay:.1f}s.')
+
+        return retry_with_backoff(
+            attempt, is_retryable, self.attempts, self.base_delay, self.max_delay, on_retry=on_retry
+        )
+
+
+class SheetBackend(abc.ABC):
+    """
+    The calls the sheet sync makes. Rows are numbered from 1 like the sheet, row 1 is the header.
+    """
+
+    @abc.abstractmethod
+    def change_token(self):
+        """
+        Returns a cheap value that changes whenever the sheet does.
+
+        :returns: The token, or None if the backend cannot tell, in which case the caller has to look at the values.
+        :rtype: str | None
+        """
+
+    @abc.abstractmethod
+    def row_count(self):
+        """
+        :returns: The number of filled rows, header included.
+        :rtype: int
+        """
+
+    @abc.abstractmethod
+    def header(self):
+        """
+        :returns: The header row.
+        :rtype: list[str]
+        """
+
+    @abc.abstractmethod
+    def all_values(self):
+        """
+        :returns: Every row, header included.
+        :rtype: list[list[str]]
+        """
+
+    @abc.abstractmethod
+    def rows(self, first_row, last_row, width):
+        """
+        :param int first_row: The first row to return.
+        :param int last_row: The last row to return, inclusive.
+        :param int width: How many columns to return.
+        :returns: The rows, trailing empty cells may be left off.
+        :rtype: list[list[str]]
+        """
+
+
+class GspreadSheetBackend(SheetBackend):
+
+    def __init__(self, worksheet, quota):
+        """
+        :param gspread.Worksheet worksheet: The form response worksheet.
+        :param SheetsQuota quota: The rate limiter every request goes through.
+        """
+        self.worksheet = worksheet
+        self.quota = quota
+
+    def change_token(self):
+        """
+        Asks Drive for the spreadsheet's version and modified time. This is one small metadata request, where looking
+        at the values means downloading at least a whole column.
+        """
+        # Imported here so the fake backend does not need gspread installed.
+        from gspread.exceptions import APIError
+        from gspread.urls import DRIVE_FILES_API_V3_URL
+
+        client = self.worksheet.client
+        # gspread 6 moved the raw request onto the http client.
+        http_client = getattr(client, 'http_client', client)
+        try:
+            metadata = self.quota.call(
+                'change_token',
+                http_client.request,
+                'get',
+                f'{DRIVE_FILES_API_V3_URL}/{self.worksheet.spreadsheet.id}',
+                params={'fields': 'version,modifiedTime', 'supportsAllDrives': True},
+            ).json()
+        except APIError as e:
+            print(f'Could not probe the signup sheet for changes, reading it instead: {e}')
+            return None
+        return f"{metadata.get('version')}:{metadata.get('modifiedTime')}"
+
+    def row_count(self):
+        # The timestamp column is always filled in on a form response, so it is a cheap row count.
+        return len(self.quota.call('row_count', self.worksheet.col_values, 1))
+
+    def header(self):
+        return self.quota.call('header', self.worksheet.row_values, 1)
+
+    def all_values(self):
+        return self.quota.call('all_values', self.worksheet.get_all_values)
+
+    def rows(self, first_row, last_row, width):
+        from gspread.utils import rowcol_to_a1
+
+        return self.quota.call('rows', self.worksheet.get_values, f'A{first_row}:{rowcol_to_a1(last_row, width)}')
+
+
+class LocalSheetBackend(SheetBackend):
+
+    def __init__(self, rows=None):
+        """
+        An in memory sheet for tests and benchmarks. Counts the calls made against it.
+
+        :param list[list[str]] rows: The rows, header first.
+        """
+        self._rows = [list(row) for row in rows or []]
+        self._version = 0
+        self.calls = {'change_token': 0, 'row_count': 0, 'header': 0, 'all_values': 0, 'rows': 0}
+
+    def append(self, *rows):
+        """
+        Adds form responses to the end of the sheet.
+
+        :param list[str] rows: The new rows.
+        :returns: None
+        """
+        self._rows.extend(list(row) for row in rows)
+        self._version += 1
+
+    def change_token(self):
+        self.calls['change_token'] += 1
+        return str(self._version)
+
+    def row_count(self):
+        self.calls['row_count'] += 1
+        return len(self._rows)
+
+    def header(self):
+        self.calls['header'] += 1
+        return list(self._rows[0]) if self._rows else []
+
+    def all_values(self):
+        self.calls['all_values'] += 1
+        return [list(row) for row in self._rows]
+
+    def rows(self, first_row, last_row, width):
+        self.calls['rows'] += 1
+        return [list(row[:width]) for row in self._rows[first_row - 1:last_row]]
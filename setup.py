@@ -32,6 +32,7 @@ setup(
     install_requires=[
         'discord.py==2.3.1',
         'discord-ext-prometheus',
+        'prometheus-client',
         'google-api-python-client',
         'gspread',
         'oauth2client',
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from ptn.boozebot.database.backup import BackupScheduler, restore_snapshot
+from ptn.boozebot.database.connections import ConnectionManager
+
+
+class BackupSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manager = ConnectionManager(os.path.join(self.tmp_dir.name, 'test.db'), read_pool_size=2, timeout=1)
+        with self.manager.write_cursor() as cursor:
+            cursor.execute('CREATE TABLE carriers(carrierid TEXT, winetotal INT)')
+            cursor.execute("INSERT INTO carriers VALUES('ABC-123', 100)")
+        self.snapshot_path = os.path.join(self.tmp_dir.name, 'snapshot.db')
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp_dir.cleanup()
+
+    def test_burst_of_requests_makes_one_backup(self):
+        scheduler = BackupScheduler(self.manager, self.snapshot_path, delay=0.05)
+        backups = []
+        scheduler.backup_now = lambda: backups.append(time.monotonic())
+
+        for _ in range(10):
+            scheduler.request()
+        time.sleep(0.3)
+
+        self.assertEqual(len(backups), 1)
+        self.assertFalse(scheduler.pending)
+
+    def test_flush_takes_pending_snapshot(self):
+        scheduler = BackupScheduler(self.manager, self.snapshot_path, delay=60)
+        self.assertFalse(scheduler.flush())
+
+        scheduler.request()
+        self.assertTrue(scheduler.flush())
+        self.assertFalse(scheduler.pending)
+
+        snapshot = sqlite3.connect(self.snapshot_path)
+        self.assertEqual(snapshot.execute('SELECT carrierid FROM carriers').fetchall(), [('ABC-123',)])
+        snapshot.close()
+
+    def test_restore_snapshot(self):
+        BackupScheduler(self.manager, self.snapshot_path).backup_now()
+
+        restored = sqlite3.connect(os.path.join(self.tmp_dir.name, 'restored.db'))
+        restore_snapshot(self.snapshot_path, restored)
+        self.assertEqual(restored.execute('SELECT winetotal FROM carriers').fetchone()[0], 100)
+        restored.close()
@@ -0,0 +1,47 @@
+import sqlite3
+import unittest
+
+from ptn.boozebot.classes.BoozeCarrier import BoozeCarrier
+
+
+class BoozeCarrierTest(unittest.TestCase):
+
+    def setUp(self):
+        connection = sqlite3.connect(':memory:')
+        connection.row_factory = sqlite3.Row
+        self.row = connection.execute('''
+            SELECT 'Carrier' AS carriername, ' abc-123' AS carrierid, 46000 AS winetotal, 'user' AS discordusername,
+            '2025-01-01 00:00:00' AS timestamp, NULL AS discord_unload_in_progress, 2 AS runtotal,
+            NULL AS totalunloads, NULL AS user_timezone_in_utc
+        ''').fetchone()
+
+    def test_row_and_dict_paths_agree(self):
+        from_row = BoozeCarrier.from_db_row(self.row)
+        self.assertEqual(from_row.carrier_identifier, 'ABC-123')
+        self.assertEqual(from_row.total_unloads, 0)
+        self.assertEqual(from_row.to_dictionary(), BoozeCarrier(dict(self.row)).to_dictionary())
+        self.assertEqual(from_row.to_dictionary(), BoozeCarrier(self.row).to_dictionary())
+
+    def test_sheet_record(self):
+        carrier = BoozeCarrier.from_sheet_record({
+            'Carrier Name': 'Carrier', 'Carrier ID': 'abc-123', 'Wine Total (tons)': '23000',
+            'Discord Username': 'user', 'Timestamp': '2025-01-01 00:00:00',
+        })
+        self.assertEqual((carrier.wine_total, carrier.run_count, carrier.total_unloads), (23000, 1, 0))
+
+        with self.assertRaises(ValueError):
+            BoozeCarrier.from_sheet_record({'Carrier Name': 'Carrier', 'Carrier ID': 'nope'})
+
+    def test_empty_carrier_is_falsy(self):
+        self.assertFalse(BoozeCarrier())
+        self.assertFalse(BoozeCarrier.from_db_row(None))
+        self.assertTrue(BoozeCarrier.from_db_row(self.row))
+
+    def test_equal_carriers_hash_alike(self):
+        first = BoozeCarrier.from_db_row(self.row)
+        second = BoozeCarrier(dict(self.row))
+        self.assertEqual(first, second)
+        self.assertEqual(len({first, second}), 1)
+
+        second.wine_total += 1
+        self.assertNotEqual(first, second)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from ptn.boozebot.database.connections import ConnectionManager
+
+
+class ConnectionManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manager = ConnectionManager(os.path.join(self.tmp_dir.name, 'test.db'), read_pool_size=2, timeout=1)
+        with self.manager.write_cursor() as cursor:
+            cursor.execute('CREATE TABLE carriers(carrierid TEXT, winetotal INT)')
+            cursor.execute("INSERT INTO carriers VALUES('ABC-123', 100)")
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp_dir.cleanup()
+
+    def test_uses_wal(self):
+        mode = self.manager.writer.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_read_is_not_blocked_by_open_write(self):
+        with self.manager.write_cursor() as write:
+            write.execute("UPDATE carriers SET winetotal = 200")
+            with self.manager.read_cursor() as read:
+                read.execute('SELECT winetotal FROM carriers')
+                # The reader sees the last committed value, not the pending write.
+                self.assertEqual(read.fetchone()['winetotal'], 100)
+
+        with self.manager.read_cursor() as read:
+            read.execute('SELECT winetotal FROM carriers')
+            self.assertEqual(read.fetchone()['winetotal'], 200)
+
+    def test_write_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.manager.write_cursor() as cursor:
+                cursor.execute("DELETE FROM carriers")
+                raise RuntimeError('boom')
+
+        with self.manager.read_cursor() as read:
+            read.execute('SELECT count(*) FROM carriers')
+            self.assertEqual(read.fetchone()[0], 1)
+
+    def test_readers_do_not_share_cursors(self):
+        with self.manager.read_cursor() as first, self.manager.read_cursor() as second:
+            self.assertIsNot(first.connection, second.connection)
+            first.execute('SELECT carrierid FROM carriers')
+            second.execute('SELECT winetotal FROM carriers')
+            self.assertEqual(first.fetchone()[0], 'ABC-123')
+            self.assertEqual(second.fetchone()[0], 100)
+
+    def test_readers_are_read_only(self):
+        with self.assertRaises(Exception):
+            with self.manager.read_cursor() as read:
+                read.execute("DELETE FROM carriers")
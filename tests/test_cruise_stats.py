@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ptn.boozebot.database.cruise_stats import (
+    CruiseStats,
+    CruiseSummaryCache,
+    SUMMARY_COLUMNS,
+    aggregate_sql,
+    rollup_cruises,
+)
+from ptn.boozebot.database.migrations import MIGRATIONS, run_migrations
+
+
+def add_carrier(connection, carrier_id, wine, runs, unloads):
+    connection.execute(
+        '''
+        INSERT INTO boozecarriers (carriername, carrierid, winetotal, platform, officialcarrier, discordusername,
+        runtotal, totalunloads) VALUES('Carrier', ?, ?, 'PC', 0, 'user', ?, ?)
+        ''',
+        (carrier_id, wine, runs, unloads),
+    )
+
+
+class CruiseSummaryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'test.db')
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        run_migrations(self.connection)
+        add_carrier(self.connection, 'AAA-111', 20000, 2, 1)
+        add_carrier(self.connection, 'BBB-222', 15000, None, None)
+        self.connection.commit()
+        self.cache = CruiseSummaryCache(self.db_path)
+
+    def tearDown(self):
+        self.cache.close()
+        self.connection.close()
+        self.tmp_dir.cleanup()
+
+    def summary(self):
+        return CruiseStats.from_row(
+            self.connection.execute(f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM cruise_summary').fetchone()
+        )
+
+    def from_scratch(self):
+        return CruiseStats.from_row(self.connection.execute(aggregate_sql('boozecarriers')).fetchone())
+
+    def test_triggers_track_inserts(self):
+        self.assertEqual(
+            self.summary(),
+            CruiseStats(total_wine=35000, unique_carriers=2, extra_trips=1, multiple_trip_carriers=1,
+                        total_unloads=1, remaining_carriers=2),
+        )
+        self.assertEqual(self.summary().total_trips, 3)
+
+    def test_triggers_track_updates_and_deletes(self):
+        self.connection.execute("UPDATE boozecarriers SET totalunloads = 2, winetotal = 25000 WHERE carrierid = 'AAA-111'")
+        self.connection.execute("UPDATE boozecarriers SET runtotal = 3 WHERE carrierid = 'BBB-222'")
+        add_carrier(self.connection, 'CCC-333', 5000, 1, 0)
+        self.connection.execute("DELETE FROM boozecarriers WHERE carrierid = 'CCC-333'")
+        self.assertEqual(self.summary(), self.from_scratch())
+        self.assertEqual(self.summary().remaining_carriers, 1)
+
+        self.connection.execute('DELETE FROM boozecarriers')
+        self.assertEqual(self.summary(), CruiseStats())
+
+    def test_cache_rereads_after_commit(self):
+        self.assertEqual(self.cache.get().total_wine, 35000)
+
+        add_carrier(self.connection, 'CCC-333', 5000, 1, 0)
+        # Not committed yet, so the cached totals still stand.
+        self.assertEqual(self.cache.get().total_wine, 35000)
+
+        self.connection.commit()
+        self.assertEqual(self.cache.get().total_wine, 40000)
+
+
+class CruiseRollupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        # Migrate up to the base tables only, so there is history to backfill from.
+        run_migrations(self.connection, [migration for migration in MIGRATIONS if migration[0] < 4])
+        for holiday_start, wine, runs in (('2024-01-05', 20000, 1), ('2024-01-05', 10000, 3), ('2024-06-07', 5000, 1)):
+            self.connection.execute(
+                '''
+                INSERT INTO historical (holiday_start, holiday_end, carriername, carrierid, winetotal, platform,
+                discordusername, runtotal, totalunloads) VALUES(?, ?, 'Carrier', 'AAA-111', ?, 'PC', 'user', ?, ?)
+                ''',
+                (holiday_start, holiday_start, wine, runs, runs),
+            )
+        self.connection.commit()
+        run_migrations(self.connection)
+
+    def rollup(self, holiday_start):
+        return CruiseStats.from_row(self.connection.execute(
+            f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM cruise_rollups WHERE holiday_start = ?', (holiday_start,)
+        ).fetchone())
+
+    def test_migration_backfills_history(self):
+        self.assertEqual(self.connection.execute('SELECT count(*) FROM cruise_rollups').fetchone()[0], 2)
+        self.assertEqual(
+            self.rollup('2024-01-05'),
+            CruiseStats(total_wine=30000, unique_carriers=2, extra_trips=2, multiple_trip_carriers=1,
+                        total_unloads=4, remaining_carriers=0),
+        )
+
+    def test_rollup_single_cruise_matches_historical(self):
+        self.connection.execute("UPDATE historical SET winetotal = 7000 WHERE holiday_start = '2024-06-07'")
+        self.assertEqual(rollup_cruises(self.connection.cursor(), '2024-06-07'), 1)
+
+        from_scratch = CruiseStats.from_row(self.connection.execute(
+            f"{aggregate_sql('historical')} WHERE holiday_start = '2024-06-07'"
+        ).fetchone())
+        self.assertEqual(self.rollup('2024-06-07'), from_scratch)
+        self.assertEqual(self.rollup('2024-06-07').total_wine, 7000)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+import unittest
+
+from ptn.boozebot.modules.deadline_scheduler import DeadlineScheduler
+
+
+class DeadlineSchedulerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.fired = []
+        self.scheduler = DeadlineScheduler('test', self.record)
+
+    async def asyncTearDown(self):
+        self.scheduler.stop()
+
+    async def record(self, key):
+        self.fired.append((key, time.time()))
+
+    async def wait_for_fired(self, count, timeout=2):
+        deadline = time.time() + timeout
+        while len(self.fired) < count and time.time() < deadline:
+            await asyncio.sleep(0.005)
+
+    async def test_fires_in_deadline_order(self):
+        now = time.time()
+        self.scheduler.schedule('late', now + 0.15)
+        self.scheduler.schedule('early', now + 0.05)
+        self.scheduler.schedule('overdue', now - 10)
+        self.scheduler.start()
+
+        await self.wait_for_fired(3)
+        self.assertEqual([key for key, _ in self.fired], ['overdue', 'early', 'late'])
+        self.assertGreaterEqual(self.fired[1][1], now + 0.05)
+        self.assertEqual(len(self.scheduler), 0)
+
+    async def test_cancelled_deadlines_do_not_fire(self):
+        now = time.time()
+        self.scheduler.schedule('kept', now + 0.05)
+        self.scheduler.schedule('ticked off', now + 0.02)
+        self.scheduler.start()
+
+        self.assertTrue(self.scheduler.cancel('ticked off'))
+        self.assertFalse(self.scheduler.cancel('ticked off'))
+        self.assertNotIn('ticked off', self.scheduler)
+        self.assertEqual(self.scheduler.next_deadline, now + 0.05)
+
+        await self.wait_for_fired(1)
+        await asyncio.sleep(0.05)
+        self.assertEqual([key for key, _ in self.fired], ['kept'])
+
+    async def test_earlier_deadline_wakes_the_sleeper(self):
+        self.scheduler.schedule('a', time.time() + 60)
+        self.scheduler.start()
+        await asyncio.sleep(0.01)
+
+        started = time.time()
+        self.scheduler.schedule('a', started + 0.02)
+        await self.wait_for_fired(1)
+
+        self.assertEqual([key for key, _ in self.fired], ['a'])
+        self.assertLess(self.fired[0][1] - started, 1)
+        self.assertIsNone(self.scheduler.next_deadline)
+
+    async def test_failing_callback_does_not_stop_the_scheduler(self):
+        async def callback(key):
+            if key == 'bad':
+                raise RuntimeError('boom')
+            await self.record(key)
+
+        scheduler = DeadlineScheduler('failing', callback)
+        now = time.time()
+        scheduler.schedule('bad', now)
+        scheduler.schedule('good', now + 0.01)
+        scheduler.start()
+        try:
+            await self.wait_for_fired(1)
+            self.assertEqual([key for key, _ in self.fired], ['good'])
+            self.assertTrue(scheduler.is_running())
+        finally:
+            scheduler.stop()
+        self.assertFalse(scheduler.is_running())
+
+    async def test_stop_lets_the_running_callback_finish(self):
+        async def callback(key):
+            await asyncio.sleep(0.05)
+            await self.record(key)
+
+        scheduler = DeadlineScheduler('stopping', callback)
+        scheduler.schedule('running', time.time())
+        scheduler.schedule('later', time.time() + 0.01)
+        scheduler.start()
+        await asyncio.sleep(0.01)
+
+        scheduler.stop()
+        self.assertFalse(scheduler.is_running())
+        await asyncio.sleep(0.1)
+        self.assertEqual([key for key, _ in self.fired], ['running'])
+        self.assertIn('later', scheduler)
+
+    async def test_rescheduling_replaces_the_deadline(self):
+        now = time.time()
+        self.scheduler.schedule('a', now + 60)
+        self.scheduler.schedule('b', now + 45)
+        self.scheduler.schedule('a', now + 30)
+        self.assertEqual(len(self.scheduler), 2)
+        self.assertEqual(self.scheduler.next_deadline, now + 30)
+        self.scheduler.cancel('a')
+        self.assertEqual(self.scheduler.next_deadline, now + 45)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from ptn.boozebot.database.departures import DIRECTION_DOWN, DIRECTION_UP, Departure, departure_direction
+from ptn.boozebot.modules.departure_board import DepartureBoard
+
+
+def departure(message_id, departure_time, departure_location='N2', arrival_location='N0'):
+    return Departure(message_id, 10, 'ABC-123', 42, departure_location, arrival_location, departure_time)
+
+
+class DepartureDirectionTest(unittest.TestCase):
+
+    def test_directions(self):
+        self.assertEqual(departure_direction('N2', 'N0 Planet 3'), DIRECTION_UP)
+        self.assertEqual(departure_direction('N15', 'Gali'), DIRECTION_DOWN)
+        self.assertIsNone(departure_direction('Gali', 'Mandhrithar'))
+        self.assertIsNone(departure_direction(None, 'N0'))
+
+
+class DepartureBoardTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.published = []
+        self.board = DepartureBoard(self.publish, guild_id=1, edit_interval=0.1, max_entries=2)
+
+    async def asyncTearDown(self):
+        self.board.stop()
+
+    async def publish(self, direction, text):
+        self.published.append((direction, text))
+
+    async def test_sorted_by_time_and_dropped_when_done(self):
+        self.board.add(departure(1, 300))
+        self.board.add(departure(2, 100))
+        self.board.add(departure(3, 200, 'N0', 'N4'))
+        self.board.add(departure(4, None))
+        self.board.add(departure(1, 50))
+
+        self.assertEqual([d.message_id for d in self.board.entries(DIRECTION_UP)], [1, 2])
+        self.assertEqual([d.message_id for d in self.board.entries(DIRECTION_DOWN)], [3])
+
+        self.board.remove(1)
+        self.board.remove(1)
+        self.assertEqual([d.message_id for d in self.board.entries(DIRECTION_UP)], [2])
+        self.assertEqual(len(self.board), 2)
+
+    async def test_changes_are_coalesced_into_one_edit_per_interval(self):
+        for message_id in range(5):
+            self.board.add(departure(message_id, 100 + message_id))
+        await asyncio.sleep(0.01)
+        self.assertEqual([direction for direction, _ in self.published], [DIRECTION_UP])
+        self.assertIn('... and 3 more.', self.published[0][1])
+
+        self.board.remove(0)
+        self.board.remove(1)
+        self.board.add(departure(9, 1, 'N0', 'N1'))
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.published), 1)
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(sorted(direction for direction, _ in self.published[1:]), [DIRECTION_DOWN, DIRECTION_UP])
+
+
+if __name__ == '__main__':
+    unittest.main()
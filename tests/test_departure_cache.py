@@ -0,0 +1,32 @@
+import unittest
+
+from ptn.boozebot.modules.departure_cache import DepartureMessageCache
+
+
+class DepartureMessageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DepartureMessageCache()
+        self.cache.add(1, author_id=100)
+        self.cache.add(2, author_id=100, pinned=True)
+        self.cache.add(3, author_id=100, bot_authored=False)
+
+    def test_only_the_author_closes_their_notice(self):
+        self.assertTrue(self.cache.closable_by(1, 100))
+        self.assertFalse(self.cache.closable_by(1, 200))
+
+    def test_pinned_and_foreign_messages_are_never_closable(self):
+        self.assertFalse(self.cache.closable_by(2, 100))
+        self.assertFalse(self.cache.closable_by(3, 100))
+
+    def test_unknown_and_discarded_messages_miss(self):
+        self.assertFalse(self.cache.closable_by(4, 100))
+        self.cache.discard(1)
+        self.cache.discard(1)
+        self.assertNotIn(1, self.cache)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(len(self.cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import sqlite3
+import unittest
+
+from ptn.boozebot.database.departures import Departure, THOON_DEPARTURE_DELAY, parse_departure_message
+from ptn.boozebot.database.migrations import run_migrations
+
+THOON = '<:thoon:1234>'
+
+
+class ParseDepartureMessageTest(unittest.TestCase):
+
+    def test_timestamp_notice(self):
+        content = ('**⬆️ N2 > N0** | <t:1700000000:f> (<t:1700000000:R>) | **Booze Boat (ABC-123)** | <@42> '
+                   '| <@&99>')
+        self.assertEqual(parse_departure_message(content, 1600000000, THOON), {
+            'carrier_id': 'ABC-123',
+            'author_id': 42,
+            'departure_location': 'N2',
+            'arrival_location': 'N0',
+            'departure_time': 1700000000,
+        })
+
+    def test_thoon_notice(self):
+        content = f'**⬇️ N0 Planet 1 > N3** | {THOON} | **Booze Boat (ABC-123)** | <@42> '
+        fields = parse_departure_message(content, 1600000000, THOON)
+        self.assertEqual(fields['departure_time'], 1600000000 + THOON_DEPARTURE_DELAY)
+        self.assertEqual((fields['departure_location'], fields['arrival_location']), ('N0 Planet 1', 'N3'))
+
+    def test_unreadable_notice(self):
+        self.assertEqual(
+            parse_departure_message('Something else entirely', 1600000000, THOON),
+            {'carrier_id': None, 'author_id': None, 'departure_location': None, 'arrival_location': None,
+             'departure_time': None},
+        )
+
+
+class DeparturesTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        run_migrations(self.connection)
+
+    def test_due_lookup_uses_the_index(self):
+        plan = ' '.join(
+            row[3] for row in self.connection.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM departures WHERE state = 'scheduled' AND departure_time <= 1"
+            )
+        )
+        self.assertIn('departures_due', plan)
+
+    def test_row_round_trip(self):
+        self.connection.execute(
+            'INSERT INTO departures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (1, 2, 'ABC-123', 42, 'N2', 'N0', 1700000000, 'scheduled', 1600000000),
+        )
+        departure = Departure.from_row(self.connection.execute('SELECT * FROM departures').fetchone())
+        self.assertEqual((departure.message_id, departure.carrier_id, departure.state), (1, 'ABC-123', 'scheduled'))
+
+
+if __name__ == '__main__':
+    unittest.main()
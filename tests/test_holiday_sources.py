@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from ptn.boozebot.modules.PHcheck import HolidaySource, parse_ebgs_response, parse_edsm_response, query_sources
+from ptn.boozebot.modules.ratelimit import CircuitBreaker
+from tests.test_data.test_data import load_response
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.hits += 1
+        time.sleep(self.server.delay)
+        body = json.dumps(self.server.body).encode()
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """
+    A local HTTP server that answers every GET with the same status and JSON body, after a delay.
+    """
+
+    def __init__(self, body, status=200, delay=0.0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.body = body
+        self.server.status = status
+        self.server.delay = delay
+        self.server.hits = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    @property
+    def hits(self):
+        return self.server.hits
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+HOLIDAY = {'information': {'factionState': 'Public Holiday'}}
+NO_HOLIDAY = {'information': {'factionState': 'Boom'}}
+
+
+class QuerySourcesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.servers = []
+        self.client = httpx.AsyncClient(timeout=5)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        for server in self.servers:
+            server.close()
+
+    def source(self, name, body, status=200, delay=0.0, breaker=None):
+        server = StubServer(body, status, delay)
+        self.servers.append(server)
+        return HolidaySource(name, server.url, {}, parse_edsm_response, breaker), server
+
+    async def test_primary_answers_without_hedging(self):
+        primary, _ = self.source('primary', HOLIDAY)
+        secondary, secondary_server = self.source('secondary', NO_HOLIDAY)
+
+        self.assertTrue(await query_sources([primary, secondary], self.client, hedge_delay=1))
+        self.assertEqual(secondary_server.hits, 0)
+
+    async def test_slow_primary_is_hedged(self):
+        primary, _ = self.source('primary', NO_HOLIDAY, delay=2)
+        secondary, _ = self.source('secondary', HOLIDAY)
+
+        started_at = time.perf_counter()
+        self.assertTrue(await query_sources([primary, secondary], self.client, hedge_delay=0.05))
+        self.assertLess(time.perf_counter() - started_at, 1)
+
+    async def test_failure_moves_on_without_waiting_for_the_hedge(self):
+        primary, _ = self.source('primary', {}, status=500)
+        secondary, _ = self.source('secondary', HOLIDAY)
+
+        started_at = time.perf_counter()
+        self.assertTrue(await query_sources([primary, secondary], self.client, hedge_delay=5))
+        self.assertLess(time.perf_counter() - started_at, 1)
+
+    async def test_no_answer(self):
+        primary, _ = self.source('primary', {}, status=503)
+        secondary, _ = self.source('secondary', ['not', 'an', 'object'])
+
+        self.assertIsNone(await query_sources([primary, secondary], self.client, hedge_delay=0.05))
+
+    async def test_open_circuit_skips_the_source(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        primary, primary_server = self.source('primary', {}, status=500, breaker=breaker)
+        secondary, _ = self.source('secondary', HOLIDAY)
+
+        for _ in range(3):
+            self.assertTrue(await query_sources([primary, secondary], self.client, hedge_delay=1))
+        self.assertEqual(primary_server.hits, 2)
+        self.assertTrue(breaker.is_open)
+
+    async def test_unused_trial_does_not_hold_the_circuit_open(self):
+        clock = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=lambda: clock[0])
+        breaker.record_failure()
+        primary, _ = self.source('primary', HOLIDAY)
+        secondary, secondary_server = self.source('secondary', HOLIDAY, breaker=breaker)
+
+        # Past the reset timeout, but the primary answers before the secondary is ever asked.
+        clock[0] = 61
+        self.assertTrue(await query_sources([primary, secondary], self.client, hedge_delay=1))
+        self.assertEqual(secondary_server.hits, 0)
+
+        # So the trial is still there for the next check that does need the secondary.
+        self.assertTrue(breaker.allow())
+
+
+class ParseEbgsResponseTest(unittest.TestCase):
+
+    def test_recorded_responses(self):
+        self.assertTrue(parse_ebgs_response(load_response('peak_faction_holiday_response')))
+        self.assertFalse(parse_ebgs_response(load_response('peak_faction_no_holiday_response')))
+
+    def test_only_rackhams_counts(self):
+        response = json.loads(load_response('peak_faction_holiday_response'))
+        peak = response['docs'][0]['faction_presence'][0]
+        elsewhere = dict(peak, system_name='Elsewhere', system_name_lower='elsewhere')
+        response['docs'][0]['faction_presence'] = [elsewhere, dict(peak, active_states=[])]
+        self.assertFalse(parse_ebgs_response(json.dumps(response, indent=2)))
+
+        response['docs'][0]['faction_presence'] = [dict(elsewhere, active_states=[]), peak]
+        self.assertTrue(parse_ebgs_response(json.dumps(response)))
+
+    def test_faction_not_found(self):
+        self.assertFalse(parse_ebgs_response(json.dumps({'docs': [], 'total': 0})))
+        with self.assertRaises(ValueError):
+            parse_ebgs_response('{"error": "bad request"}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ptn.boozebot.modules.ingest import IngestServer
+
+
+class IngestServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.received = []
+
+        async def handler(row, record):
+            if record.get('Carrier ID') == 'bad':
+                raise ValueError('Incompatible carrier ID found: bad')
+            self.received.append((row, record))
+            return {'status': 'applied'}
+
+        server = IngestServer(handler, '127.0.0.1', 0, 'secret')
+        self.client = TestClient(TestServer(server.build_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def post(self, payload, token='secret'):
+        return await self.client.post(
+            '/form-response', json=payload, headers={'Authorization': f'Bearer {token}'}
+        )
+
+    async def test_applies_a_response(self):
+        response = await self.post({'row': 5, 'record': {'Carrier ID': ['ABC-123'], 'Wine Total (tons)': '23000'}})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.json(), {'status': 'applied'})
+        self.assertEqual(self.received, [(5, {'Carrier ID': 'ABC-123', 'Wine Total (tons)': '23000'})])
+
+    async def test_rejects_a_wrong_token(self):
+        response = await self.post({'row': 5, 'record': {}}, token='guess')
+        self.assertEqual(response.status, 401)
+        self.assertEqual(self.received, [])
+
+    async def test_rejects_bad_payloads(self):
+        for payload in ({'record': {}}, {'row': 1, 'record': {}}, {'row': 'five', 'record': {}}, [1, 2]):
+            response = await self.post(payload)
+            self.assertEqual(response.status, 400, payload)
+
+        response = await self.post({'row': 5, 'record': {'Carrier ID': 'bad'}})
+        self.assertEqual(response.status, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import sqlite3
+import unittest
+
+from ptn.boozebot.classes.BoozeCarrier import BoozeCarrier
+from ptn.boozebot.database.lifetime import CarrierLifetime, add_cruise_to_lifetime
+from ptn.boozebot.database.migrations import MIGRATIONS, run_migrations
+
+
+def archive(connection, holiday_start, carrier_id, name, wine, runs):
+    connection.execute(
+        '''
+        INSERT INTO historical (holiday_start, holiday_end, carriername, carrierid, winetotal, platform,
+        discordusername, runtotal, totalunloads) VALUES(?, ?, ?, ?, ?, 'PC', 'user', ?, ?)
+        ''',
+        (holiday_start, holiday_start, name, carrier_id, wine, runs, runs),
+    )
+
+
+class CarrierLifetimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        run_migrations(self.connection, [migration for migration in MIGRATIONS if migration[0] < 5])
+        archive(self.connection, '2024-01-05', 'AAA-111', 'Old Name', 20000, 1)
+        archive(self.connection, '2024-06-07', 'AAA-111', 'New Name', 10000, 2)
+        archive(self.connection, '2024-06-07', 'BBB-222', 'Other', 5000, 1)
+        self.connection.commit()
+        run_migrations(self.connection)
+
+    def lifetime(self, carrier_id):
+        return CarrierLifetime.from_row(
+            self.connection.execute('SELECT * FROM carrier_lifetime WHERE carrierid = ?', (carrier_id,)).fetchone()
+        )
+
+    def test_backfill(self):
+        lifetime = self.lifetime('AAA-111')
+        self.assertEqual(lifetime.carrier_name, 'New Name')
+        self.assertEqual((lifetime.total_wine, lifetime.total_runs, lifetime.cruises), (30000, 3, 2))
+        self.assertEqual((lifetime.first_cruise, lifetime.last_cruise), ('2024-01-05', '2024-06-07'))
+
+    def test_archiving_a_cruise_adds_to_totals(self):
+        archive(self.connection, '2024-12-06', 'AAA-111', 'Newest Name', 8000, 1)
+        archive(self.connection, '2024-12-06', 'CCC-333', 'Newcomer', 4000, 1)
+        self.assertEqual(add_cruise_to_lifetime(self.connection.cursor(), '2024-12-06'), 2)
+
+        lifetime = self.lifetime('AAA-111')
+        self.assertEqual((lifetime.total_wine, lifetime.total_runs, lifetime.cruises), (38000, 4, 3))
+        self.assertEqual((lifetime.carrier_name, lifetime.last_cruise), ('Newest Name', '2024-12-06'))
+        self.assertEqual(self.lifetime('CCC-333').cruises, 1)
+        self.assertEqual(self.lifetime('BBB-222').total_wine, 5000)
+
+    def test_merges_the_current_cruise(self):
+        live = BoozeCarrier({'carriername': 'Live Name', 'carrierid': 'AAA-111', 'winetotal': 6000, 'runtotal': 2,
+                             'discordusername': 'owner'})
+        merged = self.lifetime('AAA-111').with_live(live)
+        self.assertEqual((merged.total_wine, merged.total_runs, merged.cruises), (36000, 5, 3))
+        self.assertEqual(merged.carrier_name, 'Live Name')
+        self.assertTrue(merged.on_current_cruise)
@@ -0,0 +1,62 @@
+import sqlite3
+import unittest
+
+from ptn.boozebot.database.migrations import MIGRATIONS, current_version, latest_version, run_migrations
+
+
+def table_names(connection):
+    return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+class MigrationsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+
+    def test_fresh_database_is_built_to_latest(self):
+        self.assertEqual(run_migrations(self.connection), [version for version, _, _ in MIGRATIONS])
+        self.assertEqual(current_version(self.connection), latest_version())
+        self.assertTrue(
+            {'boozecarriers', 'historical', 'holidaystate', 'trackingforms', 'sheetsyncstate', 'pinned_messages'}
+            <= table_names(self.connection)
+        )
+        self.assertEqual(self.connection.execute('SELECT count(*) FROM holidaystate').fetchone()[0], 1)
+        self.assertEqual(self.connection.execute('SELECT count(*) FROM trackingforms').fetchone()[0], 1)
+
+    def test_up_to_date_database_is_left_alone(self):
+        run_migrations(self.connection)
+        self.assertEqual(run_migrations(self.connection), [])
+
+    def test_pre_migration_database_is_upgraded(self):
+        # A database built by the old startup checks, before the timezone column existed.
+        self.connection.execute('''
+            CREATE TABLE boozecarriers(
+                entry INTEGER PRIMARY KEY AUTOINCREMENT, carriername TEXT NOT NULL, carrierid TEXT UNIQUE,
+                winetotal INT, platform TEXT NOT NULL, officialcarrier BOOLEAN, discordusername TEXT NOT NULL,
+                timestamp DATETIME, runtotal INT, totalunloads INT, discord_unload_in_progress INT
+            )
+        ''')
+        self.connection.execute('''
+            INSERT INTO boozecarriers VALUES(NULL, 'Carrier', 'abc-123 ', 1, 'PC', 0, 'user', NULL, 1, 0, NULL)
+        ''')
+        self.connection.commit()
+
+        run_migrations(self.connection)
+
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info (boozecarriers)')]
+        self.assertIn('user_timezone_in_utc', columns)
+        self.assertEqual(self.connection.execute('SELECT carrierid FROM boozecarriers').fetchone()[0], 'ABC-123')
+
+    def test_failed_migration_rolls_back(self):
+        run_migrations(self.connection)
+
+        def create_then_fail(cursor):
+            cursor.execute('CREATE TABLE half_done(x INT)')
+            raise RuntimeError('boom')
+
+        broken = MIGRATIONS + [(latest_version() + 1, 'Broken', create_then_fail)]
+        with self.assertRaises(RuntimeError):
+            run_migrations(self.connection, broken)
+
+        self.assertEqual(current_version(self.connection), latest_version())
+        self.assertNotIn('half_done', table_names(self.connection))
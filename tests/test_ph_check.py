@@ -1,7 +1,8 @@
+import asyncio
 import unittest
 from unittest import mock
 
-from ptn.boozebot.modules.PHcheck import ph_check
+from ptn.boozebot.modules.PHcheck import HolidayStateService, ph_check
 from tests.test_data import test_data
 
 
@@ -15,3 +16,39 @@ class PublicHolidayChecks(unittest.TestCase):
     @mock.patch('requests.get', side_effect=test_data.mocked_requests_no_holiday_response)
     async def test_ph_check(self, _mock_request_get):
         self.assertFalse(await ph_check())
+
+
+class HolidayStateServiceTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.service = HolidayStateService(ttl=600, clock=lambda: self.now)
+        self.answers = []
+
+    async def fake_sources(self, sources, client, hedge_delay):
+        await asyncio.sleep(0)
+        return self.answers.pop(0)
+
+    async def test_answers_from_cache_within_ttl(self):
+        self.answers = [True, False]
+        with mock.patch('ptn.boozebot.modules.PHcheck.query_sources', self.fake_sources):
+            self.assertTrue(await self.service.check())
+            self.now = 599
+            self.assertTrue(await self.service.check())
+            self.assertFalse(await self.service.check(max_age=0))
+        await self.service.close()
+
+    async def test_concurrent_checks_share_one_request(self):
+        self.answers = [True]
+        with mock.patch('ptn.boozebot.modules.PHcheck.query_sources', self.fake_sources):
+            results = await asyncio.gather(*(self.service.check() for _ in range(5)))
+        self.assertEqual(results, [True] * 5)
+        self.assertEqual(self.answers, [])
+        await self.service.close()
+
+    async def test_keeps_last_state_when_sources_are_down(self):
+        self.answers = [True, None]
+        with mock.patch('ptn.boozebot.modules.PHcheck.query_sources', self.fake_sources):
+            self.assertTrue(await self.service.check())
+            self.assertTrue(await self.service.check(max_age=0))
+        await self.service.close()
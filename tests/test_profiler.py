@@ -0,0 +1,74 @@
+import sqlite3
+import unittest
+
+from ptn.boozebot.database.profiler import (
+    QueryProfiler,
+    normalise_statement,
+    profiled_connection_factory,
+    statement_label,
+)
+
+
+class QueryProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = QueryProfiler()
+        self.connection = sqlite3.connect(':memory:', factory=profiled_connection_factory(self.profiler))
+        self.connection.execute('CREATE TABLE boozecarriers(carrierid TEXT, winetotal INT)')
+        self.connection.executemany(
+            'INSERT INTO boozecarriers VALUES(?, ?)', [('ABC-123', 100), ('XYZ-789', 200), ('QWE-456', 300)]
+        )
+
+    def test_statement_label(self):
+        self.assertEqual(statement_label('SELECT * FROM boozecarriers WHERE runtotal > 1'), 'SELECT boozecarriers')
+        self.assertEqual(statement_label('\n  UPDATE historical SET x=1'), 'UPDATE historical')
+        self.assertEqual(statement_label('PRAGMA journal_mode'), 'PRAGMA')
+
+    def test_statements_differing_only_in_literals_share_a_key(self):
+        self.assertEqual(
+            normalise_statement("SELECT * FROM pinned_messages WHERE message_id = 123 AND name = 'it''s'"),
+            'SELECT * FROM pinned_messages WHERE message_id = ? AND name = ?',
+        )
+        self.assertEqual(normalise_statement('DELETE FROM departures WHERE state IN (?, ?,?)'),
+                         'DELETE FROM departures WHERE state IN (...)')
+        self.assertEqual(normalise_statement('SELECT N0, col2 FROM t2 LIMIT 10'), 'SELECT N0, col2 FROM t2 LIMIT ?')
+
+        for carrier_id in range(50):
+            self.connection.execute(f'SELECT * FROM boozecarriers WHERE winetotal = {carrier_id}').fetchall()
+        for size in range(1, 20):
+            self.connection.execute(
+                f'SELECT * FROM boozecarriers WHERE carrierid IN ({", ".join("?" * size)})', ('x',) * size
+            ).fetchall()
+        self.assertEqual(self.profiler.stats['SELECT * FROM boozecarriers WHERE winetotal = ?'].calls, 50)
+        self.assertEqual(self.profiler.stats['SELECT * FROM boozecarriers WHERE carrierid IN (...)'].calls, 19)
+
+    def test_records_latency_rows_and_call_site(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT *   FROM boozecarriers')
+        self.assertEqual(len(cursor.fetchall()), 3)
+        cursor.execute('SELECT * FROM boozecarriers')
+        cursor.fetchone()
+
+        stats = self.profiler.stats['SELECT * FROM boozecarriers']
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.rows, 4)
+        self.assertGreater(stats.total_seconds, 0)
+        self.assertEqual(sum(stats.call_sites.values()), 2)
+        for call_site in stats.call_sites:
+            self.assertIn('test_profiler.py', call_site)
+
+    def test_write_row_counts(self):
+        stats = self.profiler.stats['INSERT INTO boozecarriers VALUES(?, ?)']
+        self.assertEqual(stats.calls, 1)
+        self.assertEqual(stats.rows, 3)
+
+    def test_sampling_off_records_nothing(self):
+        self.profiler.reset()
+        self.profiler.sample_rate = 0
+        self.connection.execute('SELECT * FROM boozecarriers').fetchall()
+        self.assertEqual(self.profiler.stats, {})
+
+    def test_top_orders_by_total_time(self):
+        top = self.profiler.top(1)
+        self.assertEqual(len(top), 1)
+        self.assertEqual(top[0].total_seconds, max(stats.total_seconds for stats in self.profiler.stats.values()))
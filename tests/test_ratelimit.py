@@ -0,0 +1,117 @@
+import unittest
+
+from ptn.boozebot.modules.ratelimit import CircuitBreaker, TokenBucket, retry_with_backoff
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=1, capacity=5, reserve=2, clock=self.clock)
+
+    def test_background_calls_leave_the_reserve(self):
+        taken = sum(self.bucket.try_acquire() for _ in range(5))
+        self.assertEqual(taken, 3)
+        self.assertTrue(self.bucket.try_acquire(priority=True))
+        self.assertTrue(self.bucket.try_acquire(priority=True))
+        self.assertFalse(self.bucket.try_acquire(priority=True))
+
+    def test_refills_up_to_capacity(self):
+        while self.bucket.try_acquire(priority=True):
+            pass
+        self.clock.now += 2
+        self.assertEqual(self.bucket.available, 2)
+        self.clock.now += 60
+        self.assertEqual(self.bucket.available, 5)
+
+    def test_acquire_times_out(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        self.assertLess(bucket.acquire(), 0.005)
+        self.assertGreater(bucket.acquire(), 0)
+        slow = TokenBucket(rate=0.001, capacity=1)
+        slow.acquire()
+        with self.assertRaises(TimeoutError):
+            slow.acquire(timeout=0.01)
+
+
+class RetryWithBackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+
+    def flaky(self, failures, error=ValueError):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise error('nope')
+            return len(calls)
+        return func
+
+    def test_retries_until_success(self):
+        result = retry_with_backoff(self.flaky(2), lambda e: True, base_delay=1, sleep=self.sleeps.append)
+        self.assertEqual(result, 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertLessEqual(self.sleeps[0], 1)
+        self.assertLessEqual(self.sleeps[1], 2)
+
+    def test_gives_up(self):
+        with self.assertRaises(ValueError):
+            retry_with_backoff(self.flaky(5), lambda e: True, attempts=3, sleep=self.sleeps.append)
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_does_not_retry_other_errors(self):
+        with self.assertRaises(KeyError):
+            retry_with_backoff(self.flaky(1, KeyError), lambda e: isinstance(e, ValueError), sleep=self.sleeps.append)
+        self.assertEqual(self.sleeps, [])
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=self.clock)
+
+    def test_opens_after_failures_in_a_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+    def test_one_trial_after_the_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+
+    def test_abandoned_trial_allows_another(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_abandoned()
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+import unittest
+
+from ptn.boozebot.database.reconcile import (
+    add_sheet_hash_column,
+    aggregate_sheet_records,
+    load_sheet_sync_state,
+    merge_sheet_records,
+    reconcile_carriers,
+)
+
+
+def build_connection():
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = sqlite3.Row
+    connection.execute('''
+        CREATE TABLE boozecarriers(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            carriername TEXT NOT NULL,
+            carrierid TEXT UNIQUE,
+            winetotal INT,
+            platform TEXT NOT NULL,
+            officialcarrier BOOLEAN,
+            discordusername TEXT NOT NULL,
+            timestamp DATETIME,
+            runtotal INT,
+            totalunloads INT,
+            discord_unload_in_progress INT,
+            user_timezone_in_utc TEXT,
+            sheet_hash TEXT
+        )
+    ''')
+    connection.execute('''
+        CREATE TABLE sheetsyncstate(
+            entry INTEGER PRIMARY KEY AUTOINCREMENT,
+            worksheet_key TEXT,
+            worksheet_with_data_id INT,
+            last_processed_row INT
+        )
+    ''')
+    return connection
+
+
+def sheet_record(carrier_id, wine, name='Carrier', user='user'):
+    return {
+        'Carrier Name': name,
+        'Carrier ID': carrier_id,
+        'Wine Total (tons)': wine,
+        'Discord Username': user,
+        'Timestamp': '2025-01-01 00:00:00',
+    }
+
+
+class ReconcileCarriers(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = build_connection()
+        self.lock = threading.Lock()
+
+    def reconcile(self, records):
+        return reconcile_carriers(self.connection, self.lock, aggregate_sheet_records(records))
+
+    def test_aggregates_multiple_trips(self):
+        carriers = aggregate_sheet_records([sheet_record('abc-123', 20000), sheet_record('ABC-123', 15000)])
+        self.assertEqual(list(carriers), ['ABC-123'])
+        self.assertEqual(carriers['ABC-123'].wine_total, 35000)
+        self.assertEqual(carriers['ABC-123'].run_count, 2)
+
+    def test_inserts_new_carriers(self):
+        result = self.reconcile([sheet_record('ABC-123', 20000), sheet_record('XYZ-789', 10000)])
+        self.assertTrue(result['updated_db'])
+        self.assertEqual(result['added_count'], 2)
+        self.assertEqual(len(result['new_carriers']), 2)
+        count = self.connection.execute('SELECT count(*) FROM boozecarriers').fetchone()[0]
+        self.assertEqual(count, 2)
+
+    def test_updates_changed_and_skips_unchanged(self):
+        self.reconcile([sheet_record('ABC-123', 20000), sheet_record('XYZ-789', 10000)])
+        result = self.reconcile(
+            [sheet_record('ABC-123', 20000), sheet_record('XYZ-789', 10000), sheet_record('XYZ-789', 5000)]
+        )
+        self.assertEqual(result['added_count'], 0)
+        self.assertEqual(result['updated_count'], 1)
+        self.assertEqual(result['unchanged_count'], 1)
+        self.assertEqual(result['skipped_count'], 1)
+        row = self.connection.execute("SELECT * FROM boozecarriers WHERE carrierid = 'XYZ-789'").fetchone()
+        self.assertEqual(row['winetotal'], 15000)
+        self.assertEqual(row['runtotal'], 2)
+
+    def test_no_write_when_nothing_changed(self):
+        self.reconcile([sheet_record('ABC-123', 20000)])
+        result = self.reconcile([sheet_record('ABC-123', 20000)])
+        self.assertFalse(result['updated_db'])
+        self.assertEqual(result['unchanged_count'], 1)
+
+    def test_rewrites_rows_without_a_fingerprint(self):
+        self.reconcile([sheet_record('ABC-123', 20000)])
+        self.connection.execute('UPDATE boozecarriers SET sheet_hash = NULL')
+        result = self.reconcile([sheet_record('ABC-123', 20000)])
+        self.assertEqual(result['updated_count'], 1)
+        self.assertEqual(result['skipped_count'], 0)
+        self.assertEqual(self.reconcile([sheet_record('ABC-123', 20000)])['skipped_count'], 1)
+
+    def test_backfilled_fingerprint_matches_the_sheet(self):
+        records = [sheet_record('ABC-123', 20000), sheet_record('ABC-123', 5000)]
+        self.reconcile(records)
+        written = self.connection.execute('SELECT sheet_hash FROM boozecarriers').fetchone()[0]
+
+        add_sheet_hash_column(self.connection.cursor())
+        self.assertEqual(self.connection.execute('SELECT sheet_hash FROM boozecarriers').fetchone()[0], written)
+        self.assertEqual(self.reconcile(records)['skipped_count'], 1)
+
+    def test_flags_carriers_missing_from_sheet(self):
+        self.reconcile([sheet_record('ABC-123', 20000), sheet_record('XYZ-789', 10000)])
+        result = self.reconcile([sheet_record('ABC-123', 20000)])
+        self.assertEqual(
+            [carrier.carrier_identifier for carrier in result['invalid_database_entries']], ['XYZ-789']
+        )
+
+    def test_incremental_only_touches_new_rows(self):
+        carriers = aggregate_sheet_records([sheet_record('ABC-123', 20000), sheet_record('XYZ-789', 10000)])
+        reconcile_carriers(self.connection, self.lock, carriers, sync_state=('key', 1, 3))
+
+        touched = merge_sheet_records(carriers, [sheet_record('XYZ-789', 5000), sheet_record('NEW-001', 1000)])
+        self.assertEqual(touched, {'XYZ-789', 'NEW-001'})
+
+        result = reconcile_carriers(self.connection, self.lock, carriers, only_ids=touched, sync_state=('key', 1, 5))
+        self.assertEqual(result['added_count'], 1)
+        self.assertEqual(result['updated_count'], 1)
+        self.assertEqual(result['unchanged_count'], 1)
+        self.assertEqual(result['total_carriers'], 3)
+        self.assertEqual(result['invalid_database_entries'], [])
+        self.assertEqual(load_sheet_sync_state(self.connection)['last_processed_row'], 5)
@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+
+from ptn.boozebot.database.departures import DIRECTION_UP
+from ptn.boozebot.modules.direct_messages import DirectMessageBatcher
+from ptn.boozebot.modules.route_subscriptions import RouteSubscriptionIndex, expand_range
+
+
+class ExpandRangeTest(unittest.TestCase):
+
+    def test_upward_hitchhiker_range(self):
+        routes = expand_range('N3', 'N0', DIRECTION_UP)
+        self.assertEqual(len(routes), 6)
+        self.assertIn(('N3', 'N0'), routes)
+        self.assertNotIn(('N0', 'N3'), routes)
+
+    def test_gali_and_mandhrithar_are_not_a_route(self):
+        self.assertEqual(expand_range('Gali', 'Mandhrithar'), [])
+        self.assertEqual(expand_range('N15', 'Gali'), [('N15', 'Gali'), ('Gali', 'N15')])
+
+
+class RouteSubscriptionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = RouteSubscriptionIndex()
+        self.index.add(1, 'N2', 'N0')
+        self.index.add(2, 'N2')
+        self.index.add(3, 'N1', 'N0')
+
+    def test_match_by_route_and_any_arrival(self):
+        self.assertEqual(self.index.match('N2', 'N0 Planet 3'), {1, 2})
+        self.assertEqual(self.index.match('N2', 'N5'), {2})
+        self.assertEqual(self.index.match('N4', 'N0'), set())
+
+    def test_duplicates_and_removal(self):
+        self.assertFalse(self.index.add(2, 'N2'))
+        self.assertTrue(self.index.add(2, 'N2', 'N0'))
+        self.assertEqual(self.index.routes(2), [('N2', None), ('N2', 'N0')])
+        self.assertEqual(self.index.remove_user(2), 2)
+        self.assertEqual(self.index.match('N2', 'N0'), {1})
+        self.assertEqual(len(self.index), 2)
+
+
+class DirectMessageBatcherTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_lines_for_a_user_are_sent_together(self):
+        sent = []
+
+        async def send(user_id, text):
+            if user_id == 3:
+                raise RuntimeError('DMs closed')
+            sent.append((user_id, text))
+
+        batcher = DirectMessageBatcher('test', send, header='Departures:', gather_delay=0.01, per_second=1000)
+        batcher.queue([1, 2, 3], 'first')
+        batcher.queue([1], 'second')
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(sent, [(1, 'Departures:\nfirst\nsecond'), (2, 'Departures:\nfirst')])
+        self.assertEqual(len(batcher), 0)
+
+    def test_long_batches_are_split(self):
+        batcher = DirectMessageBatcher('test', None, header='Departures:')
+        messages = batcher.messages(['x' * 900] * 3)
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(all(len(message) <= 2000 for message in messages))
+        self.assertTrue(messages[0].startswith('Departures:\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import sqlite3
+import unittest
+
+from ptn.boozebot.database.schema import create_carrier_lookup_indexes, normalize_carrier_ids
+
+
+class CarrierLookupSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute('CREATE TABLE boozecarriers(entry INTEGER PRIMARY KEY, carrierid TEXT UNIQUE)')
+        self.connection.execute('CREATE TABLE historical(entry INTEGER PRIMARY KEY, carrierid TEXT, holiday_start DATE)')
+
+    def test_normalizes_carrier_ids(self):
+        self.connection.executemany(
+            'INSERT INTO boozecarriers(carrierid) VALUES(?)', [(' abc-123',), ('XYZ-789',), ('ABC-123 ',)]
+        )
+        self.connection.execute("INSERT INTO historical(carrierid) VALUES('qwe-456 ')")
+
+        cursor = self.connection.cursor()
+        self.assertEqual(normalize_carrier_ids(cursor), 2)
+
+        ids = sorted(row[0] for row in self.connection.execute('SELECT carrierid FROM boozecarriers'))
+        # The second spelling of ABC-123 would collide, so it is left for a sommelier to clean up.
+        self.assertEqual(ids, ['ABC-123', 'ABC-123 ', 'XYZ-789'])
+        self.assertEqual(self.connection.execute('SELECT carrierid FROM historical').fetchone()[0], 'QWE-456')
+        self.assertEqual(normalize_carrier_ids(cursor), 0)
+
+    def test_lookups_use_the_indexes(self):
+        create_carrier_lookup_indexes(self.connection.cursor())
+        for sql in ("SELECT * FROM historical WHERE carrierid = 'ABC-123'",
+                    "SELECT * FROM historical WHERE holiday_start = '2025-01-01'"):
+            plan = ' '.join(row[-1] for row in self.connection.execute(f'EXPLAIN QUERY PLAN {sql}'))
+            self.assertIn('USING INDEX', plan)
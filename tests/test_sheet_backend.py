@@ -0,0 +1,60 @@
+import unittest
+
+from ptn.boozebot.modules.sheet_backend import LocalSheetBackend, SheetsQuota, is_retryable, sheet_priority
+
+
+class FakeAPIError(Exception):
+
+    def __init__(self, code):
+        super().__init__(f'status {code}')
+        self.code = code
+
+
+class LocalSheetBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet = LocalSheetBackend([
+            ['Timestamp', 'Carrier Name', 'Carrier ID'],
+            ['2025-01-01 00:00:00', 'Carrier', 'ABC-123'],
+        ])
+
+    def test_token_only_moves_on_change(self):
+        token = self.sheet.change_token()
+        self.assertEqual(self.sheet.change_token(), token)
+
+        self.sheet.append(['2025-01-01 01:00:00', 'Other', 'XYZ-789'])
+        self.assertNotEqual(self.sheet.change_token(), token)
+
+    def test_rows_are_numbered_like_the_sheet(self):
+        self.sheet.append(['2025-01-01 01:00:00', 'Other', 'XYZ-789', 'extra'])
+        self.assertEqual(self.sheet.row_count(), 3)
+        self.assertEqual(self.sheet.header()[0], 'Timestamp')
+        self.assertEqual(self.sheet.rows(3, 3, 3), [['2025-01-01 01:00:00', 'Other', 'XYZ-789']])
+        self.assertEqual(self.sheet.calls['all_values'], 0)
+
+
+class SheetsQuotaTest(unittest.TestCase):
+
+    def test_retries_rate_limits_and_server_errors_only(self):
+        self.assertTrue(is_retryable(FakeAPIError(429)))
+        self.assertTrue(is_retryable(FakeAPIError(503)))
+        self.assertFalse(is_retryable(FakeAPIError(404)))
+        self.assertFalse(is_retryable(ValueError()))
+
+    def test_call_retries_then_succeeds(self):
+        quota = SheetsQuota(requests_per_minute=60, priority_reserve=10, base_delay=0, max_delay=0)
+        failures = [FakeAPIError(429), FakeAPIError(500)]
+
+        def request():
+            if failures:
+                raise failures.pop(0)
+            return 'values'
+
+        with sheet_priority(False):
+            self.assertEqual(quota.call('test', request), 'values')
+        # One token per attempt.
+        self.assertLess(quota.bucket.available, 58)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import contextlib
+import sqlite3
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from ptn.boozebot.botcommands import DatabaseInteraction as database_interaction
+from ptn.boozebot.modules.sheet_backend import LocalSheetBackend
+
+HEADER = ['Timestamp', 'Carrier Name', 'Carrier ID', 'Wine Total (tons)', 'Discord Username']
+
+
+class UpdateDbChangeTokenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet = LocalSheetBackend([HEADER, ['2025-01-01 00:00:00', 'Carrier', 'ABC-123', 20000, 'user']])
+
+        # Skip __init__, it authorises against Google.
+        self.cog = database_interaction.DatabaseInteraction.__new__(database_interaction.DatabaseInteraction)
+        self.cog.tracking_sheet = self.sheet
+        self.cog.update_allowed = True
+        self.cog.worksheet_key = 'key'
+        self.cog.worksheet_with_data_id = 0
+        self.cog.sheet_headers = HEADER
+        self.cog.sheet_carriers = {}
+        self.cog.sheet_change_token = self.sheet.change_token()
+        self.cog._sheet_lock = threading.Lock()
+        self.cog._last_full_sync = time.monotonic()
+        self.cog._invalid_database_entries = ['carrier gone from the sheet']
+
+        sync_state = {'worksheet_key': 'key', 'worksheet_with_data_id': 0, 'last_processed_row': 2}
+        for patcher in (
+            mock.patch.object(database_interaction, 'read_cursor', mock.MagicMock()),
+            mock.patch.object(database_interaction, 'load_sheet_sync_state', return_value=sync_state),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unchanged_sheet_is_not_downloaded(self):
+        result = self.cog._update_db()
+
+        self.assertFalse(result['updated_db'])
+        self.assertEqual(result['invalid_database_entries'], ['carrier gone from the sheet'])
+        self.assertEqual(self.sheet.calls['change_token'], 2)
+        self.assertEqual(self.sheet.calls['row_count'], 0)
+        self.assertEqual(self.sheet.calls['rows'], 0)
+        self.assertEqual(self.sheet.calls['all_values'], 0)
+
+    def test_changed_sheet_is_synced(self):
+        self.sheet.append(['2025-01-01 01:00:00', 'Other', 'XYZ-789', 10000, 'other'])
+        with mock.patch.object(self.cog, '_incremental_sheet_sync', return_value={'updated_db': True}) as sync:
+            self.cog._update_db()
+        sync.assert_called_once_with(2, True)
+        self.assertEqual(self.cog.sheet_change_token, '1')
+
+    def test_full_resync_once_the_interval_is_up(self):
+        self.sheet.append(['2025-01-01 01:00:00', 'Other', 'XYZ-789', 10000, 'other'])
+        self.cog._last_full_sync -= 24 * 60 * 60
+        with mock.patch.object(self.cog, '_full_sheet_sync', return_value={'updated_db': True}) as full_sync, \
+                mock.patch.object(self.cog, '_incremental_sheet_sync') as incremental_sync:
+            self.cog._update_db()
+        full_sync.assert_called_once_with()
+        incremental_sync.assert_not_called()
+
+
+class ArchiveDuringSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript('''
+            CREATE TABLE boozecarriers(
+                entry INTEGER PRIMARY KEY AUTOINCREMENT,
+                carriername TEXT NOT NULL,
+                carrierid TEXT UNIQUE,
+                winetotal INT,
+                platform TEXT NOT NULL,
+                officialcarrier BOOLEAN,
+                discordusername TEXT NOT NULL,
+                timestamp DATETIME,
+                runtotal INT,
+                totalunloads INT,
+                discord_unload_in_progress INT,
+                user_timezone_in_utc TEXT,
+                sheet_hash TEXT
+            );
+            CREATE TABLE historical(
+                entry INTEGER PRIMARY KEY AUTOINCREMENT,
+                carriername TEXT,
+                carrierid TEXT,
+                winetotal INT,
+                platform TEXT,
+                officialcarrier BOOLEAN,
+                discordusername TEXT,
+                timestamp DATETIME,
+                runtotal INT,
+                totalunloads INT,
+                holiday_start DATE,
+                holiday_end DATE
+            );
+            CREATE TABLE sheetsyncstate(
+                entry INTEGER PRIMARY KEY AUTOINCREMENT,
+                worksheet_key TEXT,
+                worksheet_with_data_id INT,
+                last_processed_row INT
+            );
+        ''')
+        self.write_lock = threading.Lock()
+
+        self.sheet = LocalSheetBackend([HEADER, ['2025-01-01 00:00:00', 'Carrier', 'ABC-123', 20000, 'user']])
+        self.sheet_downloading = threading.Event()
+        self.release_download = threading.Event()
+        all_values = self.sheet.all_values
+
+        def slow_all_values():
+            self.sheet_downloading.set()
+            self.release_download.wait(5)
+            return all_values()
+
+        self.sheet.all_values = slow_all_values
+
+        self.cog = database_interaction.DatabaseInteraction.__new__(database_interaction.DatabaseInteraction)
+        self.cog.tracking_sheet = self.sheet
+        self.cog.update_allowed = True
+        self.cog.worksheet_key = 'key'
+        self.cog.worksheet_with_data_id = 0
+        self.cog.sheet_headers = HEADER
+        self.cog.sheet_carriers = None
+        self.cog.sheet_change_token = None
+        self.cog._sheet_lock = threading.Lock()
+        self.cog._last_full_sync = None
+        self.cog._invalid_database_entries = []
+        self.cog._last_refresh_result = None
+        self.cog._last_refresh_time = None
+
+        for patcher in (
+            mock.patch.object(database_interaction, 'read_cursor', self.cursor),
+            mock.patch.object(database_interaction, 'write_cursor', self.cursor),
+            mock.patch.object(
+                database_interaction,
+                'pirate_steve_connections',
+                mock.Mock(writer=self.connection, write_lock=self.write_lock),
+            ),
+            mock.patch.object(database_interaction, 'rollup_cruises'),
+            mock.patch.object(database_interaction, 'add_cruise_to_lifetime'),
+            mock.patch.object(database_interaction, 'request_backup'),
+            mock.patch.object(self.cog, '_finish_update', side_effect=lambda result: result, create=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @contextlib.contextmanager
+    def cursor(self):
+        with self.write_lock, self.connection:
+            yield self.connection.cursor()
+
+    def test_archive_waits_for_the_sync_in_flight(self):
+        sync = threading.Thread(target=self.cog._prioritised_update_db, args=(False, False))
+        sync.start()
+        self.assertTrue(self.sheet_downloading.wait(5))
+
+        archive = threading.Thread(target=self.cog._archive_cruise, args=(datetime(2025, 1, 1),))
+        archive.start()
+        archive.join(0.1)
+        self.release_download.set()
+        sync.join(5)
+        archive.join(5)
+
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM boozecarriers').fetchone()[0], 0)
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM sheetsyncstate').fetchone()[0], 0)
+        self.assertEqual(self.connection.execute('SELECT carrierid FROM historical').fetchall()[0][0], 'ABC-123')
+        self.assertIsNone(self.cog.sheet_carriers)
+        self.assertIsNone(self.cog.sheet_change_token)
+        self.assertFalse(self.cog.update_allowed)
+        self.assertIsNone(self.cog._prioritised_update_db(False, False))
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM boozecarriers').fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()